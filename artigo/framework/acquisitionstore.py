@@ -0,0 +1,145 @@
+"""
+Memory-mapped store of acquisitions, one binary array per acquisition
+plus a small JSON index.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+
+def _atomic_write(file_name, write):
+  """
+  Calls write(handle) on a temporary file renamed to file_name at the end.
+  """
+  dirname = os.path.dirname(file_name)
+  handle, tmp_name = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+  try:
+    with os.fdopen(handle, 'wb') as tmp_file:
+      write(tmp_file)
+    os.replace(tmp_name, file_name)
+  except BaseException:
+    os.remove(tmp_name)
+    raise
+
+
+class AcquisitionStore(Mapping):
+  """
+  Read-only mapping from acquisition keys to memory-mapped numpy arrays.
+
+  Opening the store only reads the index. Each acquisition file is mapped
+  the first time its key is accessed, and the operating system pages in
+  only the parts of the signal that are actually touched.
+
+  ...
+  Attributes
+  ----------
+  storedir : str
+    directory of the store
+  index : dict
+    the keys represent the acquisitions and the values the array file names
+
+  Methods
+  -------
+  write(key, signal)
+    Save (or replace) one acquisition without rewriting the others.
+  """
+
+  def __init__(self, storedir):
+    self.storedir = storedir
+    with open(os.path.join(storedir, INDEX_FILE)) as handle:
+      self.metadata = json.load(handle)
+    self.index = self.metadata['acquisitions']
+    self._arrays = {}
+
+  def __getitem__(self, key):
+    if key not in self._arrays:
+      file_name = os.path.join(self.storedir, self.index[key])
+      self._arrays[key] = np.load(file_name, mmap_mode='r')
+    return self._arrays[key]
+
+  def __iter__(self):
+    return iter(self.index)
+
+  def __len__(self):
+    return len(self.index)
+
+  def write(self, key, signal):
+    """
+    Save (or replace) one acquisition and update the index.
+    """
+    if key not in self.index:
+      self.index[key] = "{:05d}.npy".format(len(self.index))
+    _atomic_write(os.path.join(self.storedir, self.index[key]),
+                  lambda handle: np.save(handle, np.ascontiguousarray(signal)))
+    self._arrays.pop(key, None)
+    self._write_index()
+
+  def _write_index(self):
+    _atomic_write(os.path.join(self.storedir, INDEX_FILE),
+                  lambda handle: handle.write(json.dumps(self.metadata, indent=1).encode()))
+
+
+def is_store(storedir):
+  """
+  Whether storedir holds an acquisition store.
+  """
+  return os.path.isfile(os.path.join(storedir, INDEX_FILE))
+
+
+def save_acquisitions(acquisitions_data, storedir, dtype=None):
+  """
+  Save the acquisitions dict returned by Database_Download.acquisitions()
+  in storedir, one .npy file per acquisition, converted to dtype if given.
+
+  Returns
+  -------
+  acquisitions_data : dict
+    the same data, with the acquisitions read back from the store
+  """
+  if not os.path.isdir(storedir):
+    os.makedirs(storedir)
+  metadata = {key: value for key, value in acquisitions_data.items() if key != 'acquisitions'}
+  metadata['acquisitions'] = {}
+  for i, (key, signal) in enumerate(acquisitions_data['acquisitions'].items()):
+    if dtype is not None:
+      signal = np.asarray(signal, dtype=dtype)
+    file_name = "{:05d}.npy".format(i)
+    _atomic_write(os.path.join(storedir, file_name),
+                  lambda handle: np.save(handle, np.ascontiguousarray(signal)))
+    metadata['acquisitions'][key] = file_name
+  _atomic_write(os.path.join(storedir, INDEX_FILE),
+                lambda handle: handle.write(json.dumps(metadata, indent=1).encode()))
+  return load_acquisitions(storedir)
+
+
+def load_acquisitions(storedir):
+  """
+  Open the store in storedir.
+
+  Returns
+  -------
+  acquisitions_data : dict
+    the conditions dict, the destinations directory and the acquisitions,
+    an AcquisitionStore of memory-mapped arrays
+  """
+  acquisitions = AcquisitionStore(storedir)
+  acquisitions_data = {key: value for key, value in acquisitions.metadata.items()
+                       if key != 'acquisitions'}
+  acquisitions_data['acquisitions'] = acquisitions
+  return acquisitions_data
+
+
+def convert_pickle(pickle_file, storedir, dtype=None):
+  """
+  Convert a pickle cache, as saved by the old load() methods, to a store.
+  """
+  with open(pickle_file, 'rb') as handle:
+    acquisitions_data = pickle.load(handle)
+  return save_acquisitions(acquisitions_data, storedir, dtype)
@@ -0,0 +1,207 @@
+"""
+Approximate nearest neighbours for the KNN pipeline, in NumPy.
+
+The training points are partitioned by k-means into n_lists cells (an
+inverted file index). A query only computes the distances to the points
+of the n_probe cells whose centroids are the nearest, instead of to all
+the training points, so n_probe trades the recall of the neighbours for
+the speed of the queries: n_probe = n_lists is the exact search.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+
+def squared_distances(X, Y):
+  """
+  Squared euclidean distances between the rows of X and the rows of Y.
+  """
+  distances = -2*X @ Y.T
+  distances += np.einsum('ij,ij->i', X, X)[:, None]
+  distances += np.einsum('ij,ij->i', Y, Y)[None, :]
+  return np.maximum(distances, 0, out=distances)
+
+
+def kmeans(X, n_clusters, n_iter=10, batch_size=65536, rng=None):
+  """
+  Centroids of n_clusters clusters of the rows of X, by n_iter Lloyd
+  iterations from randomly chosen rows. Empty clusters keep their centroid.
+  """
+  rng = np.random.default_rng(rng)
+  centroids = X[rng.choice(len(X), n_clusters, replace=False)].astype(np.float64)
+  for _ in range(n_iter):
+    labels = assign(X, centroids, batch_size)
+    counts = np.bincount(labels, minlength=n_clusters)
+    sums = np.column_stack([np.bincount(labels, X[:, j], minlength=n_clusters)
+                            for j in range(X.shape[1])])
+    filled = counts > 0
+    centroids[filled] = sums[filled]/counts[filled, None]
+  return centroids
+
+
+def assign(X, centroids, batch_size=65536):
+  """
+  Nearest centroid of each row of X, batch_size rows at a time.
+  """
+  return np.concatenate([squared_distances(X[i:i+batch_size], centroids).argmin(axis=1)
+                         for i in range(0, len(X), batch_size)] or [np.empty(0, dtype=np.intp)])
+
+
+class IVFIndex:
+  """
+  Inverted file index of points: the points are sorted by their k-means
+  cell, so the points of a cell are contiguous.
+
+  ...
+  Attributes
+  ----------
+  centroids : numpy.ndarray
+    centroid of each cell
+  starts : numpy.ndarray
+    position of the first point of each cell, followed by the number of points
+  points : numpy.ndarray
+    the points, sorted by cell
+  order : numpy.ndarray
+    index of each sorted point among the indexed points
+
+  Methods
+  -------
+  search(Q, k, n_probe)
+    Approximate k nearest neighbours of the rows of Q.
+  """
+
+  def __init__(self, X, n_lists, n_iter=10, max_train=None, rng=None):
+    rng = np.random.default_rng(rng)
+    X = np.asarray(X)
+    sample = X
+    if max_train is not None and len(X) > max_train:
+      sample = X[rng.choice(len(X), max_train, replace=False)]
+    n_lists = max(1, min(n_lists, len(sample)))
+    self.centroids = kmeans(sample, n_lists, n_iter, rng=rng)
+    cells = assign(X, self.centroids)
+    self.order = np.argsort(cells, kind='stable')
+    self.points = X[self.order]
+    self.starts = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=n_lists))))
+
+  def _exact(self, Q, k):
+    distances = squared_distances(Q, self.points)
+    nearest = np.argpartition(distances, k-1, axis=1)[:, :k]
+    return np.take_along_axis(distances, nearest, axis=1), nearest
+
+  def search(self, Q, k, n_probe=8):
+    """
+    Approximate k nearest neighbours of the rows of Q, among the points of
+    the n_probe cells nearest to each row.
+
+    The queries are grouped by probed cell, so the distances to the
+    points of a cell are a single matrix product, and the k nearest
+    points of each probed cell are merged into the k nearest overall.
+
+    Returns
+    -------
+    distances : numpy.ndarray
+      euclidean distances of the neighbours, nearest first
+    indices : numpy.ndarray
+      indices of the neighbours among the indexed points
+    """
+    Q = np.asarray(Q, dtype=self.points.dtype)
+    n_probe = min(n_probe, len(self.centroids))
+    probes = np.concatenate([
+        np.argpartition(squared_distances(Q[i:i+65536], self.centroids), n_probe-1,
+                        axis=1)[:, :n_probe] for i in range(0, len(Q), 65536)]
+        or [np.empty((0, n_probe), dtype=np.intp)]).reshape(-1)
+    by_cell = np.argsort(probes, kind='stable')
+    bounds = np.searchsorted(probes[by_cell], np.arange(len(self.centroids)+1))
+    query_norms = np.einsum('ij,ij->i', Q, Q)
+    point_norms = np.einsum('ij,ij->i', self.points, self.points)
+
+    # the k nearest points of each probed cell, one slot of k columns per probe
+    candidates = np.full((len(Q), n_probe*k), np.inf)
+    positions = np.zeros((len(Q), n_probe*k), dtype=np.intp)
+    for cell in range(len(self.centroids)):
+      first, last = self.starts[cell], self.starts[cell+1]
+      pairs = by_cell[bounds[cell]:bounds[cell+1]]
+      if first == last or len(pairs) == 0:
+        continue
+      query, slot = np.divmod(pairs, n_probe)
+      distances = query_norms[query, None] + point_norms[None, first:last]
+      distances -= 2*Q[query] @ self.points[first:last].T
+      n = min(k, last-first)
+      nearest = np.argpartition(distances, n-1, axis=1)[:, :n] if n < last-first else \
+          np.broadcast_to(np.arange(n), (len(pairs), n))
+      columns = slot[:, None]*k + np.arange(n)
+      candidates[query[:, None], columns] = np.take_along_axis(distances, nearest, axis=1)
+      positions[query[:, None], columns] = first + nearest
+
+    nearest = np.argpartition(candidates, k-1, axis=1)[:, :k]
+    distances = np.take_along_axis(candidates, nearest, axis=1)
+    positions = np.take_along_axis(positions, nearest, axis=1)
+    # queries whose probed cells hold fewer than k points are searched exactly
+    short = np.isinf(distances).any(axis=1)
+    if short.any():
+      distances[short], positions[short] = self._exact(Q[short], k)
+    rank = np.argsort(distances, axis=1, kind='stable')
+    distances = np.sqrt(np.maximum(np.take_along_axis(distances, rank, axis=1), 0))
+    return distances, self.order[np.take_along_axis(positions, rank, axis=1)]
+
+
+class ApproxKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+  """
+  K nearest neighbours classifier, with uniform weights like
+  KNeighborsClassifier(), whose neighbours are searched in an IVFIndex.
+
+  ...
+  Attributes
+  ----------
+  n_neighbors : int
+    number of neighbours voting for the class of a sample
+  n_lists : int
+    number of cells of the index, about the square root of the number of
+    training points if None
+  n_probe : int
+    number of cells searched by each query, the larger the higher the
+    recall and the slower the queries
+  n_iter : int
+    k-means iterations building the cells
+  max_train : int
+    number of training points sampled to compute the cells, all if None
+  random_state : int
+    seed of the k-means initialization
+
+  Methods
+  -------
+  fit(X, y)
+    Index the training points.
+  kneighbors(X, n_neighbors, return_distance)
+    Approximate neighbours of the rows of X.
+  predict(X)
+    Majority class of the neighbours, ties going to the first class.
+  """
+
+  def __init__(self, n_neighbors=5, n_lists=None, n_probe=8, n_iter=10, max_train=65536,
+               random_state=None):
+    self.n_neighbors = n_neighbors
+    self.n_lists = n_lists
+    self.n_probe = n_probe
+    self.n_iter = n_iter
+    self.max_train = max_train
+    self.random_state = random_state
+
+  def fit(self, X, y):
+    X = np.asarray(X)
+    self.classes_, self._y = np.unique(y, return_inverse=True)
+    n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+    self.index_ = IVFIndex(X, n_lists, self.n_iter, self.max_train, self.random_state)
+    return self
+
+  def kneighbors(self, X, n_neighbors=None, return_distance=True):
+    distances, indices = self.index_.search(X, n_neighbors or self.n_neighbors, self.n_probe)
+    return (distances, indices) if return_distance else indices
+
+  def predict_proba(self, X):
+    labels = self._y[self.kneighbors(X, return_distance=False)]
+    votes = (labels[:, :, None] == np.arange(len(self.classes_))).sum(axis=1)
+    return votes/labels.shape[1]
+
+  def predict(self, X):
+    return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
@@ -0,0 +1,211 @@
+"""
+Reading of Matlab files straight out of the RAR/ZIP archives of the
+databases, and parallel extraction when the files are needed on disk.
+
+RAR archives are read with the optional rarfile package (which needs an
+unrar tool installed); ZIP archives only need the standard library.
+"""
+
+import io
+import os
+import zlib
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import scipy.io
+
+# Unpack Tools
+from pyunpack import Archive
+
+
+def open_archive(archive_name):
+  """
+  Opens a RAR or ZIP archive with the zipfile-like interface.
+  """
+  if archive_name.lower().endswith('.rar'):
+    try:
+      import rarfile
+    except ImportError:
+      raise ImportError("rarfile is required to read RAR archives without extracting them")
+    return rarfile.RarFile(archive_name)
+  return zipfile.ZipFile(archive_name)
+
+
+def can_read(archive_name):
+  """
+  Whether the archive can be read without extracting it: always for ZIP,
+  for RAR only if rarfile and its unrar tool are installed.
+  """
+  if not archive_name.lower().endswith('.rar'):
+    return True
+  try:
+    import rarfile
+  except ImportError:
+    return False
+  try:
+    if hasattr(rarfile, 'tool_setup'):
+      rarfile.tool_setup()
+  except rarfile.Error:
+    return False
+  return True
+
+
+def archive_members(archive_name):
+  """
+  Returns a dict with the size and the CRC-32 of each file in the archive,
+  the keys being the member names with forward slashes.
+  """
+  with open_archive(archive_name) as archive:
+    return {info.filename.replace('\\', '/'): (info.file_size, info.CRC)
+            for info in archive.infolist() if not info.is_dir()}
+
+
+def crc32(file_name, chunk_size=1<<20):
+  """
+  CRC-32 of a file, as stored in RAR/ZIP archives.
+  """
+  crc = 0
+  with open(file_name, 'rb') as handle:
+    for chunk in iter(lambda: handle.read(chunk_size), b''):
+      crc = zlib.crc32(chunk, crc)
+  return crc
+
+
+def is_extracted(archive_name, dirname, verify=False, files=None):
+  """
+  Whether every member of the archive is present in dirname with the
+  right size (and the right CRC-32, if verify is True).
+
+  When the archive cannot be listed (RAR without rarfile), the check is
+  made on disk: every file of files, if given, or else the folder named
+  after the archive (e.g. K001 for K001.rar) must exist.
+  """
+  if not can_read(archive_name):
+    if files is not None:
+      return all(os.path.isfile(file_name) for file_name in files)
+    stem = os.path.splitext(os.path.basename(archive_name))[0]
+    return os.path.isdir(os.path.join(dirname, stem))
+  members = archive_members(archive_name)
+  for name, (size, crc) in members.items():
+    file_name = os.path.join(dirname, name)
+    if not os.path.isfile(file_name) or os.path.getsize(file_name) != size:
+      return False
+    if verify and crc32(file_name) != crc:
+      return False
+  return True
+
+
+def _extract(archive_name, dirname, verify, files):
+  if is_extracted(archive_name, dirname, verify, files):
+    return False
+  Archive(archive_name).extractall(dirname)
+  return True
+
+
+def extract_archives(archives, dirname, n_jobs=None, verify=False, files=None):
+  """
+  Extract the archives into dirname in parallel, one archive per process,
+  skipping the archives whose members are already present and verified.
+  files is an optional dict from the archives to the files expected from
+  them, checked instead of the members when an archive cannot be listed.
+
+  Returns
+  -------
+  extracted : list
+    names of the archives actually extracted
+  """
+  files = files or {}
+  with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+    done = list(executor.map(_extract, archives, [dirname]*len(archives),
+                             [verify]*len(archives),
+                             [files.get(archive) for archive in archives]))
+  return [archive for archive, extracted in zip(archives, done) if extracted]
+
+
+class ArchiveReader:
+  """
+  Reads Matlab files from a directory or, when they were not extracted,
+  straight from the archives that contain them.
+
+  A file name dirname/member is looked up as member in the archives, i.e.
+  as if the archives had been extracted into dirname.
+
+  ...
+  Attributes
+  ----------
+  archives : list
+    RAR or ZIP archive file names
+  dirname : str
+    directory where the archives would be extracted
+
+  Methods
+  -------
+  read(file_name)
+    Return the bytes of a file.
+  loadmat(file_name)
+    Load a Matlab file, as scipy.io.loadmat.
+  """
+
+  def __init__(self, archives, dirname):
+    self.archives = list(archives)
+    self.dirname = dirname
+    self._members = None
+    self._open = {}
+
+  def __getstate__(self):
+    # archive handles are opened again in each process
+    state = self.__dict__.copy()
+    state['_open'] = {}
+    return state
+
+  @property
+  def members(self):
+    """
+    The keys are member names and the values the archives containing them.
+    """
+    if self._members is None:
+      self._members = {}
+      for archive_name in self.archives:
+        # unreadable archives must have been extracted into dirname
+        if os.path.isfile(archive_name) and can_read(archive_name):
+          for name in archive_members(archive_name):
+            self._members[name] = archive_name
+    return self._members
+
+  def member(self, file_name):
+    """
+    Archive and member name of file_name, or None if it is in no archive.
+    """
+    name = os.path.relpath(file_name, self.dirname).replace(os.sep, '/')
+    for candidate in (name, name+'.mat'):
+      if candidate in self.members:
+        return self.members[candidate], candidate
+    return None
+
+  def read(self, file_name):
+    """
+    Returns the bytes of file_name, from disk if it exists or else from
+    its archive.
+    """
+    for candidate in (file_name, file_name+'.mat'):
+      if os.path.isfile(candidate):
+        with open(candidate, 'rb') as handle:
+          return handle.read()
+    found = self.member(file_name)
+    if found is None:
+      raise FileNotFoundError(file_name)
+    archive_name, name = found
+    if archive_name not in self._open:
+      self._open[archive_name] = open_archive(archive_name)
+    return self._open[archive_name].read(name)
+
+  def loadmat(self, file_name, **kwargs):
+    """
+    Loads the Matlab file_name, see scipy.io.loadmat.
+    """
+    return scipy.io.loadmat(io.BytesIO(self.read(file_name)), **kwargs)
+
+  def close(self):
+    for archive in self._open.values():
+      archive.close()
+    self._open = {}
@@ -0,0 +1,454 @@
+"""
+Benchmarks of the experiment framework stages.
+
+Each stage (loadmat ingestion, Experimenter.segmentate,
+StatisticalTime.transform and fit/predict of each pipeline of
+Classifiers()) is timed and memory profiled for every combination of the
+swept parameters, on synthetic acquisitions, so no database is needed.
+The results are written as JSON and compared with a saved baseline.
+
+Usage:
+  python benchmark.py --output results.json
+  python benchmark.py --baseline baseline.json   # flags regressions
+  python benchmark.py --save-baseline baseline.json
+  python benchmark.py --dtypes --database paderborn   # float32 vs float64
+  python benchmark.py --search --database paderborn   # halving/path vs grid search
+  python benchmark.py --neighbors --hop 512   # approximate vs exact KNN
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.io
+import scipy.stats as stats
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from approxknn import ApproxKNeighborsClassifier
+from classifiers import Classifiers, StatisticalTime, rms, sra, ppv, cf, ifa, mf, sf, kf
+from experimenter import Experimenter, split_stateless
+from metadata import parse_key, parse_cwru_key
+
+
+def statistical_time_rowwise(X):
+  """
+  Reference row by row implementation of the StatisticalTime features.
+  """
+  return np.array([[rms(x), sra(x), stats.kurtosis(x), stats.skew(x), ppv(x),
+                    cf(x), ifa(x), mf(x), sf(x), kf(x)] for x in X[:,:]])
+
+
+def timeit(function, *args, repeat=3):
+  """
+  Returns the best wall time of some calls to function and its last result.
+  """
+  best = np.inf
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = function(*args)
+    best = min(best, time.perf_counter()-start)
+  return best, result
+
+
+def measure(function, *args, repeat=3):
+  """
+  Best wall and CPU time of repeat calls of function, and the peak of
+  memory allocated by one more call (traced apart, so tracing does not
+  slow down the timed calls).
+
+  Returns
+  -------
+  record : dict
+    wall (s), cpu (s) and peak_mb (MiB)
+  result : object
+    the result of the last call
+  """
+  wall = cpu = np.inf
+  with contextlib.redirect_stdout(io.StringIO()):
+    for _ in range(repeat):
+      start_wall, start_cpu = time.perf_counter(), time.process_time()
+      result = function(*args)
+      wall = min(wall, time.perf_counter()-start_wall)
+      cpu = min(cpu, time.process_time()-start_cpu)
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return {'wall': wall, 'cpu': cpu, 'peak_mb': peak/2**20}, result
+
+
+def synthetic_acquisitions(n_acquisitions, acquisition_length, seed=42):
+  """
+  Acquisitions dict, as returned by the loaders, with random signals of the
+  three conditions.
+  """
+  rng = np.random.default_rng(seed)
+  acquisitions = {}
+  for i in range(n_acquisitions):
+    condition = "NIO"[i % 3]
+    key = "{}_{}".format({"N": "Normal", "I": "IR", "O": "OR"}[condition], i)
+    acquisitions[key] = rng.standard_normal(acquisition_length)*(1+0.5*"NIO".index(condition))
+  return {'conditions': {"N": "normal", "I": "inner", "O": "outer"},
+          'dirdest': None, 'acquisitions': acquisitions}
+
+
+def load_matlab_files(files_name):
+  return [scipy.io.loadmat(file_name) for file_name in files_name]
+
+
+def benchmark_stages(sample_size, n_acquisitions, acquisition_length, repeat=3,
+                     classifiers=True):
+  """
+  Measures every stage for one combination of the parameters.
+
+  Returns
+  -------
+  records : list
+    one dict per stage, with its parameters and measures
+  """
+  params = {'sample_size': sample_size, 'n_acquisitions': n_acquisitions,
+            'acquisition_length': acquisition_length}
+  records = []
+  acquisitions_data = synthetic_acquisitions(n_acquisitions, acquisition_length)
+
+  with tempfile.TemporaryDirectory() as dirname:
+    files_name = []
+    for key, signal in acquisitions_data['acquisitions'].items():
+      files_name.append(os.path.join(dirname, key+'.mat'))
+      scipy.io.savemat(files_name[-1], {key: signal.reshape(-1, 1)})
+    record, _ = measure(load_matlab_files, files_name, repeat=repeat)
+    records.append(dict(params, stage='loadmat', n_windows=0, **record))
+
+  experimenter = Experimenter(acquisitions_data, sample_size)
+  record, _ = measure(experimenter.segmentate, repeat=repeat)
+  X = experimenter.signal_dt
+  y = np.asarray(experimenter.signal_or)
+  records.append(dict(params, stage='segmentate', n_windows=len(X), **record))
+
+  record, _ = measure(StatisticalTime().transform, X, repeat=repeat)
+  records.append(dict(params, stage='StatisticalTime.transform', n_windows=len(X), **record))
+
+  if classifiers:
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+    for clf_name, estimator in Classifiers():
+      record, _ = measure(estimator.fit, X_train, y_train, repeat=1)
+      records.append(dict(params, stage=clf_name+' fit', n_windows=len(X_train), **record))
+      record, _ = measure(estimator.predict, X_test, repeat=repeat)
+      records.append(dict(params, stage=clf_name+' predict', n_windows=len(X_test), **record))
+
+  return records
+
+
+def compare(records, baseline, tolerance=0.2, min_wall=0.01):
+  """
+  Flags the stages slower (wall time) or hungrier (peak memory) than the
+  baseline by more than tolerance. Stages faster than min_wall seconds in
+  the baseline are only checked for memory, their timings being noise.
+
+  Returns
+  -------
+  regressions : list
+    messages describing the regressions
+  """
+  def key(record):
+    return (record['stage'], record['sample_size'], record['n_acquisitions'],
+            record['acquisition_length'])
+  reference = {key(record): record for record in baseline['records']}
+  regressions = []
+  for record in records:
+    old = reference.get(key(record))
+    if old is None:
+      continue
+    for measure_name in ('wall', 'peak_mb'):
+      if measure_name == 'wall' and old['wall'] < min_wall:
+        continue
+      if record[measure_name] > old[measure_name]*(1+tolerance):
+        regressions.append("{} (sample_size={}, n_acquisitions={}): {} {:.4g} -> {:.4g}".format(
+            record['stage'], record['sample_size'], record['n_acquisitions'],
+            measure_name, old[measure_name], record[measure_name]))
+  return regressions
+
+
+def benchmark_statistical_time(n_segments=1000, sample_size=8192, seed=42):
+  """
+  Compares the batched StatisticalTime.transform with the row by row
+  feature extraction on random segments.
+  """
+  X = np.random.default_rng(seed).standard_normal((n_segments, sample_size))
+  t_row, ref = timeit(statistical_time_rowwise, X)
+  t_batch, new = timeit(StatisticalTime().transform, X)
+  print("StatisticalTime ({} x {})".format(n_segments, sample_size))
+  print("row by row: {:.3f}s  batch: {:.3f}s  speedup: {:.1f}x".format(
+      t_row, t_batch, t_row/t_batch))
+  print("max relative difference: {:.2e}".format(np.max(np.abs(new-ref)/np.abs(ref))))
+
+
+def load_cwru():
+  """
+  Imports the CWRU reader, cwru.py at the root of the repository, whose
+  database module is not the one of the framework.
+  """
+  root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  framework_database = sys.modules.pop('database', None)
+  sys.path.insert(0, root)
+  try:
+    import cwru
+  finally:
+    sys.path.remove(root)
+    if framework_database is not None:
+      sys.modules['database'] = framework_database
+  return cwru
+
+
+def load_database(name):
+  """
+  Acquisitions of a database (synthetic, cwru, mfpt or paderborn) and the
+  parser of their keys.
+  """
+  if name == 'cwru':
+    cwru = load_cwru()
+    reader = cwru.CWRU()
+    reader.download()
+    acquisitions = cwru.get_tensors_from_matlab(reader.files, reader.rawfilesdir,
+                                                reader.n_jobs, dtype=reader.dtype)
+    return {'acquisitions': acquisitions}, parse_cwru_key
+  if name == 'mfpt':
+    from mfpt import MFPT
+    return MFPT().load(), parse_key
+  if name == 'paderborn':
+    from paderborn import Paderborn
+    return Paderborn().load(), parse_key
+  from synthetic import Synthetic
+  return Synthetic(n_repetitions=2, duration=2.0).acquisitions(), parse_key
+
+
+def benchmark_dtypes(acquisitions_data, sample_size=8192, dtypes=(np.float64, np.float32),
+                     parse=parse_key):
+  """
+  Compares the memory of the segments, the feature extraction time, the
+  features and the accuracy of each pipeline of Classifiers() (train/test
+  split) computed in each dtype with those of the first one.
+
+  Returns
+  -------
+  report : dict
+    the keys are the dtype names and the values their measures
+  """
+  report = {}
+  reference = None
+  for dtype in dtypes:
+    experimenter = Experimenter(acquisitions_data, sample_size, dtype=dtype, parse=parse)
+    with contextlib.redirect_stdout(io.StringIO()):
+      experimenter.segmentate()
+    X = experimenter.signal_dt
+    y = np.asarray(experimenter.signal_or)
+    seconds, features = timeit(StatisticalTime().transform, X)
+    if reference is None:
+      reference = features
+    scale = np.nanmax(np.abs(reference), axis=0)
+    drift = np.nanmax(np.abs(features-reference)/scale, axis=0)
+    accuracy = {}
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+    for clf_name, estimator in Classifiers(dtype=dtype):
+      # seeded, so only the dtype differs between the runs
+      estimator.set_params(**{name: 0 for name in estimator.get_params()
+                              if name.endswith('random_state')})
+      accuracy[clf_name] = float(np.mean(estimator.fit(X_train, y_train).predict(X_test) == y_test))
+    report[np.dtype(dtype).name] = {'segments_mb': X.nbytes/2**20, 'features_seconds': seconds,
+                                    'max_feature_drift': float(drift.max()),
+                                    'feature_drift': drift.tolist(), 'accuracy': accuracy}
+  return report
+
+
+def benchmark_search(acquisitions_data, sample_size=8192, searches=("grid", "halving", "path"),
+                     parse=parse_key):
+  """
+  Compares the hyperparameter searches of Classifiers(): number of fits
+  (candidates times inner folds, or the models fitted by PathSearchCV,
+  plus the refit), wall time, best parameters and accuracy (train/test
+  split) of each pipeline. The
+  StatisticalTime features are extracted once, before the searches.
+
+  Returns
+  -------
+  report : dict
+    the keys are the search names and the values their measures
+  """
+  experimenter = Experimenter(acquisitions_data, sample_size, parse=parse)
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate()
+  y = np.asarray(experimenter.signal_or)
+  train, test = train_test_split(np.arange(len(y)), test_size=0.3, random_state=42)
+  features = None
+  report = {}
+  for search in searches:
+    report[search] = {}
+    for clf_name, estimator in Classifiers(search=search):
+      steps, estimator = split_stateless(estimator)
+      if features is None:
+        features = experimenter.signal_dt
+        for _, step in steps:
+          features = step.transform(features)
+      estimator.set_params(**{name: 0 for name in estimator.get_params()
+                              if name.endswith('random_state') and name != 'random_state'})
+      start = time.perf_counter()
+      estimator.fit(features[train], y[train])
+      seconds = time.perf_counter()-start
+      fits = getattr(estimator, 'n_fits_', None)
+      if fits is None:
+        fits = len(estimator.cv_results_['params'])*estimator.n_splits_
+      fits += 1
+      accuracy = float(np.mean(estimator.predict(features[test]) == y[test]))
+      report[search][clf_name] = {'fits': fits, 'seconds': seconds, 'accuracy': accuracy,
+                                  'best_params': {name: repr(value) for name, value
+                                                  in estimator.best_params_.items()}}
+  return report
+
+
+def benchmark_neighbors(acquisitions_data, sample_size=8192, hop=None, n_neighbors=15,
+                        n_probes=(1, 2, 4, 8, 16, 32), parse=parse_key):
+  """
+  Compares ApproxKNeighborsClassifier, for each n_probe, with the exact
+  KNeighborsClassifier on the scaled StatisticalTime features of the
+  windows (overlapping, for a small hop), with a train/test split: fit
+  time, query throughput, recall of the exact neighbours and accuracy.
+
+  Returns
+  -------
+  report : dict
+    the keys are "exact" and "n_probe=..." and the values their measures
+  """
+  # the features of overlapping windows, without copying the windows
+  X, y, _ = Experimenter(acquisitions_data, sample_size, hop, parse=parse).rolling_features()
+  X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+  scaler = StandardScaler().fit(X_train)
+  X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+
+  def run(estimator):
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_seconds = time.perf_counter()-start
+    start = time.perf_counter()
+    neighbors = estimator.kneighbors(X_test, return_distance=False)
+    query_seconds = time.perf_counter()-start
+    accuracy = float(np.mean(estimator.predict(X_test) == y_test))
+    return neighbors, {'fit_seconds': fit_seconds, 'queries_per_second': len(X_test)/query_seconds,
+                       'accuracy': accuracy}
+
+  exact, measures = run(KNeighborsClassifier(n_neighbors))
+  report = {'exact': dict(measures, recall=1.0, accuracy_loss=0.0,
+                          n_train=len(X_train), n_test=len(X_test))}
+  for n_probe in n_probes:
+    neighbors, measures = run(ApproxKNeighborsClassifier(n_neighbors, n_probe=n_probe,
+                                                         random_state=0))
+    found = (neighbors[:, :, None] == exact[:, None, :]).any(axis=2)
+    report['n_probe={}'.format(n_probe)] = dict(
+        measures, recall=float(found.mean()),
+        accuracy_loss=report['exact']['accuracy']-measures['accuracy'])
+  return report
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+  parser.add_argument('--sample-sizes', type=int, nargs='+', default=[1024, 8192])
+  parser.add_argument('--acquisitions', type=int, nargs='+', default=[6, 24])
+  parser.add_argument('--acquisition-length', type=int, default=256000)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--no-classifiers', action='store_true',
+                      help="skip fit/predict of the pipelines")
+  parser.add_argument('--rowwise', action='store_true',
+                      help="compare StatisticalTime with the row by row features")
+  parser.add_argument('--output', default='benchmark_results.json')
+  parser.add_argument('--baseline', help="results to compare with")
+  parser.add_argument('--save-baseline', help="also save the results as baseline")
+  parser.add_argument('--tolerance', type=float, default=0.2)
+  parser.add_argument('--dtypes', action='store_true',
+                      help="compare float32 with float64 (memory, features and accuracy)")
+  parser.add_argument('--search', action='store_true',
+                      help="compare the halving and path searches with the exhaustive grid search")
+  parser.add_argument('--neighbors', action='store_true',
+                      help="compare the approximate KNN with the exact one")
+  parser.add_argument('--hop', type=int, help="hop of the windows of --neighbors")
+  parser.add_argument('--database', default='synthetic',
+                      choices=['synthetic', 'cwru', 'mfpt', 'paderborn'])
+  args = parser.parse_args(argv)
+
+  if args.neighbors:
+    acquisitions_data, parse = load_database(args.database)
+    report = benchmark_neighbors(acquisitions_data, args.sample_sizes[-1], args.hop, parse=parse)
+    print("{} training and {} test windows".format(report['exact']['n_train'],
+                                                    report['exact']['n_test']))
+    for name, m in report.items():
+      print("{:<12} fit {:>7.2f}s {:>10.0f} queries/s recall {:.3f} accuracy {:.4f} "
+            "(loss {:+.4f})".format(name, m['fit_seconds'], m['queries_per_second'],
+                                    m['recall'], m['accuracy'], m['accuracy_loss']))
+    with open(args.output, 'w') as handle:
+      json.dump({'database': args.database, 'neighbors': report}, handle, indent=1)
+    return 0
+
+  if args.search:
+    acquisitions_data, parse = load_database(args.database)
+    report = benchmark_search(acquisitions_data, args.sample_sizes[-1], parse=parse)
+    for search, measures in report.items():
+      print("{} search: {} fits, {:.2f}s".format(
+          search, sum(m['fits'] for m in measures.values()),
+          sum(m['seconds'] for m in measures.values())))
+      for clf_name, m in measures.items():
+        print("  {:<20} fits {:>4} {:>8.2f}s accuracy {:.4f} {}".format(
+            clf_name, m['fits'], m['seconds'], m['accuracy'], m['best_params']))
+    with open(args.output, 'w') as handle:
+      json.dump({'database': args.database, 'searches': report}, handle, indent=1)
+    return 0
+
+  if args.dtypes:
+    acquisitions_data, parse = load_database(args.database)
+    report = benchmark_dtypes(acquisitions_data, args.sample_sizes[-1], parse=parse)
+    for name, measures in report.items():
+      print("{}: segments {:.1f}MiB, features {:.3f}s, max relative feature drift {:.2e}".format(
+          name, measures['segments_mb'], measures['features_seconds'], measures['max_feature_drift']))
+      for clf_name, accuracy in measures['accuracy'].items():
+        print("  {:<20} accuracy {:.4f}".format(clf_name, accuracy))
+    with open(args.output, 'w') as handle:
+      json.dump({'database': args.database, 'dtypes': report}, handle, indent=1)
+    return 0
+
+  if args.rowwise:
+    benchmark_statistical_time()
+
+  records = []
+  for sample_size in args.sample_sizes:
+    for n_acquisitions in args.acquisitions:
+      for record in benchmark_stages(sample_size, n_acquisitions, args.acquisition_length,
+                                     args.repeat, not args.no_classifiers):
+        records.append(record)
+        print("{stage:<28} sample_size={sample_size:<6} n_acquisitions={n_acquisitions:<4} "
+              "windows={n_windows:<7} wall={wall:.4f}s cpu={cpu:.4f}s peak={peak_mb:.1f}MiB".format(**record))
+
+  results = {'python': platform.python_version(), 'numpy': np.__version__,
+             'machine': platform.machine(), 'records': records}
+  for file_name in filter(None, (args.output, args.save_baseline)):
+    with open(file_name, 'w') as handle:
+      json.dump(results, handle, indent=1)
+
+  if args.baseline:
+    with open(args.baseline) as handle:
+      regressions = compare(records, json.load(handle), args.tolerance)
+    for regression in regressions:
+      print("REGRESSION:", regression)
+    if regressions:
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -2,7 +2,7 @@
 
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection import GridSearchCV, ParameterGrid
 
 import numpy as np
 import scipy.stats as stats
@@ -65,48 +65,173 @@ def kf(x):
   return stats.kurtosis(x)/(np.mean(x**2)**2)
 
 
+def statistical_time(X, dtype=None):
+  '''
+  statistical time features of each row of X, computed in batch
+
+  All ten features of StatisticalTime are obtained with a few axis-wise
+  passes over the whole segment matrix, sharing |x|, x**2 and the central
+  moments among them.
+
+  The work arrays are of dtype (the dtype of X if None, float64 if X is
+  not floating point) while the sums are accumulated in float64, so
+  float32 halves the memory traffic but keeps the precision of the
+  moments. The features are returned in dtype.
+  '''
+  X = np.asarray(X)
+  if dtype is None:
+    dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+  X = X.astype(dtype, copy=False)
+  acc = np.float64
+  n = X.shape[1]
+  absx = np.absolute(X)
+  peak = np.max(absx, axis=1).astype(acc)
+  mean_abs = np.mean(absx, axis=1, dtype=acc)
+  np.sqrt(absx, out=absx)
+  sra_ = np.mean(absx, axis=1, dtype=acc)**2
+  del absx
+  mean = np.mean(X, axis=1, dtype=acc)
+  ppv_ = np.max(X, axis=1).astype(acc)-np.min(X, axis=1)
+  d = X - mean[:, None].astype(dtype)
+  d2 = np.square(d)
+  m2 = np.sum(d2, axis=1, dtype=acc)/n
+  d *= d2
+  m3 = np.sum(d, axis=1, dtype=acc)/n
+  d2 *= d2
+  m4 = np.sum(d2, axis=1, dtype=acc)/n
+  del d, d2
+  ms = np.einsum('ij,ij->i', X, X, dtype=acc)/n
+  rms_ = np.sqrt(ms)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # same degenerate (constant signal) handling as scipy.stats
+    zero = m2 <= (np.finfo(np.float64).resolution*mean)**2
+    kurtosis = np.where(zero, np.nan, m4/m2**2 - 3)
+    skewness = np.where(zero, np.nan, m3/m2**1.5)
+    return np.column_stack((
+                            rms_, # root mean square
+                            sra_, # square root amplitude
+                            kurtosis, # kurtosis
+                            skewness, # skewness
+                            ppv_, # peak to peak value
+                            peak/rms_, # crest factor
+                            peak/mean_abs, # impact factor
+                            peak/sra_, # margin factor
+                            rms_/mean_abs, # shape factor
+                            kurtosis/ms**2, # kurtosis factor
+                            )).astype(dtype, copy=False)
+
+
 class StatisticalTime(TransformerMixin):
   '''
   Extracts statistical features from the time domain.
+
+  It is stateless: fit learns nothing, so the features of each segment
+  can be computed once and reused by every fold.
+
+  dtype is the floating point type of the computation and of the
+  features, the dtype of the segments if None.
   '''
+  stateless = True
+
+  def __init__(self, dtype=None):
+    self.dtype = dtype
   def fit(self, X, y=None):
     return self
   def transform(self, X, y=None):
-    return np.array([
-                     [
-                      rms(x), # root mean square
-                      sra(x), # square root amplitude
-                      stats.kurtosis(x), # kurtosis
-                      stats.skew(x), # skewness
-                      ppv(x), # peak to peak value
-                      cf(x), # crest factor
-                      ifa(x), # impact factor
-                      mf(x), # margin factor
-                      sf(x), # shape factor
-                      kf(x), # kurtosis factor
-                      ] for x in X[:,:]
-                     ])
-
-def Classifiers():
+    return statistical_time(X, self.dtype)
+
+def Classifiers(cachedir=None, dtype=None, search="grid", neighbors="exact"):
+    '''
+    Returns the chosen classifiers. If cachedir is given, the extracted
+    features are kept in a FeatureStore in that directory, so identical
+    segments are featurized only once, even across runs. dtype (e.g.
+    np.float32) is the type of the features, and so of the scaler, the
+    dtype of the segments if None.
+
+    search is the hyperparameter search of each pipeline: "grid" for an
+    exhaustive GridSearchCV, "halving" for a HalvingGridSearchCV that
+    evaluates all the candidates on a third of the training set and keeps
+    the best third of them at each iteration, the last one using the whole
+    set. Halving fits more models than the grid, on fewer samples, so KNN
+    (whose fit just stores the samples) and grids with nothing to halve
+    (MLP) keep GridSearchCV. For the random forest the budget is the number
+    of trees instead: rf__n_estimators is dropped from the grid, and the
+    best half of the candidates is kept at each iteration, the last one
+    with the largest n_estimators of the grid, so the candidates are not
+    the ones of the grid search. "path" gives the scores of
+    the grid search with a PathSearchCV, which queries the neighbours
+    once for all the k of KNN and grows the forests tree by tree over
+    n_estimators.
+
+    neighbors is the neighbour search of KNN: "exact" for
+    KNeighborsClassifier, "approximate" for an ApproxKNeighborsClassifier,
+    which only searches the cells of an inverted file index nearest to
+    each query, faster on large training sets at the cost of some recall.
+    '''
+
+    def Search(pipeline, param_grid, resource='n_samples'):
+      # resource is the budget of the halving search, None for no halving
+      if search == "grid" or (search == "halving" and resource is None):
+        return GridSearchCV(pipeline, param_grid)
+      if search == "path":
+        from pathsearch import PathSearchCV
+        return PathSearchCV(pipeline, param_grid)
+      if search != "halving":
+        raise ValueError("unknown search: {}".format(search))
+      from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+      from sklearn.model_selection import HalvingGridSearchCV
+      halving_grid = dict(param_grid)
+      factor, min_resources, max_resources = 3, 'exhaust', 'auto'
+      if resource != 'n_samples':
+        # the budget replaces the grid of the resource, up to its largest value
+        factor, max_resources = 2, max(halving_grid.pop(resource))
+      n_candidates = len(ParameterGrid(halving_grid))
+      if n_candidates < factor:
+        # a single iteration, the whole budget for every candidate
+        return GridSearchCV(pipeline, param_grid)
+      if resource != 'n_samples':
+        # the last iteration must use max_resources, a value of the grid,
+        # to be reported in best_params_
+        n_iterations = 1
+        while factor**n_iterations <= n_candidates:
+          n_iterations += 1
+        min_resources, remainder = divmod(max_resources, factor**(n_iterations-1))
+        if remainder:
+          raise ValueError("{} of {} is not halved {} times".format(
+              max_resources, resource, n_iterations-1))
+      return HalvingGridSearchCV(pipeline, halving_grid, factor=factor, resource=resource,
+                                 max_resources=max_resources, min_resources=min_resources,
+                                 random_state=42)
+
+    def FeatureExtraction():
+      if cachedir is None:
+        return StatisticalTime(dtype)
+      from featurestore import FeatureStore
+      return FeatureStore(StatisticalTime(dtype), cachedir)
 
     # KNN
-    from sklearn.neighbors import KNeighborsClassifier
+    if neighbors == "approximate":
+      from approxknn import ApproxKNeighborsClassifier as KNeighborsClassifier
+    elif neighbors == "exact":
+      from sklearn.neighbors import KNeighborsClassifier
+    else:
+      raise ValueError("unknown neighbors: {}".format(neighbors))
 
     knn = Pipeline([
-                    ('FeatureExtraction', StatisticalTime()),
+                    ('FeatureExtraction', FeatureExtraction()),
                     ('scaler', StandardScaler()),
                     ('knn', KNeighborsClassifier()),
                     ])
 
     parameters_knn = {'knn__n_neighbors': list(range(1,16,2))}
 
-    knn = GridSearchCV(knn, parameters_knn)
+    knn = Search(knn, parameters_knn, resource=None)
 
     # SVM
     from sklearn.svm import SVC
 
     svm = Pipeline([
-                    ('FeatureExtraction', StatisticalTime()),
+                    ('FeatureExtraction', FeatureExtraction()),
                     ('scaler', StandardScaler()),
                     ('svc', SVC()),
                     ])
@@ -116,13 +241,13 @@ def Classifiers():
         'svc__gamma': [10**x for x in range(-2,1)],
         }
 
-    svm = GridSearchCV(svm, parameters_svm)
+    svm = Search(svm, parameters_svm)
 
     # MLP
     from sklearn.neural_network import MLPClassifier
 
     mlp = Pipeline([
-                    ('FeatureExtraction', StatisticalTime()),
+                    ('FeatureExtraction', FeatureExtraction()),
                     ('scaler', StandardScaler()),
                     ('mlp', MLPClassifier()),
                     ])
@@ -133,14 +258,14 @@ def Classifiers():
         'mlp__hidden_layer_sizes' : [(5, 2)],
         }
 
-    mlp = GridSearchCV(mlp, parameters_mlp)
+    mlp = Search(mlp, parameters_mlp)
 
     # Random Forest
 
     from sklearn.ensemble import RandomForestClassifier
 
     rf = Pipeline([
-        ('FeatureExtraction', StatisticalTime()),
+        ('FeatureExtraction', FeatureExtraction()),
         ('scaler', StandardScaler()),
         ('rf', RandomForestClassifier()),
     ])
@@ -150,7 +275,7 @@ def Classifiers():
         "rf__n_estimators": [10, 100, 200],
     }
 
-    rf = GridSearchCV(rf, parameters_rf)
+    rf = Search(rf, parameters_rf, resource='rf__n_estimators')
 
 
 
@@ -0,0 +1,164 @@
+"""
+Lazy random-access view of the windows of a data set.
+"""
+
+import collections
+from collections.abc import Sequence
+
+import numpy as np
+
+from metadata import AcquisitionIndex, parse_key
+
+
+class AcquisitionCache:
+  """
+  Least recently used cache of decoded acquisitions.
+
+  ...
+  Attributes
+  ----------
+  acquisitions : Mapping
+    the acquisitions, e.g. an AcquisitionStore
+  cache_size : int
+    maximum number of acquisitions kept
+  dtype : numpy.dtype
+    data type of the cached signals, the one of the source if None
+  hits : int
+    accesses answered by the cache
+  misses : int
+    accesses that decoded an acquisition
+  """
+
+  def __init__(self, acquisitions, cache_size=8, dtype=None):
+    self.acquisitions = acquisitions
+    self.cache_size = cache_size
+    self.dtype = dtype
+    self.hits = 0
+    self.misses = 0
+    self._signals = collections.OrderedDict()
+
+  def __getitem__(self, key):
+    if key in self._signals:
+      self._signals.move_to_end(key)
+      self.hits += 1
+      return self._signals[key]
+    signal = np.asarray(self.acquisitions[key], dtype=self.dtype)
+    self.misses += 1
+    self._signals[key] = signal
+    while len(self._signals) > self.cache_size:
+      self._signals.popitem(last=False)
+    return signal
+
+
+class WindowDataset(Sequence):
+  """
+  Lazy view of the windows of the acquisitions of a loader.
+
+  When the view is built, only the metadata of the acquisitions, their
+  lengths included, are read into its index.
+  A signal is fetched (and kept in a bounded LRU cache shared by the
+  filtered views) the first time one of its windows is accessed.
+
+  ...
+  Attributes
+  ----------
+  keys : list
+    the acquisitions of the view
+  index : WindowIndex
+    metadata of the acquisitions and of the windows of the view
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between the start of consecutive windows
+  labels : numpy.ndarray
+    condition of each window
+  groups : numpy.ndarray
+    acquisition key of each window
+
+  Methods
+  -------
+  from_loader(database, sample_size)
+    View of the acquisitions of a loader, e.g. Paderborn().
+  filter(condition, bearing, setting, repetition, channel, where)
+    View of the windows of the matching acquisitions.
+  """
+
+  def __init__(self, acquisitions, sample_size, hop=None, cache_size=8, dtype=None,
+               parse=parse_key, index=None, _cache=None):
+    if index is None:
+      index = AcquisitionIndex.from_acquisitions(acquisitions, parse)
+    if isinstance(acquisitions, dict) and 'acquisitions' in acquisitions:
+      acquisitions = acquisitions['acquisitions']
+    self.acquisitions = acquisitions
+    self.sample_size = sample_size
+    self.hop = sample_size if hop is None else hop
+    self.cache = _cache or AcquisitionCache(acquisitions, cache_size, dtype)
+    self.index = index.windows(sample_size, self.hop)
+    self.keys = index.key.tolist()
+    self.offsets = self.index.starts
+
+  @property
+  def labels(self):
+    return self.index.labels
+
+  @property
+  def groups(self):
+    return self.index.groups
+
+  @classmethod
+  def from_loader(cls, database, sample_size, hop=None, cache_size=8, dtype=None):
+    """
+    View of the acquisitions returned by database.load().
+    """
+    return cls(database.load(), sample_size, hop, cache_size, dtype)
+
+  def __len__(self):
+    return int(self.offsets[-1])
+
+  def window(self, i):
+    """
+    The i-th window.
+    """
+    if i < 0:
+      i += len(self)
+    if not 0 <= i < len(self):
+      raise IndexError(i)
+    acquisition, start = self.index.locate(i)
+    signal = self.cache[self.keys[acquisition]]
+    return signal[start:start+self.sample_size].copy()
+
+  def __getitem__(self, index):
+    """
+    A window (1D array) for an integer index, or the windows (2D array)
+    for a slice or an array of indices, each acquisition being fetched once.
+    """
+    if isinstance(index, (int, np.integer)):
+      return self.window(int(index))
+    if isinstance(index, slice):
+      indices = np.arange(len(self))[index]
+    else:
+      indices = np.asarray(index, dtype=np.int64)
+      indices = np.where(indices < 0, indices+len(self), indices)
+      if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+        raise IndexError(index)
+    acquisitions, starts = self.index.locate(indices)
+    signals = {acquisition: self.cache[self.keys[acquisition]]
+               for acquisition in np.unique(acquisitions)}
+    dtype = np.result_type(*signals.values()) if signals else self.cache.dtype
+    windows = np.empty((len(indices), self.sample_size), dtype=dtype)
+    for acquisition, signal in signals.items():
+      rows = np.flatnonzero(acquisitions == acquisition)
+      windows[rows] = np.lib.stride_tricks.sliding_window_view(signal, self.sample_size)[starts[rows]]
+    return windows
+
+  def filter(self, condition=None, bearing=None, setting=None, repetition=None, channel=None,
+             where=None):
+    """
+    View of the windows of the acquisitions whose metadata (see
+    AcquisitionIndex.mask) match. Each criterion is a value or a list of
+    values, None accepting any; where is a predicate of the acquisition key.
+    """
+    acquisitions = self.index.acquisitions
+    mask = acquisitions.mask(condition, bearing, setting, repetition, channel, where)
+    return WindowDataset(self.acquisitions, self.sample_size, self.hop,
+                         index=acquisitions[mask], _cache=self.cache)
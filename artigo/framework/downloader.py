@@ -0,0 +1,261 @@
+"""
+Concurrent and resumable download engine shared by the database classes.
+
+Every file is downloaded to a ".part" file, resumed with HTTP Range
+requests when interrupted, and renamed to its final name only when
+complete. The size and SHA-256 of each finished file are kept in a
+manifest per destination directory, so a file under its final name is
+always a complete one. A file that fails the checks is downloaded again
+from scratch, never resumed.
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_FILE = ".manifest.json"
+
+
+def sha256sum(file_name, chunk_size=1<<20):
+  """
+  SHA-256 hex digest of a file.
+  """
+  digest = hashlib.sha256()
+  with open(file_name, 'rb') as handle:
+    for chunk in iter(lambda: handle.read(chunk_size), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+class Manifest:
+  """
+  Size and checksum of the complete files of one directory, saved in
+  MANIFEST_FILE.
+  """
+
+  def __init__(self, dirname):
+    self.file_name = os.path.join(dirname, MANIFEST_FILE)
+    self.lock = threading.Lock()
+    try:
+      with open(self.file_name) as handle:
+        self.entries = json.load(handle)
+    except (OSError, ValueError):
+      self.entries = {}
+
+  def get(self, name):
+    with self.lock:
+      return self.entries.get(name)
+
+  def add(self, name, size, sha256):
+    with self.lock:
+      self.entries[name] = {'size': size, 'sha256': sha256}
+      tmp_name = self.file_name + '.tmp'
+      with open(tmp_name, 'w') as handle:
+        json.dump(self.entries, handle, indent=1, sort_keys=True)
+      os.replace(tmp_name, self.file_name)
+
+
+class Progress:
+  """
+  Aggregate progress and throughput of all transfers, printed in one line.
+  """
+
+  def __init__(self, n_files, interval=0.5, stream=sys.stdout):
+    self.n_files = n_files
+    self.done = 0
+    self.nbytes = 0
+    self.total = 0
+    self.interval = interval
+    self.stream = stream
+    self.start = time.perf_counter()
+    self.last = 0
+    self.lock = threading.Lock()
+
+  def expect(self, nbytes):
+    with self.lock:
+      self.total += nbytes
+
+  def update(self, nbytes):
+    with self.lock:
+      self.nbytes += nbytes
+      now = time.perf_counter()
+      if now - self.last >= self.interval:
+        self.last = now
+        self.report()
+
+  def finish(self):
+    with self.lock:
+      self.done += 1
+      self.report()
+
+  def report(self, end=''):
+    elapsed = max(time.perf_counter() - self.start, 1e-9)
+    total = " of {:.1f}".format(self.total/2**20) if self.total else ""
+    self.stream.write("\r{}/{} files  {:.1f}{} MiB  {:.2f} MiB/s".format(
+        self.done, self.n_files, self.nbytes/2**20, total, self.nbytes/2**20/elapsed) + end)
+    self.stream.flush()
+
+
+def _remote_size(url, timeout):
+  """
+  Size of the remote file from a HEAD request, or None when unknown.
+  """
+  try:
+    request = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+      length = response.headers.get('Content-Length')
+      return int(length) if length is not None else None
+  except (urllib.error.URLError, OSError, ValueError):
+    return None
+
+
+def _content_range_total(headers):
+  """
+  Total size from a Content-Range header (e.g. "bytes */5000"), None if
+  it is missing or unknown.
+  """
+  total = (headers.get('Content-Range') or '').rpartition('/')[2]
+  return int(total) if total.isdigit() else None
+
+
+def _is_complete(url, file_name, manifest, verify, timeout):
+  """
+  Whether file_name already holds the complete file.
+
+  A file whose size or checksum differs from its manifest entry is
+  removed, to be downloaded again. Files without manifest entry (e.g.
+  downloaded before the manifest existed) are recorded in the manifest if
+  their size matches the remote size, kept as partial downloads to be
+  resumed if they are smaller, and removed if they are larger. When the
+  remote size is unknown (offline, HEAD refused) they are kept as they
+  are, without being recorded, so they are checked again by the next run.
+  """
+  if not os.path.exists(file_name):
+    return False
+  name = os.path.basename(file_name)
+  size = os.path.getsize(file_name)
+  entry = manifest.get(name)
+  if entry is not None:
+    if entry['size'] == size and (not verify or entry['sha256'] == sha256sum(file_name)):
+      return True
+  else:
+    remote_size = _remote_size(url, timeout)
+    if remote_size is None:
+      return True
+    if remote_size == size:
+      manifest.add(name, size, sha256sum(file_name))
+      return True
+    if size < remote_size:
+      os.replace(file_name, file_name + '.part')
+      return False
+  os.remove(file_name)
+  return False
+
+
+def _fetch(url, file_name, manifest, progress, chunk_size, retries, timeout):
+  """
+  Download url to file_name.part, resuming it, and rename it when complete.
+  """
+  part_name = file_name + '.part'
+  expected = None
+  for attempt in range(retries+1):
+    offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+    request = urllib.request.Request(url)
+    if offset:
+      request.add_header('Range', 'bytes={}-'.format(offset))
+    try:
+      with urllib.request.urlopen(request, timeout=timeout) as response:
+        if offset and response.status != 206:
+          offset = 0
+        length = response.headers.get('Content-Length')
+        if length is not None and expected is None:
+          expected = offset + int(length)
+          progress.expect(int(length))
+        with open(part_name, 'ab' if offset else 'wb') as handle:
+          for chunk in iter(lambda: response.read(chunk_size), b''):
+            handle.write(chunk)
+            progress.update(len(chunk))
+      if expected is None or os.path.getsize(part_name) >= expected or attempt == retries:
+        break
+    except urllib.error.HTTPError as error:
+      if error.code == 416 and offset:
+        total = _content_range_total(error.headers)
+        if total is None:
+          total = _remote_size(url, timeout)
+        if total == offset:
+          # the partial file is already complete
+          expected = total
+          break
+        # not a prefix of the remote file, downloaded again from scratch
+        os.remove(part_name)
+        expected = None
+        if attempt == retries:
+          raise
+        continue
+      if attempt == retries or error.code < 500:
+        raise
+    except (urllib.error.URLError, http.client.HTTPException, OSError):
+      if attempt == retries:
+        raise
+    time.sleep(2**attempt)
+  size = os.path.getsize(part_name)
+  if expected is not None and size != expected:
+    raise IOError("incomplete download of {}: {} of {} bytes".format(url, size, expected))
+  manifest.add(os.path.basename(file_name), size, sha256sum(part_name))
+  os.replace(part_name, file_name)
+  progress.finish()
+  return file_name
+
+
+def download_files(files, n_jobs=4, verify=False, chunk_size=1<<20, retries=3, timeout=60):
+  """
+  Download files concurrently, skipping the ones already complete.
+
+  Parameters
+  ----------
+  files : list
+    (url, file_name) pairs
+  n_jobs : int
+    maximum number of simultaneous transfers
+  verify : bool
+    whether to check the SHA-256 of the files already downloaded against
+    the manifest, instead of only their sizes
+  chunk_size : int
+    bytes read at a time from each connection
+  retries : int
+    number of times an interrupted transfer is resumed before failing
+
+  Returns
+  -------
+  file_names : list
+    the downloaded files, in the same order of files
+  """
+  manifests = {}
+  for _, file_name in files:
+    dirname = os.path.dirname(file_name) or '.'
+    if not os.path.isdir(dirname):
+      os.makedirs(dirname)
+    if dirname not in manifests:
+      manifests[dirname] = Manifest(dirname)
+
+  progress = Progress(len(files))
+
+  def task(url, file_name):
+    manifest = manifests[os.path.dirname(file_name) or '.']
+    if _is_complete(url, file_name, manifest, verify, timeout):
+      progress.finish()
+      return file_name
+    return _fetch(url, file_name, manifest, progress, chunk_size, retries, timeout)
+
+  with ThreadPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+    futures = [executor.submit(task, url, file_name) for url, file_name in files]
+    file_names = [future.result() for future in futures]
+  progress.report(end='\n')
+  return file_names
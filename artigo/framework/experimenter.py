@@ -1,9 +1,19 @@
 from sklearn.model_selection import cross_validate, KFold, GroupKFold, GroupShuffleSplit
-from sklearn.metrics import accuracy_score, f1_score
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import StratifiedKFold
 from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ParameterGrid
+from sklearn.pipeline import Pipeline
+from sklearn.base import clone
+import math
+from joblib import Parallel, delayed, parallel_backend
 import numpy as np
 from database import Database_Experimenter
+from featurestore import extractor_config
+from metadata import AcquisitionIndex, parse_key
+from pathsearch import PathSearchCV, path_parameter, path_groups
+import instrument
+from streaming import sliding_windows, stream_windows, transform_stream
+from rolling import rolling_statistical_time
 
 # import warnings filter
 from warnings import simplefilter
@@ -15,6 +25,141 @@ Class definition of dataset segmentation and experiments.
 """
 debug = 0
 
+def validation_splits(X, y, groups):
+  """
+  Train and test indices of each fold of the validation schemes.
+
+  Returns
+  -------
+  splits : dict
+    the keys are the scheme names (Kfold, GroupKfold, Train Test Split and
+    Train Test Split - Group) and the values lists of (train, test) indices
+  """
+  indices = np.arange(len(X))
+  splits = {}
+  splits["Kfold"] = list(StratifiedKFold(n_splits=4).split(X, y))
+  splits["GroupKfold"] = list(GroupKFold(n_splits=4).split(X, y, groups))
+  splits["Train Test Split"] = [tuple(train_test_split(indices, test_size = 0.3,
+                                                       random_state = 42))]
+  splits["Train Test Split - Group"] = [next(GroupShuffleSplit(test_size=.30,
+                                                              n_splits=2,
+                                                              random_state=42).split(X,
+                                                                                     groups=groups))]
+  return splits
+
+def split_stateless(estimator):
+  """
+  Splits a Pipeline, or a GridSearchCV of a Pipeline, into its leading
+  stateless steps (the ones with a true stateless attribute, e.g.
+  StatisticalTime) and an equivalent estimator made of the remaining steps.
+  Steps tuned by the grid search are never split.
+
+  Returns
+  -------
+  steps : list
+    the (name, step) stateless steps, empty if there are none
+  estimator : estimator
+    the estimator without the stateless steps
+  """
+  search = estimator if hasattr(estimator, 'param_grid') else None
+  pipeline = estimator if search is None else search.estimator
+  if not isinstance(pipeline, Pipeline):
+    return [], estimator
+  tuned = set()
+  if search is not None:
+    for grid in ParameterGrid(search.param_grid).param_grid:
+      tuned.update(name.split('__')[0] for name in grid)
+  n = 0
+  for name, step in pipeline.steps[:-1]:
+    if not getattr(step, 'stateless', False) or name in tuned:
+      break
+    n += 1
+  if n == 0:
+    return [], estimator
+  tail = Pipeline(clone(pipeline).steps[n:])
+  if search is None:
+    return pipeline.steps[:n], tail
+  return pipeline.steps[:n], clone(search).set_params(estimator=tail)
+
+def evaluate(estimator, X, y, scoring, train, test, verbose=0):
+  """
+  Cross-validates estimator on a single (train, test) fold.
+
+  Returns
+  -------
+  result : dict
+    as returned by cross_validate, without the fitted estimator
+  best_params : dict
+    best parameters of a grid search, None for other estimators
+  """
+  result = cross_validate(estimator, X, y, scoring=scoring, cv=[(train, test)],
+                          verbose=verbose, return_estimator=True)
+  fitted = result.pop('estimator')[0]
+  return result, getattr(fitted, 'best_params_', None)
+
+def halving_schedule(search, n_samples, n_classes):
+  """
+  Candidates and resources of each iteration of a successive halving
+  search fitted on n_samples of n_classes, as sklearn computes them.
+
+  Returns
+  -------
+  schedule : list
+    (n_candidates, n_resources) of each iteration
+  """
+  cv = search.cv if search.cv is not None else 5
+  inner = cv if isinstance(cv, int) else cv.get_n_splits()
+  factor = search.factor
+  n_candidates = len(ParameterGrid(search.param_grid))
+  max_resources = search.max_resources
+  if max_resources == 'auto':
+    max_resources = n_samples
+  min_resources = search.min_resources
+  if min_resources in ('smallest', 'exhaust'):
+    min_resources = inner*2*n_classes if search.resource == 'n_samples' else 1
+  n_required = 1 + math.floor(math.log(n_candidates, factor))
+  if search.min_resources == 'exhaust':
+    min_resources = max(min_resources, max_resources // factor**(n_required-1))
+  n_possible = 1 + math.floor(math.log(max_resources // min_resources, factor))
+  if search.aggressive_elimination:
+    n_iterations = n_required
+  else:
+    n_iterations = min(n_possible, n_required)
+  schedule = []
+  for itr in range(n_iterations):
+    power = itr
+    if search.aggressive_elimination:
+      power = max(0, itr - n_required + n_possible)
+    schedule.append((n_candidates, min(int(factor**power * min_resources), max_resources)))
+    n_candidates = math.ceil(n_candidates / factor)
+  return schedule
+
+def featurizations(estimator, y_train, n_test):
+  """
+  Number of windows featurized to fit estimator on the windows labeled
+  y_train and score it on n_test windows, when the features are computed
+  in the folds. Searches count the fits they actually make.
+  """
+  n_train = len(y_train)
+  if not hasattr(estimator, 'param_grid'):
+    return n_train + n_test
+  cv = estimator.cv if estimator.cv is not None else 5
+  inner = cv if isinstance(cv, int) else cv.get_n_splits()
+  candidates = list(ParameterGrid(estimator.param_grid))
+  if hasattr(estimator, 'factor'):
+    # successive halving fits fewer candidates on growing resources
+    n_classes = len(np.unique(y_train))
+    fits = sum(n_candidates*(n_resources if estimator.resource == 'n_samples' else n_train)
+               for n_candidates, n_resources in
+               halving_schedule(estimator, n_train, n_classes))
+  elif isinstance(estimator, PathSearchCV):
+    path = path_parameter(estimator.estimator, estimator.param_grid)
+    fits = len(path_groups(candidates, path))*n_train
+  else:
+    fits = len(candidates)*n_train
+  # each fit featurizes the inner train and validation folds
+  return fits*inner + n_train + n_test
+
 class Experimenter(Database_Experimenter):
   """
   Datasets class wrapper for experiment framework.
@@ -24,102 +169,262 @@ class Experimenter(Database_Experimenter):
   ----------
   acquisitions : dict
     Dictionary with the sample_rate, sample_size, conditions, dirdest and acquisitions
+  index : AcquisitionIndex
+    metadata of the acquisitions, built once from their keys
+  windows : WindowIndex
+    metadata of the windows of the last segmentation
+  dtype : numpy.dtype
+    data type of the segmented windows, e.g. np.float32 to halve their memory
   
   Methods
   -------
   segmentate()
     Semgmentate the raw files.
+  stream()
+    Segmentate the raw files in batches, one acquisition at a time.
+  extract_features()
+    Extract features from the streamed batches.
+  rolling_features()
+    Extract StatisticalTime features incrementally, window to window.
   perform()
     Perform experiments.
 
   """
-  def __init__(self, acquisitions, sample_size):
+  def __init__(self, acquisitions, sample_size, hop=None, dtype=np.float64, parse=parse_key):
     self.sample_size = sample_size
+    self.hop = sample_size if hop is None else hop
+    if self.hop < 1:
+      raise ValueError("hop must be at least 1, got {}".format(self.hop))
+    self.dtype = np.dtype(dtype)
     self.acquisitions = acquisitions['acquisitions']
+    self.index = AcquisitionIndex.from_acquisitions(acquisitions, parse)
 
-  def segmentate(self):
+  def n_windows(self, acquisition_size):
+    """
+    Number of windows taken from an acquisition with acquisition_size samples.
+    """
+    if acquisition_size < self.sample_size:
+      return 0
+    n_samples = (acquisition_size-self.sample_size)//self.hop + 1
+    if debug:
+      n_samples = min(n_samples, 15)
+    return n_samples
+
+  @instrument.instrumented('segmentate')
+  def segmentate(self, copy=True):
     """
     Segmentate files by the conditions and returns signals data, signals
     condition and signals acquisition.
+
+    Consecutive windows start hop samples apart, so hop smaller than
+    sample_size gives overlapping windows. The total number of windows is
+    computed up front and signal_dt is filled in a single pass. If copy is
+    False, no window is copied: segments keeps, for each acquisition (in
+    the order of index.key, an empty array for an acquisition shorter than
+    sample_size), a read-only strided view of its windows and signal_dt is
+    not built.
     """
-    
+
     n = len(self.acquisitions)
+    keys = self.index.key.tolist()
+    self.windows = self.index.windows(self.sample_size, self.hop, 15 if debug else None)
+    counts = self.windows.counts
 
-    self.signal_dt = np.empty((0,self.sample_size))
-    self.signal_or = []
-    self.signal_gr = []
+    self.signal_gr = self.windows.groups
+    self.signal_or = self.windows.labels
+    instrument.count(windows=int(counts.sum()))
 
-    for i,key in enumerate(self.acquisitions):
-      acquisition_size = len(self.acquisitions[key])
-      if debug:
-        n_samples = 15
-      else:
-        n_samples = acquisition_size//self.sample_size
+    if copy:
+      self.segments = None
+      self.signal_dt = np.empty((counts.sum(), self.sample_size), dtype=self.dtype)
+    else:
+      self.segments = []
+      self.signal_dt = None
+
+    start = 0
+    for i,key in enumerate(keys):
+      n_samples = counts[i]
       print('{}/{} --- {}: {}'.format(i+1, n, key, n_samples))
-      self.signal_dt = np.concatenate((self.signal_dt, self.acquisitions[key][:(n_samples*self.sample_size)].reshape(
-          (n_samples,self.sample_size))))
-      for j in range(n_samples):
-        self.signal_gr.append(key)
-        self.signal_or.append(key[0])
+      if n_samples == 0:
+        if not copy:
+          self.segments.append(np.empty((0, self.sample_size), dtype=self.dtype))
+        continue
+      windows = sliding_windows(self.acquisitions[key], self.sample_size, self.hop)[:n_samples]
+      if copy:
+        self.signal_dt[start:start+n_samples] = windows
+      else:
+        self.segments.append(windows)
+      start += n_samples
 
-    print(len(set(self.signal_gr)))
+    print(len(np.unique(self.signal_gr)))
 
+  def stream(self, batch_size=1024):
+    """
+    Yields (windows, conditions, acquisitions) batches of at most batch_size
+    windows, segmenting one acquisition at a time instead of building the
+    whole signal_dt.
+    """
+    return stream_windows(self.acquisitions, self.sample_size, self.hop, batch_size,
+                          max_windows=15 if debug else None, dtype=self.dtype)
 
-  def perform(self, clfs, scoring, verbose=0):
-    
-    self.segmentate()
+  @instrument.instrumented('extract_features')
+  def extract_features(self, extractor, batch_size=1024):
+    """
+    Applies a stateless feature extractor (e.g. StatisticalTime) to the
+    streamed batches, so only the features of the whole data set are kept
+    in memory.
 
-    # Estimators
-    for clf_name, estimator in clfs:
-      print("*"*(len(clf_name)+8),'\n***',clf_name,'***\n'+"*"*(len(clf_name)+8))
+    Returns
+    -------
+    features, conditions, acquisitions : numpy.ndarray
+    """
+    features, conditions, acquisitions = transform_stream(extractor, self.stream(batch_size))
+    instrument.count(windows=len(features))
+    return features, conditions, acquisitions
+
+  @instrument.instrumented('rolling_features')
+  def rolling_features(self):
+    """
+    StatisticalTime features of the windows of each acquisition, updated
+    from window to window with running sums instead of computed from the
+    samples of each window. It pays off when hop is much smaller than
+    sample_size, the features being the same up to rounding.
+
+    Returns
+    -------
+    features, conditions, acquisitions : numpy.ndarray
+    """
+    windows = self.index.windows(self.sample_size, self.hop, 15 if debug else None)
+    features = [np.empty((0, 10))]
+    for key, n_samples in zip(self.index.key.tolist(), windows.counts):
+      if n_samples == 0:
+        continue
+      signal = self.acquisitions[key][:(n_samples-1)*self.hop+self.sample_size]
+      features.append(rolling_statistical_time(signal, self.sample_size, self.hop))
+    instrument.count(windows=len(windows))
+    return np.concatenate(features), windows.labels, windows.groups
 
-      print("---Kfold---")
-      estimator_kfold = estimator
 
-      #scores = cross_val_score(estimator_kfold, self.signal_dt, np.array(self.signal_or), cv=2)
+  @instrument.instrumented('perform')
+  def perform(self, clfs, scoring, verbose=0, n_jobs=None, hoist=True, store=None,
+              dataset=""):
+    """
+    Evaluates each classifier with KFold, GroupKFold, train/test split and
+    group train/test split.
 
-      #print("test_accuracy: ", scores, " Mean:", format(scores.mean(), '.2f'), "Std:", format(scores.std(), '.2f'))
+    Every (classifier, validation scheme, fold) is an independent task, run
+    by n_jobs worker processes (-1 for all the processors, one at a time
+    if None). The estimators inside the workers run single-threaded, so
+    the processors are not oversubscribed.
 
+    If hoist is True, the leading stateless steps of the pipelines (e.g.
+    StatisticalTime) are applied once to all segments, and only the
+    remaining steps are cross-validated and tuned. The scores are the same.
 
-      score = cross_validate(estimator_kfold, self.signal_dt, np.array(self.signal_or),
-                            scoring=scoring, cv=4, verbose=verbose)#, error_score='raise')
-      for metric,s in score.items():
-        print(metric, ' \t', s, ' Mean: ', format(s.mean(), '.2f'), ' Std: ', format(s.std(), '.2f'))
+    When the instrumentation is enabled, the fit and score times of every
+    task, measured in the workers, are recorded in the trace.
 
-      print("---GroupKfold---")
-      estimator_groupkfold = estimator
-      score = cross_validate(estimator_groupkfold, self.signal_dt, np.array(self.signal_or),
-                             self.signal_gr, scoring, cv=GroupKFold(n_splits=4), verbose=verbose)
+    If store (a ResultsStore) is given, each (dataset, classifier, scheme,
+    fold, params) cell is saved as soon as it completes, and the cells
+    already in the store are not run again, so an interrupted run resumes
+    where it stopped. The cells of dataset are told apart by the sample
+    size, the hop, the number of windows and the dtype, and params is the
+    configuration of the estimator.
+    """
 
-      for metric, s in score.items():
-        print(metric, ' \t', s, ' Mean: ', format(s.mean(), '.2f'), ' Std: ', format(s.std(), '.2f'))
+    self.segmentate()
 
-      print("---Train Test Split---")
-      estimator_ttsplit = estimator
-      X_train, X_test, y_train, y_test = train_test_split(self.signal_dt, self.signal_or, test_size = 0.3,
-                                                          random_state = 42)
+    y = np.asarray(self.signal_or)
+    splits = validation_splits(self.signal_dt, y, self.signal_gr)
 
-      estimator_ttsplit.fit(X_train, y_train)
-      pred = estimator_ttsplit.predict(X_test)
+    params = {clf_name: extractor_config(estimator) for clf_name, estimator in clfs}
+    dataset = "{} sample_size={} hop={} windows={} dtype={}".format(
+        dataset, self.sample_size, self.hop, len(y), self.dtype.name)
+    done = {}
+    if store is not None:
+      for clf_name, _ in clfs:
+        for scheme, folds in splits.items():
+          for fold in range(len(folds)):
+            result = store.get(dataset, clf_name, scheme, fold, params[clf_name])
+            if result is not None:
+              done[clf_name, scheme, fold] = result
+      print("Results store: {} of {} cells already done".format(
+          len(done), len(clfs)*sum(map(len, splits.values()))))
 
-      print("test_accuracy: ", format(accuracy_score(y_test, pred), '.2f'))
-      print("test_f1_macro: ", format(f1_score(y_test, pred, average='macro'), '.2f'))
+    n_before = n_after = 0
+    features = {}
+    estimators = []
+    for clf_name, estimator in clfs:
+      steps, tail = split_stateless(estimator) if hoist else ([], estimator)
+      key = tuple(extractor_config(step) for _, step in steps)
+      pending = any((clf_name, scheme, fold) not in done
+                    for scheme, folds in splits.items() for fold in range(len(folds)))
+      if key not in features and pending:
+        X = self.signal_dt
+        for name, step in steps:
+          with instrument.stage('feature extraction', step=name) as stage:
+            X = step.transform(X)
+            stage.count(windows=len(X))
+        features[key] = X
+        n_after += len(X) if steps else 0
+      estimators.append((clf_name, tail, features.get(key)))
+      for folds in splits.values():
+        for train, test in folds:
+          if steps:
+            n_before += featurizations(estimator, y[train], len(test))
+          else:
+            n = featurizations(estimator, y[train], len(test))
+            n_before += n
+            n_after += n
 
-      print("---Train Test Split - Group---")
-      estimator_ttsplitgroup = estimator
-      train_inds, test_inds = next(GroupShuffleSplit(test_size=.30,
-                                                     n_splits=2,
-                                                     random_state=42).split(self.signal_dt,
-                                                                            groups=self.signal_gr))
+    tasks = [(clf_name, scheme, fold, estimator, X, train, test)
+             for clf_name, estimator, X in estimators
+             for scheme, folds in splits.items()
+             for fold, (train, test) in enumerate(folds)
+             if (clf_name, scheme, fold) not in done]
 
-      X_train = self.signal_dt[train_inds]
-      X_test = self.signal_dt[test_inds]
-      y_train = np.array(self.signal_or)[train_inds]
-      y_test = np.array(self.signal_or)[test_inds]
+    with instrument.stage('cross validation'), parallel_backend('loky', inner_max_num_threads=1):
+      # the results come back in order as the tasks complete, and each
+      # one is saved before the next one is waited for (return_as needs
+      # joblib 1.3)
+      outputs = Parallel(n_jobs=n_jobs, verbose=verbose, return_as='generator')(
+          delayed(evaluate)(estimator, X, y, scoring, train, test, verbose)
+          for _, _, _, estimator, X, train, test in tasks)
+      for (clf_name, scheme, fold, _, _, train, test), (result, best_params) in zip(tasks, outputs):
+        if store is not None:
+          store.put(dataset, clf_name, scheme, fold, params[clf_name], result, best_params,
+                    len(train), len(test))
+        done[clf_name, scheme, fold] = result
+      if instrument.enabled():
+        for clf_name, scheme, fold, _, _, train, test in tasks:
+          result = done[clf_name, scheme, fold]
+          instrument.record(clf_name+' fit', result['fit_time'][0], scheme=scheme,
+                            fold=fold, windows=len(train))
+          instrument.record(clf_name+' score', result['score_time'][0], scheme=scheme,
+                            fold=fold, windows=len(test))
 
+    scores = {}
+    for clf_name, _ in clfs:
+      for scheme, folds in splits.items():
+        score = scores.setdefault(clf_name, {}).setdefault(scheme, {})
+        for fold in range(len(folds)):
+          for metric, s in done[clf_name, scheme, fold].items():
+            score[metric] = np.concatenate((score.get(metric, np.empty(0)), s))
+    self.scores = scores
 
-      estimator_ttsplitgroup.fit(X_train, y_train)
-      pred = estimator_ttsplitgroup.predict(X_test)
+    # Estimators
+    for clf_name, _ in clfs:
+      print("*"*(len(clf_name)+8),'\n***',clf_name,'***\n'+"*"*(len(clf_name)+8))
+      for scheme in splits:
+        print("---{}---".format(scheme))
+        score = scores[clf_name][scheme]
+        if len(splits[scheme]) > 1:
+          for metric, s in score.items():
+            print(metric, ' \t', s, ' Mean: ', format(s.mean(), '.2f'), ' Std: ', format(s.std(), '.2f'))
+        else:
+          for metric, s in score.items():
+            if metric.startswith('test_'):
+              print(metric+": ", format(s[0], '.2f'))
 
-      print("test_accuracy: ", format(accuracy_score(y_test, pred), '.2f'))
-      print("test_f1_macro: ", format(f1_score(y_test, pred, average='macro'), '.2f'))
+    print("Feature extraction: {} windows featurized instead of {} ({} saved)".format(
+        n_after, n_before, n_before-n_after))
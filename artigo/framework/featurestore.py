@@ -0,0 +1,196 @@
+"""
+Persistent content-addressed store for feature extraction results.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+import types
+
+import numpy as np
+from sklearn.base import TransformerMixin
+
+# Age (s) after which a temporary file is taken as left by a crashed write.
+TMP_MAX_AGE = 3600
+
+
+def _stable(value):
+  """
+  value with the estimators and the other objects of default repr (which
+  includes their address) replaced by their extractor_config(), so that
+  its repr is the same in every process.
+  """
+  if isinstance(value, (list, tuple)):
+    return type(value)(_stable(item) for item in value)
+  if isinstance(value, dict):
+    return {key: _stable(value[key]) for key in sorted(value, key=repr)}
+  if isinstance(value, (types.FunctionType, types.BuiltinFunctionType)):
+    return value.__module__ + '.' + value.__qualname__
+  if hasattr(value, 'get_params') or hasattr(value, 'transform') or \
+      (hasattr(value, '__dict__') and type(value).__repr__ is object.__repr__):
+    return extractor_config(value)
+  return value
+
+
+def extractor_config(extractor):
+  """
+  Returns a string describing the class and the parameters of the
+  extractor, or of any estimator, the same in every process.
+  """
+  if hasattr(extractor, 'get_params'):
+    params = extractor.get_params(deep=False)
+  else:
+    params = vars(extractor)
+  kind = type(extractor).__module__ + '.' + type(extractor).__qualname__
+  params = [(name, _stable(value)) for name, value in sorted(params.items())]
+  return kind + repr(params)
+
+
+class FeatureStore(TransformerMixin):
+  """
+  Transformer wrapper that keeps the results of a stateless feature
+  extractor in disk, so identical segments are featurized only once,
+  across folds, parameter candidates and runs.
+
+  ...
+  Attributes
+  ----------
+  extractor : TransformerMixin
+    stateless feature extractor, e.g. StatisticalTime()
+  cachedir : str
+    directory where the features are saved
+  max_size : int
+    maximum size in bytes of the store, the least recently used entries are
+    evicted when it is exceeded
+  hits : int
+    number of transforms answered by the store
+  misses : int
+    number of transforms computed by the extractor
+
+  Methods
+  -------
+  fit()
+    Nothing to be learned.
+  transform()
+    Return the features of X, from the store when available.
+  clear()
+    Remove all entries of the store.
+  """
+
+  def __init__(self, extractor, cachedir="features_cache", max_size=2**30):
+    self.extractor = extractor
+    self.cachedir = cachedir
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def stateless(self):
+    return getattr(self.extractor, 'stateless', False)
+
+  def get_params(self, deep=True):
+    return {'extractor': self.extractor, 'cachedir': self.cachedir,
+            'max_size': self.max_size}
+
+  def set_params(self, **params):
+    for key, value in params.items():
+      setattr(self, key, value)
+    return self
+
+  def key(self, X):
+    """
+    Content address of X transformed by the extractor.
+    """
+    X = np.ascontiguousarray(X)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(extractor_config(self.extractor).encode())
+    digest.update(str((X.shape, X.dtype.str)).encode())
+    digest.update(memoryview(X).cast('B'))
+    return digest.hexdigest()
+
+  def fit(self, X, y=None):
+    return self
+
+  def transform(self, X, y=None):
+    os.makedirs(self.cachedir, exist_ok=True)
+    file_name = os.path.join(self.cachedir, self.key(X)+'.npy')
+    try:
+      features = np.load(file_name)
+      os.utime(file_name)
+      self.hits += 1
+      return features
+    except (OSError, ValueError):
+      pass
+    features = self.extractor.transform(X)
+    self.misses += 1
+    handle, tmp_name = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+    try:
+      with os.fdopen(handle, 'wb') as tmp_file:
+        np.save(tmp_file, features)
+      os.replace(tmp_name, file_name)
+    except BaseException:
+      os.remove(tmp_name)
+      raise
+    self.evict()
+    return features
+
+  def _files(self, suffix):
+    """
+    (last modification, size, file name) of the files of the store ending
+    with suffix, skipping the ones removed meanwhile by other processes.
+    """
+    files = []
+    with os.scandir(self.cachedir) as it:
+      for entry in it:
+        if entry.name.endswith(suffix):
+          try:
+            stat = entry.stat()
+          except FileNotFoundError:
+            continue
+          files.append((stat.st_mtime, stat.st_size, entry.path))
+    return files
+
+  def entries(self):
+    """
+    Returns (last access, size, file name) of every entry in the store.
+    """
+    return self._files('.npy')
+
+  def evict(self):
+    """
+    Remove the temporary files older than TMP_MAX_AGE, left by crashed
+    writes, and the least recently used entries until the store, with the
+    temporary files being written, fits max_size.
+    """
+    size = 0
+    now = time.time()
+    for modified, tmp_size, tmp_name in self._files('.tmp'):
+      if now - modified <= TMP_MAX_AGE:
+        size += tmp_size
+        continue
+      try:
+        os.remove(tmp_name)
+      except FileNotFoundError:
+        pass
+    entries = sorted(self.entries())
+    size += sum(entry[1] for entry in entries)
+    for _, entry_size, file_name in entries:
+      if size <= self.max_size:
+        break
+      try:
+        os.remove(file_name)
+      except FileNotFoundError:
+        pass
+      size -= entry_size
+
+  def clear(self):
+    """
+    Remove all entries of the store.
+    """
+    if os.path.isdir(self.cachedir):
+      for _, _, file_name in self.entries() + self._files('.tmp'):
+        try:
+          os.remove(file_name)
+        except FileNotFoundError:
+          pass
@@ -0,0 +1,109 @@
+"""
+Selective ingestion of the signals of Matlab files.
+
+Each database describes where its signals are with a channel map: the
+keys are channel names and the values paths to the signals. Only the
+variables named by the paths are decoded, and the signals are returned as
+contiguous 1D arrays without copying them sample by sample.
+
+A path starts with the variable name, or a regular expression fully
+matching it, where "{stem}" stands for the file name without directory
+and extension. The next elements are followed into the variable: a str is
+a struct field, an int an index, and a dict selects the element of a
+struct array whose fields have the given values.
+"""
+
+import io
+import os
+import re
+
+import numpy as np
+import scipy.io
+
+CHANNELS = {
+    # accelerometers at the drive end, fan end and base, e.g. X097_DE_time
+    "cwru": {"de": (r"X\d+_DE_time",), "fe": (r"X\d+_FE_time",), "ba": (r"X\d+_BA_time",)},
+    # bearing.gs holds the acceleration of the baseline and fault files
+    "mfpt": {"vibration": ("bearing", "gs")},
+    # the Y struct array holds the measured channels, named by its Name field
+    "paderborn": {"vibration": ("{stem}", "Y", {"Name": "vibration_1"}, "Data")},
+}
+
+
+def _stem(file_name):
+  return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def variable_names(channels, names, stem=""):
+  """
+  Returns a dict from the channels to the variables holding them, among
+  names, the variables of a file. Channels without a variable are left out.
+  """
+  found = {}
+  for channel, path in channels.items():
+    pattern = re.compile(path[0].replace("{stem}", re.escape(stem)))
+    for name in names:
+      if pattern.fullmatch(name):
+        found[channel] = name
+        break
+  return found
+
+
+def _follow(value, element):
+  if isinstance(element, dict):
+    for item in value:
+      if all(item[field] == wanted for field, wanted in element.items()):
+        return item
+    raise KeyError(element)
+  return value[element]
+
+
+def read_channels(source, channels, dtype=None, file_name=None):
+  """
+  Reads the channels of a Matlab file.
+
+  Parameters
+  ----------
+  source : str, bytes or file-like object
+    the Matlab file, its name or its contents
+  channels : dict
+    channel map, e.g. CHANNELS["cwru"]
+  dtype : numpy.dtype
+    data type of the signals, the one in the file if None
+  file_name : str
+    name of the file, for "{stem}", the source itself if it is a name
+
+  Returns
+  -------
+  signals : dict
+    the keys are the channels found in the file and the values the
+    signals, contiguous 1D arrays
+  """
+  if isinstance(source, (bytes, bytearray, memoryview)):
+    source = io.BytesIO(source)
+  if file_name is None and isinstance(source, str):
+    file_name = source
+  stem = _stem(file_name) if file_name else ""
+
+  literal = all(re.escape(path[0]) == path[0] or path[0] == "{stem}" for path in channels.values())
+  if literal:
+    names = [path[0].replace("{stem}", stem) for path in channels.values()]
+  else:
+    names = [name for name, _, _ in scipy.io.whosmat(source)]
+    if hasattr(source, "seek"):
+      source.seek(0)
+  found = variable_names(channels, names, stem)
+  if not found:
+    return {}
+
+  matlab_file = scipy.io.loadmat(source, variable_names=sorted(set(found.values())),
+                                 simplify_cells=True)
+  signals = {}
+  for channel, name in found.items():
+    if name not in matlab_file:
+      continue
+    value = matlab_file[name]
+    for element in channels[channel][1:]:
+      value = _follow(value, element)
+    signals[channel] = np.ascontiguousarray(np.asarray(value, dtype=dtype).reshape(-1))
+  return signals
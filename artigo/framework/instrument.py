@@ -0,0 +1,282 @@
+"""
+Per-stage instrumentation of the experiments.
+
+Each stage records its wall time, CPU time, peak RSS, bytes read and
+windows processed. Stages nest, e.g. the segmentation inside perform().
+Instrumentation is disabled by default. While disabled, stage() returns a
+shared no-op context manager and instrumented functions call the wrapped
+function directly, so the overhead is a global lookup per call.
+
+Usage:
+  instrument.enable("trace.json")
+  ...
+  print(instrument.summary())
+  instrument.disable()   # writes the JSON trace
+
+Only this process is measured: the CPU time and the reads of worker
+processes are not included, use record() for what they report back. The
+peak RSS is None where neither /proc nor the resource module (POSIX) is
+available, e.g. on Windows.
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+_trace = None
+
+
+def _read_proc(file_name, field):
+  """
+  Integer value of a field of a /proc/self file, None if not available.
+  """
+  try:
+    with open(file_name) as handle:
+      for line in handle:
+        if line.startswith(field):
+          return int(line.split()[1])
+  except OSError:
+    pass
+  return None
+
+
+def _bytes_read():
+  return _read_proc('/proc/self/io', 'rchar:')
+
+
+def _peak_rss():
+  """
+  Peak resident set size (bytes) since the last _reset_peak(), None if
+  not available.
+  """
+  peak = _read_proc('/proc/self/status', 'VmHWM:')
+  if peak is not None:
+    return peak*1024
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == 'darwin' else peak*1024
+
+
+def _reset_peak():
+  """
+  Resets the peak RSS to the current RSS (Linux), so the peak of each stage
+  is measured, otherwise the peak is the one of the process lifetime.
+  """
+  try:
+    with open('/proc/self/clear_refs', 'w') as handle:
+      handle.write('5')
+  except OSError:
+    pass
+
+
+def _max_peak(peak, other):
+  """
+  Larger of two peaks, either being None if not available.
+  """
+  if peak is None or other is None:
+    return other if peak is None else peak
+  return max(peak, other)
+
+
+class Stage:
+  """
+  Context manager measuring one stage of the trace.
+
+  ...
+  Methods
+  -------
+  count(**counters)
+    Add to counters of the stage, e.g. windows.
+  """
+
+  def __init__(self, trace, name, fields):
+    self.trace = trace
+    self.name = name
+    self.fields = fields
+    self.counters = {}
+    self.peak = None
+
+  def count(self, **counters):
+    for name, value in counters.items():
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  def __enter__(self):
+    stack = self.trace.stack
+    if stack:
+      stack[-1].peak = _max_peak(stack[-1].peak, _peak_rss())
+    self.path = '/'.join([stage.name for stage in stack] + [self.name])
+    stack.append(self)
+    _reset_peak()
+    self.bytes_read = _bytes_read()
+    self.start = time.perf_counter()
+    self.cpu = time.process_time()
+    return self
+
+  def __exit__(self, *exc):
+    wall = time.perf_counter() - self.start
+    cpu = time.process_time() - self.cpu
+    self.peak = _max_peak(self.peak, _peak_rss())
+    bytes_read = _bytes_read()
+    stack = self.trace.stack
+    stack.pop()
+    if stack:
+      stack[-1].peak = _max_peak(stack[-1].peak, self.peak)
+    event = {'name': self.name, 'path': self.path,
+             'start': self.start - self.trace.start, 'wall': wall, 'cpu': cpu,
+             'peak_rss': self.peak,
+             'bytes_read': None if bytes_read is None else bytes_read - self.bytes_read}
+    event.update(self.counters)
+    event.update(self.fields)
+    self.trace.events.append(event)
+    return False
+
+
+class _NullStage:
+  """
+  Stage returned while the instrumentation is disabled.
+  """
+
+  def count(self, **counters):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Trace:
+  """
+  Events recorded while the instrumentation is enabled.
+  """
+
+  def __init__(self, trace_file=None):
+    self.trace_file = trace_file
+    self.events = []
+    self.stack = []
+    self.start = time.perf_counter()
+
+  def write(self, file_name):
+    with open(file_name, 'w') as handle:
+      json.dump({'pid': os.getpid(), 'events': self.events}, handle, indent=1)
+
+
+def enable(trace_file=None):
+  """
+  Starts recording a new trace, written to trace_file by disable().
+  """
+  global _trace
+  _trace = Trace(trace_file)
+  return _trace
+
+
+def disable():
+  """
+  Stops recording and writes the trace file, if any.
+
+  Returns
+  -------
+  trace : Trace
+    the recorded trace, None if it was not enabled
+  """
+  global _trace
+  trace, _trace = _trace, None
+  if trace is not None and trace.trace_file:
+    trace.write(trace.trace_file)
+  return trace
+
+
+def enabled():
+  return _trace is not None
+
+
+def stage(name, **fields):
+  """
+  Context manager measuring the enclosed code as a stage. The keyword
+  arguments are saved in its event.
+  """
+  if _trace is None:
+    return _NULL_STAGE
+  return Stage(_trace, name, fields)
+
+
+def count(**counters):
+  """
+  Adds to the counters (e.g. windows=n) of the innermost running stage.
+  """
+  if _trace is not None and _trace.stack:
+    _trace.stack[-1].count(**counters)
+
+
+def record(name, wall, cpu=None, **fields):
+  """
+  Records a stage measured elsewhere, e.g. in a worker process, as a child
+  of the innermost running stage.
+  """
+  if _trace is None:
+    return
+  path = '/'.join([stage.name for stage in _trace.stack] + [name])
+  event = {'name': name, 'path': path, 'start': time.perf_counter() - _trace.start,
+           'wall': wall, 'cpu': cpu, 'peak_rss': None, 'bytes_read': None}
+  event.update(fields)
+  _trace.events.append(event)
+
+
+def instrumented(name=None):
+  """
+  Decorator measuring each call of a function as a stage, named after the
+  function if name is None.
+  """
+  def decorator(function):
+    stage_name = name or function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if _trace is None:
+        return function(*args, **kwargs)
+      with Stage(_trace, stage_name, {}):
+        return function(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def summary(trace=None):
+  """
+  Table of the events aggregated by stage path, in the order they started.
+  """
+  trace = trace or _trace
+  if trace is None:
+    return ""
+  rows = {}
+  for event in trace.events:
+    row = rows.setdefault(event['path'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0,
+                                          'peak_rss': None, 'bytes_read': 0, 'windows': 0})
+    row['calls'] += 1
+    for measure in ('wall', 'cpu', 'bytes_read', 'windows'):
+      row[measure] += event.get(measure) or 0
+    row['peak_rss'] = _max_peak(row['peak_rss'], event['peak_rss'])
+  order = {}
+  for event in trace.events:
+    order[event['path']] = min(order.get(event['path'], event['start']), event['start'])
+  width = max([len(path) for path in rows] + [5])
+  lines = ["{:<{w}} {:>6} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+      "stage", "calls", "wall (s)", "cpu (s)", "peak (MB)", "read (MB)", "windows", w=width)]
+  for path in sorted(rows, key=lambda path: (order[path], path)):
+    row = rows[path]
+    peak = "n/a" if row['peak_rss'] is None else "{:.1f}".format(row['peak_rss']/2**20)
+    lines.append("{:<{w}} {:>6} {:>10.3f} {:>10.3f} {:>10} {:>10.1f} {:>9}".format(
+        path, row['calls'], row['wall'], row['cpu'], peak,
+        row['bytes_read']/2**20, row['windows'], w=width))
+  return "\n".join(lines)
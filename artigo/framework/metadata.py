@@ -0,0 +1,270 @@
+"""
+Columnar metadata of the acquisitions and of their windows.
+
+The metadata are parsed once, when the index is built, into one array per
+field, so group splits, filters and label lookups are array operations
+instead of string handling on each window.
+"""
+
+import numpy as np
+
+FIELDS = ('key', 'condition', 'bearing', 'setting', 'repetition', 'sample_rate', 'channel',
+          'length')
+
+
+def parse_key(key):
+  """
+  Metadata of an acquisition key: its condition (first character) and,
+  for keys made of the condition, the bearing code, the setting and the
+  repetition separated by underscores (Paderborn, Synthetic), the bearing,
+  setting and repetition. Missing fields are None.
+  """
+  parts = key.split('_')
+  metadata = {'condition': key[0], 'bearing': None, 'setting': None, 'repetition': None,
+              'channel': None}
+  if len(parts) == 4:
+    metadata['bearing'] = parts[1]
+    metadata['setting'] = int(parts[2]) if parts[2].isdigit() else parts[2]
+    metadata['repetition'] = int(parts[3]) if parts[3].isdigit() else parts[3]
+  return metadata
+
+
+def parse_cwru_key(key):
+  """
+  Metadata of a CWRU acquisition key, the file key followed by the
+  accelerometer position, e.g. DEIR.007_0de: the condition (N, B, I or O),
+  the fault (location, condition and diameter, e.g. DEIR.007) as the
+  bearing, the load (hp) as the setting and the position as the channel.
+  """
+  name, channel = key[:-2], key[-2:]
+  fault, _, load = name.rpartition('_')
+  return {'condition': 'N' if name.startswith('Normal') else name[2], 'bearing': fault,
+          'setting': int(load) if load.isdigit() else load, 'repetition': None,
+          'channel': channel}
+
+
+def acquisition_length(acquisitions, key):
+  """
+  Number of samples of an acquisition, without decoding it when the
+  mapping knows the lengths (length() method, e.g. SyntheticAcquisitions)
+  or maps the arrays from disk (AcquisitionStore).
+  """
+  if hasattr(acquisitions, 'length'):
+    return acquisitions.length(key)
+  return len(acquisitions[key])
+
+
+def _column(values):
+  """
+  Array of a field: int64 (-1 if missing) if every value is an integer,
+  str ('' if missing) otherwise.
+  """
+  if all(value is None or isinstance(value, (int, np.integer)) for value in values):
+    return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+  return np.array(['' if value is None else str(value) for value in values], dtype=str)
+
+
+class AcquisitionIndex:
+  """
+  Metadata of the acquisitions, one array per field with an entry per
+  acquisition.
+
+  ...
+  Attributes
+  ----------
+  key : numpy.ndarray
+    acquisition keys
+  condition : numpy.ndarray
+    condition code, the label of the windows
+  bearing : numpy.ndarray
+    bearing code ('' if unknown)
+  setting : numpy.ndarray
+    operating setting or load (-1 if unknown)
+  repetition : numpy.ndarray
+    repetition of the acquisition (-1 if unknown)
+  sample_rate : numpy.ndarray
+    sample rate in Hz (nan if unknown)
+  channel : numpy.ndarray
+    sensor of the signal ('' if unknown)
+  length : numpy.ndarray
+    number of samples
+
+  Methods
+  -------
+  from_acquisitions(acquisitions_data, parse)
+    Index of the acquisitions returned by a loader.
+  mask(condition, bearing, setting, repetition, channel, where)
+    Boolean mask of the matching acquisitions.
+  windows(sample_size, hop, max_windows)
+    Index of the windows of the acquisitions.
+  """
+
+  def __init__(self, **columns):
+    for field in FIELDS:
+      setattr(self, field, np.asarray(columns[field]))
+
+  @classmethod
+  def from_acquisitions(cls, acquisitions_data, parse=parse_key):
+    """
+    Index of acquisitions_data, as returned by the acquisitions() or load()
+    of a loader, or of a mapping of acquisitions. The keys are parsed by
+    parse (e.g. parse_cwru_key) and the sample rates are taken from the
+    'sample_rate' entry, a number or a dict from the keys to numbers.
+    """
+    if isinstance(acquisitions_data, dict) and 'acquisitions' in acquisitions_data:
+      acquisitions = acquisitions_data['acquisitions']
+      sample_rate = acquisitions_data.get('sample_rate')
+    else:
+      acquisitions, sample_rate = acquisitions_data, None
+    keys = list(acquisitions)
+    metadata = [parse(key) for key in keys]
+    if not isinstance(sample_rate, dict):
+      sample_rate = dict.fromkeys(keys, sample_rate)
+    columns = {field: _column([fields[field] for fields in metadata])
+               for field in ('bearing', 'setting', 'repetition')}
+    return cls(key=np.array(keys, dtype=str),
+               condition=np.array([fields['condition'] for fields in metadata], dtype=str),
+               sample_rate=np.array([np.nan if sample_rate.get(key) is None else sample_rate[key]
+                                     for key in keys], dtype=np.float64),
+               channel=np.array([fields['channel'] or '' for fields in metadata], dtype=str),
+               length=np.array([acquisition_length(acquisitions, key) for key in keys],
+                               dtype=np.int64),
+               **columns)
+
+  def __len__(self):
+    return len(self.key)
+
+  def __getitem__(self, index):
+    """
+    Index of the acquisitions selected by a boolean mask, indices or a slice.
+    """
+    return AcquisitionIndex(**{field: getattr(self, field)[index] for field in FIELDS})
+
+  def mask(self, condition=None, bearing=None, setting=None, repetition=None, channel=None,
+           where=None):
+    """
+    Boolean mask of the acquisitions whose fields match. Each criterion is
+    a value or a list of values, None accepting any; where is a predicate
+    of the acquisition key.
+    """
+    criteria = {'condition': condition, 'bearing': bearing, 'setting': setting,
+                'repetition': repetition, 'channel': channel}
+    mask = np.ones(len(self), dtype=bool)
+    for field, values in criteria.items():
+      if values is None:
+        continue
+      if not isinstance(values, (list, tuple, set, np.ndarray)):
+        values = [values]
+      column = getattr(self, field)
+      mask &= np.isin(column, np.array(list(values), dtype=column.dtype))
+    if where is not None:
+      mask &= np.fromiter(map(where, self.key.tolist()), dtype=bool, count=len(self))
+    return mask
+
+  def codes(self, field):
+    """
+    Returns the distinct values of a field and the code of each acquisition,
+    its position among them.
+    """
+    return np.unique(getattr(self, field), return_inverse=True)
+
+  def windows(self, sample_size, hop=None, max_windows=None):
+    """
+    Index of the windows of sample_size samples, starting every hop
+    samples, of the acquisitions, at most max_windows of each.
+    """
+    return WindowIndex(self, sample_size, hop, max_windows)
+
+
+class WindowIndex:
+  """
+  Metadata of the windows of the acquisitions of an AcquisitionIndex, in
+  the order of the acquisitions. The per-window arrays are built when they
+  are first used.
+
+  ...
+  Attributes
+  ----------
+  acquisitions : AcquisitionIndex
+    the acquisitions of the windows
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between the start of consecutive windows
+  counts : numpy.ndarray
+    number of windows of each acquisition
+  starts : numpy.ndarray
+    index of the first window of each acquisition, followed by the number
+    of windows
+  acquisition : numpy.ndarray
+    acquisition (position in acquisitions) of each window
+  offset : numpy.ndarray
+    first sample of each window in its acquisition
+  labels : numpy.ndarray
+    condition of each window
+  groups : numpy.ndarray
+    acquisition key of each window
+
+  Methods
+  -------
+  locate(indices)
+    Acquisitions and offsets of windows, without the per-window arrays.
+  column(field)
+    A field of the acquisitions, for each window.
+  mask(condition, bearing, setting, repetition, channel, where)
+    Boolean mask of the windows of the matching acquisitions.
+  """
+
+  def __init__(self, acquisitions, sample_size, hop=None, max_windows=None):
+    self.acquisitions = acquisitions
+    self.sample_size = sample_size
+    self.hop = sample_size if hop is None else hop
+    lengths = acquisitions.length
+    counts = np.where(lengths < sample_size, 0, (lengths-sample_size)//self.hop + 1)
+    if max_windows is not None:
+      counts = np.minimum(counts, max_windows)
+    self.counts = counts
+    self.starts = np.concatenate(([0], np.cumsum(counts)))
+    self._acquisition = None
+
+  def __len__(self):
+    return int(self.starts[-1])
+
+  @property
+  def acquisition(self):
+    if self._acquisition is None:
+      self._acquisition = np.repeat(np.arange(len(self.counts)), self.counts)
+    return self._acquisition
+
+  @property
+  def offset(self):
+    return (np.arange(len(self)) - self.starts[self.acquisition])*self.hop
+
+  def locate(self, indices):
+    """
+    Returns the acquisition of the windows at indices and their first
+    sample in it.
+    """
+    acquisition = np.searchsorted(self.starts, indices, side='right') - 1
+    return acquisition, (indices - self.starts[acquisition])*self.hop
+
+  def column(self, field):
+    """
+    A field of the acquisitions (see AcquisitionIndex), for each window.
+    """
+    return np.repeat(getattr(self.acquisitions, field), self.counts)
+
+  @property
+  def labels(self):
+    return self.column('condition')
+
+  @property
+  def groups(self):
+    return self.column('key')
+
+  def mask(self, **criteria):
+    """
+    Boolean mask of the windows of the acquisitions matching the criteria
+    of AcquisitionIndex.mask().
+    """
+    return np.repeat(self.acquisitions.mask(**criteria), self.counts)
@@ -2,16 +2,15 @@
 Class definition of MFPT Bearing dataset download and acquisitions extraction.
 """
 
-import urllib.request
 from database import Database_Download
-import scipy.io
+from downloader import download_files
+from archive import ArchiveReader, extract_archives
 import numpy as np
-import pickle
+from acquisitionstore import is_store, load_acquisitions, save_acquisitions, convert_pickle
+from instrument import instrumented
+from ingestion import CHANNELS, read_channels
 import os
 
-# Unpack Tools
-from pyunpack import Archive
-
 
 class MFPT(Database_Download):
   """
@@ -30,6 +29,13 @@ class MFPT(Database_Download):
     the keys represent the condition code and the values the condition name
   files : dict
     the keys represent the conditions_acquisition and the values are the files names
+  extract : bool
+    whether the ZIP file is extracted, otherwise the Matlab files are read
+    straight from the ZIP file
+  archives : list
+    the downloaded ZIP file
+  dtype : numpy.dtype
+    data type of the acquisitions, e.g. np.float32 to halve their memory
 
   Methods
   -------
@@ -38,9 +44,9 @@ class MFPT(Database_Download):
   acquisitions()
     Extract data from files
   load()
-    Load acquisitions previsously saved in picke file
+    Load acquisitions previsously saved in the acquisition store
   """
-  def __init__(self, debug = 0):
+  def __init__(self, debug = 0, extract = False, dtype = np.float64):
     self.rawfilesdir = "mfpt_raw"
     self.dirdest = "mfpt_seg"
     self.url="https://mfpt.org/wp-content/uploads/2020/02/MFPT-Fault-Data-Sets-20200227T131140Z-001.zip"
@@ -48,6 +54,9 @@ class MFPT(Database_Download):
               "I": "inner",
               "O": "outer"}
     self.debug = debug
+    self.extract = extract
+    self.dtype = np.dtype(dtype)
+    self.archives = []
 
     """
     The MFPT dataset is divided into 3 kinds of states: normal state, inner race
@@ -87,9 +96,13 @@ class MFPT(Database_Download):
 
     self.files = files_path
 
+  @instrumented()
   def download(self):
     """
     Download and extract compressed files from MFPT website.
+
+    The ZIP file is extracted, unless already extracted, only if extract
+    is set.
     """
 
     url = self.url
@@ -102,12 +115,15 @@ class MFPT(Database_Download):
 
     print("Downloading ZIP file")
 
-    urllib.request.urlretrieve(url, os.path.join(dirname, zip_name))
+    download_files([(url, os.path.join(dirname, zip_name))])
 
-    print("Extracting files")
-    file_name = os.path.join(dirname, zip_name)
-    Archive(file_name).extractall(dirname)
+    self.archives = [os.path.join(dirname, zip_name)]
 
+    if self.extract:
+      print("Extracting files")
+      extract_archives(self.archives, dirname)
+
+  @instrumented()
   def acquisitions(self):
     """
     Extracts the acquisitions of each file in the dictionary files_names.
@@ -125,30 +141,30 @@ class MFPT(Database_Download):
     the sample sequential. All features are separated by an underscore character.
     """
 
+    reader = ArchiveReader(self.archives, self.rawfilesdir)
+
     acquisitions_dict = {}
     for key in self.files:
-      matlab_file = scipy.io.loadmat(self.files[key])
-
-      if len(key) == 8:
-        vibration_data_raw = matlab_file['bearing'][0][0][1]
-      else:
-        vibration_data_raw = matlab_file['bearing'][0][0][2]
-
-      vibration_data = np.array([ elem for singleList in vibration_data_raw for elem in singleList])
-
-      acquisitions_dict[key] = vibration_data
+      signals = read_channels(reader.read(self.files[key]), CHANNELS['mfpt'], self.dtype)
+      acquisitions_dict[key] = signals['vibration']
 
     acquisitions_data = {}
+    acquisitions_data['sample_rate'] = {key: 48828 if 'vload' in self.files[key] else 97656
+                                        for key in acquisitions_dict}
     acquisitions_data['conditions'] = self.conditions
     acquisitions_data['dirdest'] = self.dirdest
     acquisitions_data['acquisitions'] = acquisitions_dict
 
     return acquisitions_data
 
+  @instrumented()
   def load(self):
     """
     Load the data set.
 
+    The acquisitions are kept in a memory-mapped store, one array file per
+    acquisition. An existing pickle cache is converted to the store.
+
     Returns
     -------
     acquisitions : dict
@@ -158,15 +174,17 @@ class MFPT(Database_Download):
     the sample sequential. All features are separated by an underscore character.
     """
 
+    storedir = 'mfpt_store'
     pickle_file = 'mfpt.pickle'
+    if self.dtype != np.float64:
+      storedir += '_' + self.dtype.name
 
-    if os.path.isfile(pickle_file):
-      with open(pickle_file, 'rb') as handle:
-        acquisitions = pickle.load(handle)
+    if is_store(storedir):
+      acquisitions = load_acquisitions(storedir)
+    elif os.path.isfile(pickle_file):
+      acquisitions = convert_pickle(pickle_file, storedir, self.dtype)
     else:
       self.download()
-      acquisitions = self.acquisitions()
-      with open(pickle_file, 'wb') as handle:
-        pickle.dump(acquisitions, handle, protocol=pickle.HIGHEST_PROTOCOL)
+      acquisitions = save_acquisitions(self.acquisitions(), storedir)
 
     return acquisitions
@@ -2,14 +2,23 @@
 Class definition of Paderborn Bearing dataset download and acquisitions extraction.
 """
 
-import urllib.request
 import database
-import scipy.io
-import pickle
+from downloader import download_files
+from archive import ArchiveReader, can_read, extract_archives
+from parallel import map_acquisitions
+from acquisitionstore import is_store, load_acquisitions, save_acquisitions, convert_pickle
+from instrument import instrumented
+from ingestion import CHANNELS, read_channels
 import os
+from functools import partial
+import numpy as np
 
-# Unpack Tools
-from pyunpack import Archive
+def vibration_signal(reader, file_name, dtype=np.float64):
+  """
+  Reads the vibration signal of a Paderborn Matlab file, as dtype.
+  """
+  signals = read_channels(reader.read(file_name), CHANNELS['paderborn'], dtype, file_name)
+  return {'vibration': signals['vibration']}
 
 def files_debug(dirfiles):
   """
@@ -74,6 +83,16 @@ class Paderborn(database.Database_Download):
     the keys represent the condition code and the values the condition name  
   files : dict
     the keys represent the conditions_acquisition and the values are the files names
+  extract : bool
+    whether the RAR files are extracted, otherwise the Matlab files are read
+    straight from the RAR files (which needs rarfile and an unrar tool,
+    the files are extracted when they are missing)
+  archives : list
+    the downloaded RAR files
+  n_jobs : int
+    number of processes reading the Matlab files, all the processors if None
+  dtype : numpy.dtype
+    data type of the acquisitions, e.g. np.float32 to halve their memory
   
   Methods
   -------
@@ -85,7 +104,7 @@ class Paderborn(database.Database_Download):
     Load acquisitions
   """
 
-  def __init__(self, debug = 0):
+  def __init__(self, debug = 0, extract = False, n_jobs = None, dtype = np.float64):
     self.rawfilesdir = "paderborn_raw"
     self.dirdest = "paderborn_seg"
     self.url="http://groups.uni-paderborn.de/kat/BearingDataCenter/"
@@ -93,6 +112,10 @@ class Paderborn(database.Database_Download):
                   "I": "inner", 
                   "O": "outer"}
     self.debug = debug
+    self.extract = extract
+    self.n_jobs = n_jobs
+    self.dtype = np.dtype(dtype)
+    self.archives = []
 
     """
     Associate each file name to a bearing condition in a Python dictionary. 
@@ -163,9 +186,14 @@ class Paderborn(database.Database_Download):
 
     self.files = files_path
 
+  @instrumented()
   def download(self):
     """
     Download and extract compressed files from Paderborn website.
+
+    The RAR files are extracted in parallel, skipping the ones already
+    extracted, if extract is set or if they cannot be read in place
+    (rarfile or its unrar tool missing).
     """
     
     # RAR Files names
@@ -190,27 +218,31 @@ class Paderborn(database.Database_Download):
     
 
     print("Downloading RAR files:")
-    for i in rar_files_name:
-      file_name = i
-      if not os.path.exists(os.path.join(dirname, dir_rar, file_name)):
-        urllib.request.urlretrieve(url+file_name, os.path.join(dirname, dir_rar, file_name))
-      print(file_name)
+    download_files([(url+file_name, os.path.join(dirname, dir_rar, file_name))
+                    for file_name in rar_files_name])
     
-    print("Extracting files:")
-    for i in rar_files_name:
-      if not os.path.exists(os.path.join(dirname, i[:4])):
-        file_name = os.path.join(dirname, dir_rar, i)
-        Archive(file_name).extractall(dirname)  
-        print(i)
+    self.archives = [os.path.join(dirname, dir_rar, file_name) for file_name in rar_files_name]
 
     if self.debug==0:
       files_path = self.files
     else:
       files_path = files_debug(self.rawfilesdir)
 
+    if self.extract or not all(map(can_read, self.archives)):
+      # the Matlab files expected from each archive, found in its folder
+      expected = {}
+      for key, file_name in files_path.items():
+        if key != 'OR_KA08_2_2':
+          folder = os.path.basename(os.path.dirname(file_name))
+          expected.setdefault(os.path.join(dirname, dir_rar, folder+".rar"), []).append(file_name)
+      print("Extracting files:")
+      for file_name in extract_archives(self.archives, dirname, files=expected):
+        print(file_name)
+
     print(files_path)
     self.files = files_path
 
+  @instrumented()
   def acquisitions(self):
     """
     Extracts the acquisitions of each file in the dictionary files_names.
@@ -218,6 +250,9 @@ class Paderborn(database.Database_Download):
     in the files_names in numpy arrays.
     As large the number of entries in files_names 
     as large will be the space of memory necessary.
+
+    The files are decoded by n_jobs worker processes, and the acquisitions
+    keep the order of files_names.
     
     Returns
     -------
@@ -228,28 +263,35 @@ class Paderborn(database.Database_Download):
     the sample sequential. All features are separated by an underscore character.
     """
 
+    reader = ArchiveReader(self.archives, self.rawfilesdir)
+    reader.members # listed once, before the reader is sent to the workers
+
+    files_name = [self.files[key] for key in self.files if key != 'OR_KA08_2_2']
+    signals = map_acquisitions(partial(vibration_signal, reader, dtype=self.dtype), files_name, self.n_jobs)
+
     acquisitions_dict = {}
     for key in self.files:
       if key != 'OR_KA08_2_2':    
         print(self.files[key])
-        matlab_file = scipy.io.loadmat(self.files[key])
-        if len(self.files[key])>41:
-          vibration_data=matlab_file[self.files[key][19:38]]['Y'][0][0][0][6][2]
-        else:
-          vibration_data=matlab_file[self.files[key][19:37]]['Y'][0][0][0][6][2]
+        vibration_data = next(signals)['vibration']
 
-      acquisitions_dict[key] = vibration_data[0]
+      acquisitions_dict[key] = vibration_data
 
     acquisitions_data = {}
+    acquisitions_data['sample_rate'] = 64000
     acquisitions_data['conditions'] = self.conditions
     acquisitions_data['dirdest'] = self.dirdest
     acquisitions_data['acquisitions'] = acquisitions_dict
 
     return acquisitions_data
   
+  @instrumented()
   def load(self):
     """
     Load the data set.
+
+    The acquisitions are kept in a memory-mapped store, one array file per
+    acquisition. An existing pickle cache is converted to the store.
  
     Returns
     -------
@@ -260,16 +302,17 @@ class Paderborn(database.Database_Download):
     the sample sequential. All features are separated by an underscore character.
     """
 
+    storedir = 'paderborn_store'
     pickle_file = 'paderborn.pickle'
+    if self.dtype != np.float64:
+      storedir += '_' + self.dtype.name
 
-
-    if os.path.isfile(pickle_file):
-      with open(pickle_file, 'rb') as handle:
-        acquisitions = pickle.load(handle)
+    if is_store(storedir):
+      acquisitions = load_acquisitions(storedir)
+    elif os.path.isfile(pickle_file):
+      acquisitions = convert_pickle(pickle_file, storedir, self.dtype)
     else:
       self.download()
-      acquisitions = self.acquisitions()
-      with open(pickle_file, 'wb') as handle:
-        pickle.dump(acquisitions, handle, protocol=pickle.HIGHEST_PROTOCOL)
+      acquisitions = save_acquisitions(self.acquisitions(), storedir)
 
     return acquisitions
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Parallel parsing of acquisition files in worker processes.
+
+Workers write the decoded signals to shared memory and send back only
+their names, shapes and dtypes, so the arrays are not pickled on their way
+to the parent process.
+"""
+
+import collections
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+_function = None
+
+
+def _initializer(function):
+  """
+  Keeps the parsing function in the worker, so it is sent only once.
+  """
+  global _function
+  _function = function
+
+
+def _to_shared_memory(item):
+  """
+  Calls the parsing function on item, which returns a dict of arrays, and
+  moves the arrays to one shared memory block.
+  """
+  arrays = {name: np.ascontiguousarray(array) for name, array in _function(item).items()}
+  nbytes = sum(array.nbytes for array in arrays.values())
+  if nbytes == 0:
+    return None, [(name, array.shape, array.dtype.str, 0) for name, array in arrays.items()]
+  block = shared_memory.SharedMemory(create=True, size=nbytes)
+  layout = []
+  offset = 0
+  for name, array in arrays.items():
+    np.ndarray(array.shape, array.dtype, block.buf, offset)[...] = array
+    layout.append((name, array.shape, array.dtype.str, offset))
+    offset += array.nbytes
+  block.close()
+  return block.name, layout
+
+
+def _from_shared_memory(block_name, layout):
+  """
+  Copies the arrays out of a shared memory block and releases it.
+  """
+  if block_name is None:
+    return {name: np.empty(shape, dtype) for name, shape, dtype, _ in layout}
+  block = shared_memory.SharedMemory(name=block_name)
+  try:
+    return {name: np.ndarray(shape, dtype, block.buf, offset).copy()
+            for name, shape, dtype, offset in layout}
+  finally:
+    block.close()
+    block.unlink()
+
+
+def _release(future):
+  """
+  Cancels a pending item, or releases the shared memory block of its
+  result.
+  """
+  if future.cancel():
+    return
+  try:
+    block_name, _ = future.result()
+  except Exception:
+    return
+  if block_name is not None:
+    block = shared_memory.SharedMemory(name=block_name)
+    block.close()
+    block.unlink()
+
+
+def map_acquisitions(function, items, n_jobs=None):
+  """
+  Applies function to every item in worker processes.
+
+  Parameters
+  ----------
+  function : callable
+    a picklable function that parses one item, e.g. a file name, and
+    returns a dict of numpy arrays
+  items : list
+    the items to be parsed
+  n_jobs : int
+    number of worker processes, all the processors if None, and no worker
+    process at all if 1
+
+  Returns
+  -------
+  results : generator
+    the dict returned by function for each item, in the order of items,
+    decoded at most 2*n_jobs items ahead of the consumer; when an item
+    fails, or the consumer stops early, the blocks of the items decoded
+    ahead are released
+  """
+  items = list(items)
+  if n_jobs is None:
+    n_jobs = os.cpu_count() or 1
+  if n_jobs == 1 or len(items) <= 1:
+    for item in items:
+      yield function(item)
+    return
+  # workers must share the tracker of the parent, who releases the blocks
+  resource_tracker.ensure_running()
+  # at most 2*n_jobs items are decoded ahead of the consumer, so memory
+  # stays bounded when the results are consumed one at a time
+  pending = collections.deque()
+  items = iter(items)
+  with ProcessPoolExecutor(max_workers=n_jobs, initializer=_initializer,
+                           initargs=(function,)) as executor:
+    for item in itertools.islice(items, 2*n_jobs):
+      pending.append(executor.submit(_to_shared_memory, item))
+    try:
+      while pending:
+        block_name, layout = pending.popleft().result()
+        for item in itertools.islice(items, 1):
+          pending.append(executor.submit(_to_shared_memory, item))
+        yield _from_shared_memory(block_name, layout)
+    finally:
+      for future in pending:
+        _release(future)
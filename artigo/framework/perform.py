@@ -2,10 +2,17 @@ from mfpt import MFPT
 from paderborn import Paderborn
 from experimenter import Experimenter
 from classifiers import Classifiers, Scoring
+from results import ResultsStore
+import instrument
 
 def main():
     debug = 0
     sample_size = 8192
+    trace_file = None # e.g. "trace.json", to instrument the stages
+    results_file = "results.sqlite" # report with: python results.py results.sqlite
+    
+    if trace_file:
+        instrument.enable(trace_file)
     
     #database = MFPT(debug=debug)
     database = Paderborn(debug=debug)
@@ -14,7 +21,14 @@ def main():
     #print(database_acq)
 
     database_exp = Experimenter(database_acq, sample_size)
-    database_exp.perform(Classifiers(), Scoring())
+    # completed cells are kept in results_file, rerun to resume
+    with ResultsStore(results_file) as store:
+        database_exp.perform(Classifiers(cachedir="features_cache"), Scoring(), n_jobs=-1,
+                             store=store, dataset=type(database).__name__)
+
+    if trace_file:
+        print(instrument.summary())
+        instrument.disable()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+"""
+SQLite store of the experiment results.
+
+Each (dataset, classifier, validation scheme, fold, params) cell is saved
+when it completes, with its scores, fit and score times and the best grid
+parameters, so an interrupted Experimenter.perform() resumes from the
+cells already done. Run as a script, it prints the mean and std tables of
+a store:
+
+  python results.py results.sqlite [--dataset NAME]
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+  dataset TEXT NOT NULL,
+  classifier TEXT NOT NULL,
+  scheme TEXT NOT NULL,
+  fold INTEGER NOT NULL,
+  params TEXT NOT NULL,
+  n_train INTEGER,
+  n_test INTEGER,
+  fit_time REAL,
+  score_time REAL,
+  scores TEXT NOT NULL,
+  best_params TEXT,
+  finished REAL,
+  PRIMARY KEY (dataset, classifier, scheme, fold, params)
+)
+"""
+
+
+def _json_value(value):
+  if isinstance(value, np.generic):
+    return value.item()
+  return repr(value)
+
+
+class ResultsStore:
+  """
+  Results of the experiments in a SQLite database, one row per cell.
+
+  ...
+  Attributes
+  ----------
+  path : str
+    file of the database, created if it does not exist
+
+  Methods
+  -------
+  get(dataset, classifier, scheme, fold, params)
+    Result of a cell, None if it was not completed.
+  put(dataset, classifier, scheme, fold, params, result, best_params)
+    Save the result of a cell.
+  cells(dataset)
+    The completed cells.
+  table(dataset)
+    Mean and std of the scores of each classifier and scheme.
+  """
+
+  def __init__(self, path="results.sqlite"):
+    self.path = path
+    self.connection = sqlite3.connect(path)
+    self.connection.execute(SCHEMA)
+    self.connection.commit()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    self.connection.close()
+
+  def get(self, dataset, classifier, scheme, fold, params):
+    """
+    Returns the result of a cell as returned by cross_validate() for a
+    single fold (fit_time, score_time and test_* arrays), None if the cell
+    is not in the store.
+    """
+    row = self.connection.execute(
+        "SELECT fit_time, score_time, scores FROM results WHERE dataset=? AND classifier=?"
+        " AND scheme=? AND fold=? AND params=?",
+        (dataset, classifier, scheme, fold, params)).fetchone()
+    if row is None:
+      return None
+    result = {'fit_time': np.array([row[0]]), 'score_time': np.array([row[1]])}
+    for metric, score in json.loads(row[2]).items():
+      result[metric] = np.array([score])
+    return result
+
+  def put(self, dataset, classifier, scheme, fold, params, result, best_params=None,
+          n_train=None, n_test=None):
+    """
+    Saves the result of a cell, as returned by cross_validate() for a
+    single fold, and commits it.
+    """
+    scores = {metric: float(score[0]) for metric, score in result.items()
+              if metric not in ('fit_time', 'score_time', 'estimator')}
+    self.connection.execute(
+        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (dataset, classifier, scheme, fold, params, n_train, n_test,
+         float(result['fit_time'][0]), float(result['score_time'][0]), json.dumps(scores),
+         None if best_params is None else json.dumps(best_params, sort_keys=True,
+                                                     default=_json_value),
+         time.time()))
+    self.connection.commit()
+
+  def cells(self, dataset=None):
+    """
+    Returns the completed cells, as dicts with the columns of the store.
+    """
+    query = "SELECT * FROM results"
+    args = ()
+    if dataset is not None:
+      query += " WHERE dataset=?"
+      args = (dataset,)
+    cursor = self.connection.execute(query + " ORDER BY dataset, classifier, scheme, fold", args)
+    names = [column[0] for column in cursor.description]
+    cells = []
+    for row in cursor:
+      cell = dict(zip(names, row))
+      cell['scores'] = json.loads(cell['scores'])
+      cell['best_params'] = json.loads(cell['best_params']) if cell['best_params'] else None
+      cells.append(cell)
+    return cells
+
+  def table(self, dataset=None):
+    """
+    Mean and std over the folds of each score and time.
+
+    Returns
+    -------
+    rows : list
+      one dict per (dataset, classifier, params, scheme, metric), with the
+      number of folds, the mean and the std; params is a short digest of
+      the estimator parameters
+    """
+    groups = {}
+    for cell in self.cells(dataset):
+      values = dict(cell['scores'], fit_time=cell['fit_time'], score_time=cell['score_time'])
+      digest = hashlib.sha1(cell['params'].encode()).hexdigest()[:8]
+      for metric, value in values.items():
+        key = (cell['dataset'], cell['classifier'], digest, cell['scheme'], metric)
+        groups.setdefault(key, []).append(value)
+    rows = []
+    for (dataset, classifier, params, scheme, metric), values in groups.items():
+      rows.append({'dataset': dataset, 'classifier': classifier, 'params': params,
+                   'scheme': scheme, 'metric': metric, 'folds': len(values),
+                   'mean': float(np.mean(values)), 'std': float(np.std(values))})
+    return rows
+
+
+def report(store, dataset=None):
+  """
+  Returns the tables of the store as text, one per dataset.
+  """
+  lines = []
+  current = None
+  for row in store.table(dataset):
+    if row['dataset'] != current:
+      current = row['dataset']
+      lines.append("=== {} ===".format(current))
+      lines.append("{:<22} {:<8} {:<26} {:<14} {:>5} {:>9} {:>9}".format(
+          "classifier", "params", "scheme", "metric", "folds", "mean", "std"))
+    lines.append("{classifier:<22} {params:<8} {scheme:<26} {metric:<14} {folds:>5} "
+                 "{mean:>9.4f} {std:>9.4f}".format(**row))
+  return "\n".join(lines)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Mean and std tables of a results store.")
+  parser.add_argument("path", nargs="?", default="results.sqlite")
+  parser.add_argument("--dataset", help="only the cells of this dataset")
+  args = parser.parse_args(argv)
+  with ResultsStore(args.path) as store:
+    print(report(store, args.dataset))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,182 @@
+"""
+Incremental StatisticalTime features of overlapping windows.
+
+Consecutive windows hop samples apart share all but hop of their samples,
+so their features are updated from running sums of x, x**2, x**3, x**4,
+|x| and sqrt|x|, and from running maxima and minima (monotonic deques),
+instead of being recomputed from the sample_size samples of each window.
+"""
+
+import collections
+
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+
+def _features(n, center, s1, s2, s3, s4, s_abs, s_sqrt, high, low):
+  """
+  StatisticalTime features from the sums over windows of n samples, the
+  power sums taken about center, and the maxima and minima of the windows.
+  """
+  mu = s1/n
+  m2 = s2/n - mu**2
+  m3 = s3/n - 3*mu*s2/n + 2*mu**3
+  m4 = s4/n - 4*mu*s3/n + 6*mu**2*s2/n - 3*mu**4
+  mean = center + mu
+  ms = s2/n + 2*center*mu + center**2
+  rms_ = np.sqrt(ms)
+  sra_ = (s_sqrt/n)**2
+  mean_abs = s_abs/n
+  peak = np.maximum(high, -low)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # same degenerate (constant signal) handling as statistical_time, the
+    # tolerance covering the rounding of the running sums
+    zero = m2 <= 64*np.finfo(np.float64).eps*(np.abs(mean)+np.sqrt(np.abs(m2)))**2
+    kurtosis = np.where(zero, np.nan, m4/m2**2 - 3)
+    skewness = np.where(zero, np.nan, m3/np.abs(m2)**1.5)
+    return np.column_stack((rms_, sra_, kurtosis, skewness, high-low, peak/rms_,
+                            peak/mean_abs, peak/sra_, rms_/mean_abs, kurtosis/ms**2))
+
+
+def window_sums(values, sample_size, hop=1):
+  """
+  Sums of values over the windows of sample_size samples starting every
+  hop samples.
+
+  The prefix sums restart every sample_size samples, so a window sum is the
+  rest of one block plus the beginning of the next, and the rounding error
+  does not grow with the length of the signal.
+  """
+  n_windows = (len(values)-sample_size)//hop + 1
+  n_blocks = -(-len(values)//sample_size)
+  blocks = np.zeros((n_blocks+1, sample_size+1))
+  padded = np.zeros(n_blocks*sample_size)
+  padded[:len(values)] = values
+  np.cumsum(padded.reshape(n_blocks, sample_size), axis=1, out=blocks[:n_blocks, 1:])
+  starts = np.arange(n_windows)*hop
+  block, offset = np.divmod(starts, sample_size)
+  return (blocks[block, sample_size] - blocks[block, offset]) + blocks[block+1, offset]
+
+
+def rolling_statistical_time(signal, sample_size, hop=1):
+  """
+  StatisticalTime features of the windows of sample_size samples, starting
+  every hop samples, of a 1D signal, in O(1) per window.
+
+  The result agrees with statistical_time(sliding_windows(signal,
+  sample_size, hop)) up to rounding.
+  """
+  x = np.asarray(signal, dtype=np.float64)
+  if len(x) < sample_size:
+    return np.empty((0, 10))
+  center = x.mean()
+  d = x - center
+  d2 = np.square(d)
+  absx = np.absolute(x)
+  sums = [window_sums(values, sample_size, hop)
+          for values in (d, d2, d2*d, np.square(d2), absx, np.sqrt(absx))]
+  del d, d2, absx
+  n_windows = len(sums[0])
+  origin = -(sample_size//2)
+  high = maximum_filter1d(x, sample_size, origin=origin)[:n_windows*hop:hop]
+  low = minimum_filter1d(x, sample_size, origin=origin)[:n_windows*hop:hop]
+  return _features(sample_size, center, *sums, high, low)
+
+
+class RollingStatisticalTime:
+  """
+  Streaming StatisticalTime features: samples are pushed as they arrive
+  and the features of each completed window are returned, in O(1)
+  amortized time per sample.
+
+  The running sums are recomputed from the samples of the window every
+  sample_size samples, so their rounding errors do not accumulate.
+
+  ...
+  Attributes
+  ----------
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between the start of consecutive windows
+  center : float
+    the power sums are taken about center, the expected mean of the
+    signal, to avoid cancellation
+  count : int
+    number of samples pushed
+
+  Methods
+  -------
+  update(samples)
+    Push samples and return the features of the completed windows.
+  """
+
+  def __init__(self, sample_size, hop=1, center=0.0):
+    self.sample_size = sample_size
+    self.hop = hop
+    self.center = center
+    self.count = 0
+    self._window = [0.0]*sample_size
+    self._sums = [0.0]*6
+    self._high = collections.deque()
+    self._low = collections.deque()
+
+  def update(self, samples):
+    """
+    Pushes samples of the signal.
+
+    Returns
+    -------
+    features : numpy.ndarray
+      the features of the windows completed by the samples, one row per window
+    """
+    n, hop, center = self.sample_size, self.hop, self.center
+    window, high, low = self._window, self._high, self._low
+    s1, s2, s3, s4, s_abs, s_sqrt = self._sums
+    features = []
+    for x in np.asarray(samples, dtype=np.float64).tolist():
+      i = self.count
+      slot = i % n
+      if i >= n:
+        old = window[slot]
+        d = old - center
+        d2 = d*d
+        s1 -= d
+        s2 -= d2
+        s3 -= d2*d
+        s4 -= d2*d2
+        s_abs -= abs(old)
+        s_sqrt -= abs(old)**0.5
+      window[slot] = x
+      d = x - center
+      d2 = d*d
+      s1 += d
+      s2 += d2
+      s3 += d2*d
+      s4 += d2*d2
+      s_abs += abs(x)
+      s_sqrt += abs(x)**0.5
+      while high and high[-1][1] <= x:
+        high.pop()
+      high.append((i, x))
+      while low and low[-1][1] >= x:
+        low.pop()
+      low.append((i, x))
+      if high[0][0] <= i-n:
+        high.popleft()
+      if low[0][0] <= i-n:
+        low.popleft()
+      self.count = i = i+1
+      if slot == n-1:
+        # exact sums, once per sample_size samples
+        d = np.asarray(window) - center
+        d2 = d*d
+        absx = np.abs(window)
+        s1, s2, s3, s4 = d.sum(), d2.sum(), (d2*d).sum(), (d2*d2).sum()
+        s_abs, s_sqrt = absx.sum(), np.sqrt(absx).sum()
+      if i >= n and (i-n) % hop == 0:
+        features.append((s1, s2, s3, s4, s_abs, s_sqrt, high[0][1], low[0][1]))
+    self._sums = [s1, s2, s3, s4, s_abs, s_sqrt]
+    if not features:
+      return np.empty((0, 10))
+    return _features(n, center, *np.array(features).T)
@@ -0,0 +1,426 @@
+"""
+Streaming inference service for live vibration signals.
+
+Clients send frames of samples of one or more channels over a TCP or Unix
+socket. Each channel has a ring buffer; every completed window is queued,
+the queued windows of all channels are classified in micro-batches by a
+fitted pipeline of Classifiers() (StatisticalTime and the estimator), and
+the predictions are sent back to the clients.
+
+Protocol (little endian):
+  request : channel (uint32), n (uint32), n float32 samples; n = 0 asks
+            for the metrics
+  response: one JSON object per line, {"channel", "window", "label",
+            "latency"} for each window, {"channel", "window", "error"} for
+            each window of a batch whose prediction failed, or the metrics
+
+Backpressure: the queue of windows is bounded. When it is full, the
+connections stop reading their sockets until the batches catch up, and
+the clients block on their writes.
+
+Usage:
+  python service.py fit model.joblib
+  python service.py serve model.joblib --port 8765
+  python service.py load --port 8765 --channels 8 --duration 10
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import contextlib
+import io
+import json
+import logging
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+
+HEADER = struct.Struct('<II')
+SAMPLE = np.dtype('<f4')
+
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+  """
+  Fixed size circular buffer of the samples of one channel, that cuts
+  windows of sample_size samples every hop samples.
+
+  ...
+  Attributes
+  ----------
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between the start of consecutive windows
+  capacity : int
+    number of samples kept, at least sample_size
+  written : int
+    number of samples written
+  windows : int
+    number of windows cut
+
+  Methods
+  -------
+  write(samples)
+    Append samples and return the completed windows.
+  """
+
+  def __init__(self, sample_size, hop=None, capacity=None):
+    self.sample_size = sample_size
+    self.hop = sample_size if hop is None else hop
+    self.capacity = max(capacity or 2*sample_size, sample_size)
+    self.buffer = np.zeros(self.capacity)
+    self.written = 0
+    self.windows = 0
+    self._start = 0
+
+  def _put(self, samples):
+    i = self.written % self.capacity
+    n = min(len(samples), self.capacity-i)
+    self.buffer[i:i+n] = samples[:n]
+    self.buffer[:len(samples)-n] = samples[n:]
+    self.written += len(samples)
+
+  def _get(self, start):
+    i = start % self.capacity
+    if i+self.sample_size <= self.capacity:
+      return self.buffer[i:i+self.sample_size].copy()
+    return np.concatenate((self.buffer[i:], self.buffer[:i+self.sample_size-self.capacity]))
+
+  def write(self, samples):
+    """
+    Appends samples to the buffer.
+
+    Returns
+    -------
+    windows : list
+      (window index, window) of the windows completed by the samples
+    """
+    completed = []
+    while len(samples):
+      room = self.capacity - max(self.written-self._start, 0)
+      chunk, samples = samples[:room], samples[room:]
+      self._put(chunk)
+      while self.written-self._start >= self.sample_size:
+        completed.append((self.windows, self._get(self._start)))
+        self.windows += 1
+        self._start += self.hop
+    return completed
+
+
+def percentiles(latencies):
+  if not latencies:
+    return None, None
+  p50, p99 = np.percentile(np.asarray(latencies), [50, 99])
+  return 1000*p50, 1000*p99
+
+
+class InferenceService:
+  """
+  Asyncio server classifying the windows of the streams of its clients.
+
+  ...
+  Attributes
+  ----------
+  estimator : estimator
+    fitted pipeline, e.g. from Classifiers(), predicting windows
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between consecutive windows, sample_size if None
+  batch_size : int
+    maximum number of windows classified at a time
+  max_delay : float
+    time (s) the first window of a batch waits for more windows
+  max_pending : int
+    maximum number of queued windows, beyond it the clients are throttled
+  history : int
+    number of latencies kept for the metrics
+
+  Methods
+  -------
+  serve(host, port, path)
+    Run the server on a TCP port or on the Unix socket path.
+  metrics()
+    Return the counters and the p50/p99 latencies (ms).
+  """
+
+  def __init__(self, estimator, sample_size, hop=None, batch_size=64, max_delay=0.002,
+               max_pending=1024, history=100000):
+    self.estimator = estimator
+    self.sample_size = sample_size
+    self.hop = hop
+    self.batch_size = batch_size
+    self.max_delay = max_delay
+    self.max_pending = max_pending
+    self.latencies = collections.deque(maxlen=history)
+    self.n_windows = 0
+    self.n_batches = 0
+    self.n_errors = 0
+    self.n_samples = 0
+    self.queue = None
+    # one batch at a time, predictions are not blocking the event loop
+    self.executor = ThreadPoolExecutor(max_workers=1)
+
+  def metrics(self):
+    p50, p99 = percentiles(self.latencies)
+    return {'samples': self.n_samples, 'windows': self.n_windows, 'batches': self.n_batches,
+            'errors': self.n_errors,
+            'mean_batch_size': self.n_windows/self.n_batches if self.n_batches else 0,
+            'pending': self.queue.qsize() if self.queue is not None else 0,
+            'p50_ms': p50, 'p99_ms': p99}
+
+  async def handle(self, reader, writer):
+    """
+    Reads the frames of one connection and queues its completed windows.
+    """
+    buffers = {}
+    try:
+      while True:
+        channel, n = HEADER.unpack(await reader.readexactly(HEADER.size))
+        if n == 0:
+          writer.write((json.dumps({'metrics': self.metrics()})+'\n').encode())
+          await writer.drain()
+          continue
+        samples = np.frombuffer(await reader.readexactly(n*SAMPLE.itemsize), SAMPLE)
+        arrival = time.perf_counter()
+        self.n_samples += n
+        if channel not in buffers:
+          buffers[channel] = RingBuffer(self.sample_size, self.hop)
+        for index, window in buffers[channel].write(samples):
+          await self.queue.put((arrival, writer, channel, index, window))
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      writer.close()
+
+  async def batcher(self):
+    """
+    Classifies the queued windows in batches of up to batch_size windows,
+    waiting at most max_delay for a batch to fill. A batch whose prediction
+    fails is logged and answered with an error for each of its windows.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+      items = [await self.queue.get()]
+      deadline = loop.time() + self.max_delay
+      while len(items) < self.batch_size:
+        if not self.queue.empty():
+          items.append(self.queue.get_nowait())
+          continue
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+          break
+        try:
+          items.append(await asyncio.wait_for(self.queue.get(), timeout))
+        except asyncio.TimeoutError:
+          break
+
+      X = np.stack([item[4] for item in items])
+      try:
+        labels = await loop.run_in_executor(self.executor, self.estimator.predict, X)
+        error = None
+      except Exception as exception:
+        logger.exception("prediction of a batch of %d windows failed", len(items))
+        labels, error = [None]*len(items), repr(exception)
+      done = time.perf_counter()
+      writers = set()
+      for (arrival, writer, channel, index, _), label in zip(items, labels):
+        if error is None:
+          self.latencies.append(done-arrival)
+          response = {'channel': channel, 'window': index, 'label': str(label),
+                      'latency': done-arrival}
+        else:
+          response = {'channel': channel, 'window': index, 'error': error}
+        if not writer.is_closing():
+          writer.write((json.dumps(response)+'\n').encode())
+          writers.add(writer)
+      if error is None:
+        self.n_windows += len(items)
+      else:
+        self.n_errors += len(items)
+      self.n_batches += 1
+      for writer in writers:
+        with contextlib.suppress(ConnectionError):
+          await writer.drain()
+
+  async def serve(self, host='127.0.0.1', port=8765, path=None):
+    """
+    Runs the server on the Unix socket path, or on host:port if path is None.
+    """
+    self.queue = asyncio.Queue(maxsize=self.max_pending)
+    if path is None:
+      server = await asyncio.start_server(self.handle, host, port)
+    else:
+      server = await asyncio.start_unix_server(self.handle, path)
+    batcher = asyncio.create_task(self.batcher())
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      batcher.cancel()
+
+
+async def open_connection(host='127.0.0.1', port=8765, path=None):
+  if path is None:
+    return await asyncio.open_connection(host, port)
+  return await asyncio.open_unix_connection(path)
+
+
+async def load_generator(signals, host='127.0.0.1', port=8765, path=None, sample_size=8192,
+                         hop=None, frame_size=1024, rate=64000, duration=10.0, timeout=10.0):
+  """
+  Streams signals to the service, one channel per signal, and measures the
+  round trip latency of each window, from the frame completing it to its
+  prediction.
+
+  Parameters
+  ----------
+  signals : list
+    (label, signal) of each channel; a signal is repeated if shorter than
+    the duration
+  rate : float
+    samples per second of each channel, as fast as possible if None
+  duration : float
+    streamed time (s) at the given rate
+
+  Returns
+  -------
+  report : dict
+    windows, throughput (windows/s), accuracy, client p50/p99 latencies
+    (ms) and the metrics of the service
+  """
+  hop = sample_size if hop is None else hop
+  reader, writer = await open_connection(host, port, path)
+  n_samples = int(duration*(rate or 64000))
+  sent = [([], []) for _ in signals]     # cumulative samples and times of the frames
+  expected = 0 if n_samples < sample_size else (n_samples-sample_size)//hop + 1
+  expected *= len(signals)
+  latencies = []
+  correct = 0
+  errors = 0
+  metrics = asyncio.get_running_loop().create_future()
+
+  async def receive():
+    nonlocal correct, errors
+    received = 0
+    while True:
+      line = await reader.readline()
+      if not line:
+        break
+      message = json.loads(line)
+      if 'metrics' in message:
+        metrics.set_result(message['metrics'])
+        break
+      if 'error' in message:
+        errors += 1
+      else:
+        now = time.perf_counter()
+        totals, times = sent[message['channel']]
+        end = message['window']*hop + sample_size
+        latencies.append(now - times[bisect.bisect_left(totals, end)])
+        correct += message['label'] == signals[message['channel']][0]
+      received += 1
+      if received == expected:
+        writer.write(HEADER.pack(0, 0))
+
+  receiver = asyncio.create_task(receive())
+  start = time.perf_counter()
+  for offset in range(0, n_samples, frame_size):
+    n = min(frame_size, n_samples-offset)
+    for channel, (_, signal) in enumerate(signals):
+      index = np.arange(offset, offset+n) % len(signal)
+      writer.write(HEADER.pack(channel, n) + signal[index].astype(SAMPLE).tobytes())
+      sent[channel][0].append(offset+n)
+      sent[channel][1].append(time.perf_counter())
+    await writer.drain()
+    if rate:
+      delay = start + (offset+n)/rate - time.perf_counter()
+      if delay > 0:
+        await asyncio.sleep(delay)
+  if expected == 0:
+    writer.write(HEADER.pack(0, 0))
+  try:
+    await asyncio.wait_for(receiver, timeout)
+  except asyncio.TimeoutError:
+    pass
+  elapsed = time.perf_counter() - start
+  writer.close()
+
+  p50, p99 = percentiles(latencies)
+  return {'windows': len(latencies), 'expected': expected, 'errors': errors,
+          'throughput': len(latencies)/elapsed,
+          'accuracy': correct/len(latencies) if latencies else None,
+          'p50_ms': p50, 'p99_ms': p99,
+          'service': metrics.result() if metrics.done() else None}
+
+
+def fit_model(file_name, classifier="K-Nearest Neighbors", sample_size=8192):
+  """
+  Fits a pipeline of Classifiers() on the synthetic data set and saves it,
+  with its sample size, to file_name.
+  """
+  from classifiers import Classifiers
+  from experimenter import Experimenter
+  from synthetic import Synthetic
+
+  experimenter = Experimenter(Synthetic(n_repetitions=2, duration=2.0).acquisitions(), sample_size)
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate()
+  estimator = dict(Classifiers())[classifier]
+  estimator.fit(experimenter.signal_dt, experimenter.signal_or)
+  joblib.dump({'estimator': estimator, 'sample_size': sample_size}, file_name)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+  commands = parser.add_subparsers(dest='command', required=True)
+  fit = commands.add_parser('fit', help="fit a model on the synthetic data set")
+  serve = commands.add_parser('serve', help="run the service")
+  load = commands.add_parser('load', help="stream synthetic signals to the service")
+  for command in (fit, serve):
+    command.add_argument('model')
+  fit.add_argument('--classifier', default="K-Nearest Neighbors")
+  fit.add_argument('--sample-size', type=int, default=8192)
+  for command in (serve, load):
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=8765)
+    command.add_argument('--unix', help="Unix socket path, instead of TCP")
+    command.add_argument('--hop', type=int)
+  serve.add_argument('--batch-size', type=int, default=64)
+  serve.add_argument('--max-delay', type=float, default=0.002)
+  serve.add_argument('--max-pending', type=int, default=1024)
+  load.add_argument('--sample-size', type=int, default=8192)
+  load.add_argument('--channels', type=int, default=4)
+  load.add_argument('--frame-size', type=int, default=1024)
+  load.add_argument('--rate', type=float, default=64000,
+                    help="samples/s of each channel, 0 for as fast as possible")
+  load.add_argument('--duration', type=float, default=10.0)
+  args = parser.parse_args(argv)
+
+  if args.command == 'fit':
+    fit_model(args.model, args.classifier, args.sample_size)
+  elif args.command == 'serve':
+    model = joblib.load(args.model)
+    service = InferenceService(model['estimator'], model['sample_size'], args.hop,
+                               args.batch_size, args.max_delay, args.max_pending)
+    asyncio.run(service.serve(args.host, args.port, args.unix))
+  else:
+    from synthetic import Synthetic
+    acquisitions = Synthetic(n_repetitions=1, duration=2.0, seed=7).acquisitions(lazy=True)['acquisitions']
+    keys = list(acquisitions)
+    signals = [(key[0], acquisitions[key]) for key in
+               (keys[i*len(keys)//args.channels % len(keys)] for i in range(args.channels))]
+    report = asyncio.run(load_generator(signals, args.host, args.port, args.unix,
+                                        args.sample_size, args.hop, args.frame_size,
+                                        args.rate or None, args.duration))
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+  main()
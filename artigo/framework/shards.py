@@ -0,0 +1,164 @@
+"""
+Binary sharded storage of segmented windows.
+
+Windows are appended to a few large raw binary files (shards) per
+condition, and an index keeps, for each window, its condition, the key of
+its acquisition, its shard, its row in the shard and its offset in the
+acquisition.
+"""
+
+import json
+import os
+
+import numpy as np
+
+INDEX_FILE = "index.npz"
+
+
+class ShardWriter:
+  """
+  Writes windows in binary shards of at most shard_size windows, one
+  directory per condition.
+
+  ...
+  Attributes
+  ----------
+  dirdest : str
+    directory of the segmented files
+  sample_size : int
+    number of samples of each window
+  shard_size : int
+    maximum number of windows in each shard
+  dtype : numpy.dtype
+    data type of the saved samples
+
+  Methods
+  -------
+  write(condition, key, windows, offsets)
+    Append the windows of one acquisition.
+  close()
+    Close the shards and save the index.
+  """
+
+  def __init__(self, dirdest, sample_size, shard_size=16384, dtype=np.float64):
+    self.dirdest = dirdest
+    self.sample_size = sample_size
+    self.shard_size = shard_size
+    self.dtype = np.dtype(dtype)
+    self._files = {}
+    self._shards = {}
+    self._counts = {}
+    self._index = {'condition': [], 'key': [], 'shard': [], 'row': [], 'offset': []}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def _shard(self, condition):
+    """
+    Open shard of the condition, with room for at least one more window.
+    """
+    shard, rows = self._shards.get(condition, (None, self.shard_size))
+    if rows == self.shard_size:
+      if condition in self._files:
+        self._files[condition].close()
+      dirname = os.path.join(self.dirdest, condition)
+      if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+      n = self._counts.get(condition, 0)
+      self._counts[condition] = n + 1
+      shard = "{}/shard_{:03d}.bin".format(condition, n)
+      self._files[condition] = open(os.path.join(self.dirdest, shard), 'wb')
+      shard, rows = self._shards[condition] = (shard, 0)
+    return shard, rows
+
+  def write(self, condition, key, windows, offsets):
+    """
+    Append the windows (a 2D array) of the acquisition key, whose first
+    samples are at offsets in the acquisition.
+    """
+    windows = np.asarray(windows, dtype=self.dtype)
+    start = 0
+    while start < len(windows):
+      shard, rows = self._shard(condition)
+      n = min(len(windows)-start, self.shard_size-rows)
+      self._files[condition].write(np.ascontiguousarray(windows[start:start+n]).data)
+      self._index['condition'].append(np.full(n, condition))
+      self._index['key'].append(np.full(n, key))
+      self._index['shard'].append(np.full(n, shard))
+      self._index['row'].append(np.arange(rows, rows+n))
+      self._index['offset'].append(np.asarray(offsets[start:start+n], dtype=np.int64))
+      self._shards[condition] = (shard, rows+n)
+      start += n
+
+  def close(self):
+    """
+    Close the shards and save the index.
+    """
+    for handle in self._files.values():
+      handle.close()
+    self._files = {}
+    index = {name: (np.concatenate(values) if values else np.empty(0))
+             for name, values in self._index.items()}
+    meta = json.dumps({'sample_size': self.sample_size, 'dtype': self.dtype.str})
+    np.savez(os.path.join(self.dirdest, INDEX_FILE), meta=meta, **index)
+
+
+class ShardReader:
+  """
+  Reads the windows saved by ShardWriter, memory mapping the shards.
+
+  ...
+  Attributes
+  ----------
+  condition, key, shard, row, offset : numpy.ndarray
+    index of the windows
+  sample_size : int
+    number of samples of each window
+
+  Methods
+  -------
+  read(conditions=None)
+    Return windows, conditions and acquisition keys.
+  """
+
+  def __init__(self, dirdest):
+    self.dirdest = dirdest
+    with np.load(os.path.join(dirdest, INDEX_FILE)) as index:
+      meta = json.loads(str(index['meta']))
+      for name in ('condition', 'key', 'shard', 'row', 'offset'):
+        setattr(self, name, index[name])
+    self.sample_size = meta['sample_size']
+    self.dtype = np.dtype(meta['dtype'])
+    self._shards = {}
+
+  def __len__(self):
+    return len(self.row)
+
+  def shard_array(self, shard):
+    """
+    Memory-mapped 2D array of a shard.
+    """
+    if shard not in self._shards:
+      self._shards[shard] = np.memmap(os.path.join(self.dirdest, shard), dtype=self.dtype,
+                                      mode='r').reshape(-1, self.sample_size)
+    return self._shards[shard]
+
+  def __getitem__(self, i):
+    return self.shard_array(self.shard[i])[self.row[i]]
+
+  def read(self, conditions=None):
+    """
+    Returns the windows of the given conditions (all if None) in a single
+    array, with their conditions and acquisition keys.
+    """
+    mask = np.ones(len(self), dtype=bool) if conditions is None else np.isin(self.condition, conditions)
+    selected = np.flatnonzero(mask)
+    X = np.empty((len(selected), self.sample_size), dtype=self.dtype)
+    shards = self.shard[selected]
+    for shard in np.unique(shards):
+      where = shards == shard
+      X[where] = self.shard_array(shard)[self.row[selected[where]]]
+    return X, self.condition[selected], self.key[selected]
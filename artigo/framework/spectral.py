@@ -0,0 +1,208 @@
+"""
+Frequency domain and envelope spectrum feature extraction.
+"""
+
+import numpy as np
+import scipy.fft
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# Sample rates (Hz) of the databases. MFPT baseline acquisitions are
+# sampled at 97656 Hz and the fault ones at 48828 Hz.
+SAMPLE_RATES = {
+    "cwru_12k": 12000,
+    "cwru_48k": 48000,
+    "mfpt_baseline": 97656,
+    "mfpt_fault": 48828,
+    "paderborn": 64000,
+}
+
+# Geometry of the tested bearings: number of rolling elements, rolling
+# element diameter, pitch diameter (same unit) and contact angle (degrees).
+BEARINGS = {
+    "cwru": (9, 0.3126, 1.537, 0),       # SKF 6205-2RS JEM, drive end
+    "mfpt": (8, 0.235, 1.245, 0),        # NICE bearing
+    "paderborn": (8, 6.75, 28.55, 0),    # 6203
+}
+
+
+def bearing_frequencies(shaft_frequency, n_elements, element_diameter, pitch_diameter,
+                        contact_angle=0):
+  """
+  Characteristic fault frequencies (Hz) of a bearing with stationary outer
+  race turning at shaft_frequency (Hz).
+
+  Returns
+  -------
+  frequencies : dict
+    BPFO (ball pass frequency outer race), BPFI (ball pass frequency inner
+    race), BSF (ball spin frequency) and FTF (fundamental train frequency)
+  """
+  ratio = element_diameter/pitch_diameter*np.cos(np.radians(contact_angle))
+  return {
+      "BPFO": n_elements/2*shaft_frequency*(1-ratio),
+      "BPFI": n_elements/2*shaft_frequency*(1+ratio),
+      "BSF": pitch_diameter/(2*element_diameter)*shaft_frequency*(1-ratio**2),
+      "FTF": shaft_frequency/2*(1-ratio),
+  }
+
+
+class SpectralFeatures(BaseEstimator, TransformerMixin):
+  """
+  Extracts features from the spectrum and from the envelope spectrum.
+
+  The windows are processed in batches: one real FFT of the batch gives the
+  spectrum, the analytic signal (Hilbert transform) is built from the same
+  FFT, and one more real FFT gives the envelope spectrum. Frequency masks
+  and the complex scratch buffer are kept between calls.
+
+  Features, in order: the relative energy of n_bands equal-width bands up
+  to max_frequency; the spectral centroid, spread, skewness and kurtosis;
+  and, for each characteristic frequency and harmonic, the largest
+  envelope spectrum amplitude within tolerance Hz of it.
+
+  ...
+  Attributes
+  ----------
+  sample_rate : float or array-like
+    sample rate (Hz) of the windows, see SAMPLE_RATES, or one rate per
+    window of the X transformed (e.g. the sample_rate column of a
+    metadata.WindowIndex); the windows are transformed in groups of equal
+    rate
+  n_bands : int
+    number of frequency bands
+  max_frequency : float
+    upper limit (Hz) of the bands, half the sample rate if None; fixing it
+    gives comparable features for windows sampled at different rates
+  characteristic_frequencies : dict
+    the keys are names and the values frequencies in Hz, e.g. the result
+    of bearing_frequencies()
+  n_harmonics : int
+    harmonics of each characteristic frequency
+  tolerance : float
+    half-width (Hz) of the search around each harmonic
+  batch_size : int
+    windows transformed at a time
+  """
+
+  stateless = True
+
+  def __init__(self, sample_rate, n_bands=8, max_frequency=None,
+               characteristic_frequencies=None, n_harmonics=3, tolerance=2.0,
+               batch_size=256):
+    self.sample_rate = sample_rate
+    self.n_bands = n_bands
+    self.max_frequency = max_frequency
+    self.characteristic_frequencies = characteristic_frequencies
+    self.n_harmonics = n_harmonics
+    self.tolerance = tolerance
+    self.batch_size = batch_size
+
+  def fit(self, X, y=None):
+    return self
+
+  def _plan(self, sample_size, sample_rate):
+    """
+    Frequency masks for windows of sample_size samples sampled at
+    sample_rate, computed once per rate.
+    """
+    key = (sample_size, sample_rate, self.n_bands, self.max_frequency,
+           repr(self.characteristic_frequencies), self.n_harmonics, self.tolerance)
+    plans = self.__dict__.setdefault('_plan_cache', {})
+    if key in plans:
+      return plans[key]
+    freqs = scipy.fft.rfftfreq(sample_size, 1/sample_rate)
+    top = sample_rate/2 if self.max_frequency is None else self.max_frequency
+    in_range = freqs <= top
+    edges = np.linspace(0, top, self.n_bands+1)
+    band_index = np.searchsorted(freqs[in_range], edges[1:-1])
+    band_index = np.concatenate(([0], band_index, [in_range.sum()]))
+    peaks = []
+    for name, frequency in (self.characteristic_frequencies or {}).items():
+      for harmonic in range(1, self.n_harmonics+1):
+        mask = np.abs(freqs - harmonic*frequency) <= self.tolerance
+        if not mask.any():
+          mask[np.argmin(np.abs(freqs - harmonic*frequency))] = True
+        peaks.append(np.flatnonzero(mask))
+    plans[key] = {'key': key, 'freqs': freqs, 'in_range': in_range,
+                  'band_index': band_index, 'peaks': peaks}
+    return plans[key]
+
+  def _scratch(self, n_rows, sample_size):
+    """
+    Complex buffer for the analytic signals, reused between calls.
+    """
+    buffer = getattr(self, '_buffer', None)
+    if buffer is None or buffer.shape[1] != sample_size or buffer.shape[0] < n_rows:
+      buffer = self._buffer = np.empty((n_rows, sample_size), dtype=np.complex128)
+    return buffer[:n_rows]
+
+  def n_features(self):
+    n_peaks = len(self.characteristic_frequencies or {})*self.n_harmonics
+    return self.n_bands + 4 + n_peaks
+
+  def transform(self, X, y=None, sample_rate=None):
+    """
+    Features of the windows of X, sampled at sample_rate (a number or one
+    rate per window), the sample_rate attribute if None.
+    """
+    X = np.asarray(X)
+    n, sample_size = X.shape
+    rates = self.sample_rate if sample_rate is None else sample_rate
+    if np.ndim(rates) == 0:
+      rates, groups = np.array([float(rates)]), np.zeros(n, dtype=np.intp)
+    else:
+      if len(rates) != n:
+        raise ValueError("{} sample rates for {} windows".format(len(rates), n))
+      rates, groups = np.unique(np.asarray(rates, dtype=np.float64), return_inverse=True)
+    features = np.empty((n, self.n_features()))
+    for group, rate in enumerate(rates):
+      plan = self._plan(sample_size, float(rate))
+      # a single rate transforms slices of X, without copying the windows
+      rows = slice(None) if len(rates) == 1 else np.flatnonzero(groups == group)
+      windows = X[rows]
+      group_features = np.empty((len(windows), self.n_features()))
+      for start in range(0, len(windows), self.batch_size):
+        stop = min(start+self.batch_size, len(windows))
+        group_features[start:stop] = self._transform_batch(windows[start:stop], plan)
+      features[rows] = group_features
+    return features
+
+  def _transform_batch(self, X, plan):
+    n, sample_size = X.shape
+    spectrum = scipy.fft.rfft(X, axis=1)
+    n_freqs = spectrum.shape[1]
+
+    # spectrum features
+    power = np.square(np.abs(spectrum))
+    power_range = power[:, plan['in_range']]
+    total = power_range.sum(axis=1)
+    total[total == 0] = 1
+    cumulative = np.zeros((n, power_range.shape[1]+1))
+    np.cumsum(power_range, axis=1, out=cumulative[:, 1:])
+    bands_energy = np.diff(cumulative[:, plan['band_index']], axis=1)/total[:, None]
+    freqs = plan['freqs'][plan['in_range']]
+    weights = power_range/total[:, None]
+    centroid = weights @ freqs
+    deviation = freqs[None, :] - centroid[:, None]
+    spread = np.sqrt(np.einsum('ij,ij->i', weights, deviation**2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+      skewness = np.einsum('ij,ij->i', weights, deviation**3)/spread**3
+      kurtosis = np.einsum('ij,ij->i', weights, deviation**4)/spread**4
+    del power, power_range, cumulative, weights, deviation
+
+    # Hilbert envelope from the same FFT: the analytic signal has the
+    # positive frequencies doubled and the negative ones zeroed
+    analytic = self._scratch(n, sample_size)
+    analytic[:, :n_freqs] = spectrum
+    analytic[:, n_freqs:] = 0
+    if sample_size % 2 == 0:
+      analytic[:, 1:n_freqs-1] *= 2
+    else:
+      analytic[:, 1:n_freqs] *= 2
+    envelope = np.abs(scipy.fft.ifft(analytic, axis=1, overwrite_x=True))
+    envelope -= envelope.mean(axis=1, keepdims=True)
+    envelope_spectrum = np.abs(scipy.fft.rfft(envelope, axis=1))*(2/sample_size)
+
+    peaks = [envelope_spectrum[:, index].max(axis=1) for index in plan['peaks']]
+
+    return np.column_stack([bands_energy, centroid, spread, skewness, kurtosis] + peaks)
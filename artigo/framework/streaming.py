@@ -0,0 +1,106 @@
+"""
+Streaming segmentation of acquisitions in batches of windows, for data
+sets larger than the memory.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def sliding_windows(signal, sample_size, hop):
+  """
+  Returns a read-only strided view of the windows of sample_size samples,
+  starting every hop samples, of the 1D signal, without copying it.
+  """
+  signal = np.asarray(signal)
+  if len(signal) < sample_size:
+    return np.empty((0, sample_size), dtype=signal.dtype)
+  return np.lib.stride_tricks.sliding_window_view(signal, sample_size)[::hop]
+
+
+def condition_label(key):
+  """
+  Condition of an acquisition key, i.e. its first character.
+  """
+  return key[0]
+
+
+def stream_windows(acquisitions, sample_size, hop=None, batch_size=1024,
+                   label=condition_label, max_windows=None, dtype=np.float64):
+  """
+  Segments the acquisitions one at a time and yields the windows in batches.
+
+  Only one acquisition and one batch are held in memory at a time (when the
+  acquisitions are produced lazily, e.g. by an AcquisitionStore or a
+  generator), regardless of the size of the data set.
+
+  Parameters
+  ----------
+  acquisitions : dict or iterable
+    a mapping from acquisition keys to 1D signals, or an iterable of
+    (key, signal) pairs
+  sample_size : int
+    number of samples of each window
+  hop : int
+    number of samples between the start of consecutive windows,
+    sample_size if None
+  batch_size : int
+    maximum number of windows in each batch
+  label : callable
+    returns the label of the windows of an acquisition key
+  max_windows : int
+    maximum number of windows of each acquisition
+
+  Returns
+  -------
+  batches : generator
+    (windows, labels, groups) tuples, where windows is a 2D array and
+    labels and groups are the labels and acquisition keys of its rows
+  """
+  hop = sample_size if hop is None else hop
+  if isinstance(acquisitions, Mapping):
+    acquisitions = acquisitions.items()
+  windows = np.empty((batch_size, sample_size), dtype=dtype)
+  labels = []
+  groups = []
+  filled = 0
+  for key, signal in acquisitions:
+    segments = sliding_windows(signal, sample_size, hop)[:max_windows]
+    start = 0
+    while start < len(segments):
+      n = min(len(segments)-start, batch_size-filled)
+      windows[filled:filled+n] = segments[start:start+n]
+      labels.append(np.full(n, label(key)))
+      groups.append(np.full(n, key))
+      filled += n
+      start += n
+      if filled == batch_size:
+        yield windows, np.concatenate(labels), np.concatenate(groups)
+        windows = np.empty((batch_size, sample_size), dtype=dtype)
+        labels, groups, filled = [], [], 0
+  if filled:
+    yield windows[:filled], np.concatenate(labels), np.concatenate(groups)
+
+
+def transform_stream(extractor, batches):
+  """
+  Applies a stateless feature extractor to every batch of windows.
+
+  Returns
+  -------
+  features : numpy.ndarray
+    the features of all windows
+  labels : numpy.ndarray
+    the label of each window
+  groups : numpy.ndarray
+    the acquisition key of each window
+  """
+  features, labels, groups = [], [], []
+  for X, y, g in batches:
+    features.append(extractor.transform(X))
+    labels.append(y)
+    groups.append(g)
+  if not features:
+    return np.empty((0, 0)), np.empty(0), np.empty(0)
+  return np.concatenate(features), np.concatenate(labels), np.concatenate(groups)
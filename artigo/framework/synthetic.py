@@ -0,0 +1,294 @@
+"""
+Synthetic bearing vibration data set, for tests and scaling experiments
+without downloading the real databases.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import scipy.signal
+
+import database
+from acquisitionstore import INDEX_FILE, is_store, load_acquisitions, save_acquisitions
+from instrument import instrumented
+from spectral import BEARINGS, bearing_frequencies
+
+# Operating settings as (shaft frequency in Hz, relative radial load),
+# after the Paderborn settings N15_M07_F10, N09_M07_F10, N15_M01_F10 and
+# N15_M07_F04.
+SETTINGS = ((25.0, 1.0), (15.0, 1.0), (25.0, 1.0), (25.0, 0.4))
+
+# Key prefix of each condition, the first character being the condition.
+PREFIXES = {"N": "Normal", "I": "IR", "O": "OR", "B": "Ball"}
+
+CONDITIONS = {"N": "normal", "I": "inner", "O": "outer", "B": "ball"}
+
+
+def impulse_response(resonance, damping, sample_rate):
+  """
+  Damped sinusoid excited by each impact at the resonance (Hz) of the
+  structure, truncated when it decays below 1% of its peak.
+  """
+  decay = 2*np.pi*resonance*damping
+  t = np.arange(int(np.ceil(np.log(100)/decay*sample_rate))+1)/sample_rate
+  return np.exp(-decay*t)*np.sin(2*np.pi*resonance*np.sqrt(1-damping**2)*t)
+
+
+def impact_times(rng, frequency, duration, slip=0.01):
+  """
+  Times of the impacts repeating at frequency (Hz), with a random slip of
+  the rolling elements between consecutive impacts.
+  """
+  period = 1/frequency
+  n = int(duration*frequency*(1+5*slip)) + 2
+  intervals = period*(1 + slip*rng.standard_normal(n))
+  times = rng.uniform(0, period) + np.cumsum(intervals) - intervals[0]
+  return times[times < duration]
+
+
+class SyntheticAcquisitions(Mapping):
+  """
+  Read-only mapping from acquisition keys to synthetic signals, generated
+  when they are accessed.
+
+  Every acquisition has its own random stream, derived from the seed and
+  its key, so a signal does not depend on the order of the accesses nor on
+  the size of the data set.
+  """
+
+  def __init__(self, synthetic):
+    self.synthetic = synthetic
+    self.index = synthetic.keys()
+
+  def __getitem__(self, key):
+    return self.synthetic.signal(*self.index[key])
+
+  def length(self, key):
+    """
+    Number of samples of an acquisition, without generating it.
+    """
+    self.index[key]
+    return int(self.synthetic.duration*self.synthetic.sample_rate)
+
+  def __iter__(self):
+    return iter(self.index)
+
+  def __len__(self):
+    return len(self.index)
+
+
+class Synthetic(database.Database_Download):
+  """
+  Synthetic bearing vibration data set.
+
+  Each signal is the sum of the shaft harmonics, of the response of a
+  structural resonance to the impacts of the fault (at the BPFO, BPFI or
+  twice the BSF, with random slip) and of white noise. Inner race impacts
+  are amplitude modulated by the shaft rotation, and ball impacts by the
+  cage (FTF). Normal bearings have no impacts.
+
+  The acquisition keys follow the Paderborn keys: the condition, the
+  bearing code, the setting and the repetition, separated by an underscore
+  character, e.g. IR_S002_1_3.
+
+  ...
+  Attributes
+  ----------
+  dirdest : str
+    directory name of the segmented files
+  conditions : dict
+    the keys represent the condition code and the values the condition name
+  n_bearings : int
+    number of bearings of each condition
+  settings : tuple
+    (shaft frequency, relative load) of each operating setting
+  n_repetitions : int
+    acquisitions of each bearing in each setting
+  duration : float
+    length (s) of each acquisition
+  sample_rate : int
+    sample rate (Hz)
+  bearing : tuple
+    geometry of the bearing, see spectral.BEARINGS
+  resonance : float
+    mean resonance frequency (Hz) of the structure, varies by bearing
+  damping : float
+    damping ratio of the resonance
+  noise : float
+    standard deviation of the white noise
+  seed : int
+    seed of the random streams
+  dtype : numpy.dtype
+    data type of the signals
+
+  Methods
+  -------
+  download()
+    Nothing to be downloaded.
+  acquisitions(lazy=False)
+    Generate the acquisitions.
+  load(storedir)
+    Generate the acquisitions into an acquisition store.
+  parameters()
+    The generator parameters, as saved in the store.
+  """
+
+  def __init__(self, n_bearings=3, settings=SETTINGS, n_repetitions=4, duration=4.0,
+               sample_rate=64000, conditions="NIO", bearing=BEARINGS["paderborn"],
+               resonance=3000.0, damping=0.05, noise=0.3, seed=42, dtype=np.float64):
+    self.dirdest = "synthetic_seg"
+    self.conditions = {code: CONDITIONS[code] for code in conditions}
+    self.n_bearings = n_bearings
+    self.settings = settings
+    self.n_repetitions = n_repetitions
+    self.duration = duration
+    self.sample_rate = sample_rate
+    self.bearing = bearing
+    self.resonance = resonance
+    self.damping = damping
+    self.noise = noise
+    self.seed = seed
+    self.dtype = np.dtype(dtype)
+
+  def keys(self):
+    """
+    Returns a dict from the acquisition keys to their (condition, bearing,
+    setting, repetition) indices.
+    """
+    keys = {}
+    for code in self.conditions:
+      for bearing in range(self.n_bearings):
+        for setting in range(len(self.settings)):
+          for repetition in range(self.n_repetitions):
+            key = "{}_S{:03d}_{}_{}".format(PREFIXES[code], bearing+1, setting, repetition+1)
+            keys[key] = (code, bearing, setting, repetition)
+    return keys
+
+  def parameters(self):
+    """
+    Returns the parameters the acquisitions are generated from, as they
+    are read back from the JSON index of a store.
+    """
+    return json.loads(json.dumps({
+        'conditions': "".join(self.conditions), 'n_bearings': self.n_bearings,
+        'settings': self.settings, 'n_repetitions': self.n_repetitions,
+        'duration': self.duration, 'sample_rate': self.sample_rate, 'bearing': self.bearing,
+        'resonance': self.resonance, 'damping': self.damping, 'noise': self.noise,
+        'seed': self.seed, 'dtype': self.dtype.str}))
+
+  def _rng(self, *spawn_key):
+    return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=spawn_key))
+
+  def fault_frequencies(self, setting):
+    """
+    Characteristic frequencies (Hz) of the bearing in a setting.
+    """
+    return bearing_frequencies(self.settings[setting][0], *self.bearing)
+
+  def signal(self, code, bearing, setting, repetition):
+    """
+    Generates one acquisition.
+    """
+    n = int(self.duration*self.sample_rate)
+    condition = list(CONDITIONS).index(code)
+    shaft_frequency, load = self.settings[setting]
+
+    # properties of the bearing, the same in every setting and repetition
+    rng = self._rng(condition, bearing)
+    severity = rng.uniform(0.5, 2.0)
+    resonance = self.resonance*(1 + 0.05*rng.standard_normal())
+    phases = rng.uniform(0, 2*np.pi, 3)
+
+    rng = self._rng(condition, bearing, setting, repetition)
+    t = np.arange(n)/self.sample_rate
+
+    harmonics = np.arange(1, 4)
+    amplitudes = 0.2*load/harmonics*(1 + 0.1*rng.standard_normal(3))
+    x = amplitudes @ np.sin(2*np.pi*shaft_frequency*np.outer(harmonics, t) + phases[:, None])
+
+    if code != "N":
+      frequencies = self.fault_frequencies(setting)
+      frequency = {"I": frequencies["BPFI"], "O": frequencies["BPFO"],
+                   "B": 2*frequencies["BSF"]}[code]
+      times = impact_times(rng, frequency, self.duration)
+      forces = severity*load*(1 + 0.1*rng.standard_normal(len(times)))
+      if code == "I":
+        forces *= 1 + 0.5*np.cos(2*np.pi*shaft_frequency*times + phases[0])
+      elif code == "B":
+        forces *= 1 + 0.5*np.cos(2*np.pi*frequencies["FTF"]*times + phases[1])
+      impacts = np.bincount((times*self.sample_rate).astype(np.int64), forces, minlength=n)
+      x += scipy.signal.oaconvolve(impacts, impulse_response(resonance, self.damping,
+                                                             self.sample_rate))[:n]
+
+    x += self.noise*rng.standard_normal(n)
+    return x.astype(self.dtype, copy=False)
+
+  def download(self):
+    """
+    Nothing to be downloaded.
+    """
+    pass
+
+  @instrumented()
+  def acquisitions(self, lazy=False):
+    """
+    Generates the acquisitions.
+
+    Parameters
+    ----------
+    lazy : bool
+      if True, the acquisitions are a SyntheticAcquisitions mapping that
+      generates each signal when it is accessed, so data sets larger than
+      the memory can be streamed or saved
+
+    Returns
+    -------
+    acquisitions_data : dict
+    Returns the sample rate, the conditions dict, the destinations directory
+    and the acquisitions dict, where the keys represent the condition, followed by
+    the bearing code, by an algarism representing the setting and end with
+    an algarism representing the repetition.
+    """
+    acquisitions = SyntheticAcquisitions(self)
+    if not lazy:
+      acquisitions = dict(acquisitions.items())
+
+    acquisitions_data = {}
+    acquisitions_data['sample_rate'] = self.sample_rate
+    acquisitions_data['conditions'] = self.conditions
+    acquisitions_data['dirdest'] = self.dirdest
+    acquisitions_data['acquisitions'] = acquisitions
+
+    return acquisitions_data
+
+  @instrumented()
+  def load(self, storedir="synthetic_store"):
+    """
+    Generates the acquisitions, one at a time, into a memory-mapped
+    acquisition store, or opens the store if it already exists with the
+    same parameters(). A store generated with other parameters is
+    generated again.
+
+    Returns
+    -------
+    acquisitions_data : dict
+      as returned by acquisitions(), with the acquisitions read from the store
+    """
+    parameters = self.parameters()
+    if is_store(storedir):
+      acquisitions_data = load_acquisitions(storedir)
+      if acquisitions_data.get('parameters') == parameters:
+        return acquisitions_data
+      print("Generating {} again, its parameters differ".format(storedir))
+      stale = set(acquisitions_data['acquisitions'].index.values())
+      # without its index the store is not opened if the generation is interrupted
+      os.remove(os.path.join(storedir, INDEX_FILE))
+    else:
+      stale = set()
+    acquisitions_data = save_acquisitions(dict(self.acquisitions(lazy=True),
+                                               parameters=parameters), storedir)
+    for file_name in stale - set(acquisitions_data['acquisitions'].index.values()):
+      os.remove(os.path.join(storedir, file_name))
+    return acquisitions_data
@@ -0,0 +1,11 @@
+"""
+The framework modules import each other by name (e.g. `import database`),
+so the tests run with the framework directory on the path.
+"""
+
+import os
+import sys
+
+FRAMEWORK = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FRAMEWORK not in sys.path:
+  sys.path.insert(0, FRAMEWORK)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from approxknn import ApproxKNeighborsClassifier
+
+
+def data(n_train=600, n_test=150, n_features=6):
+  rng = np.random.default_rng(0)
+  centers = rng.standard_normal((4, n_features))*3
+  y = rng.integers(0, 4, n_train+n_test)
+  X = centers[y] + rng.standard_normal((len(y), n_features))
+  return X[:n_train], y[:n_train], X[n_train:], y[n_train:]
+
+
+def test_full_probe_matches_exact_neighbours():
+  X, y, Q, _ = data()
+  approx = ApproxKNeighborsClassifier(n_neighbors=7, n_lists=16, n_probe=16,
+                                      random_state=0).fit(X, y)
+  exact = KNeighborsClassifier(n_neighbors=7).fit(X, y)
+  distances, indices = approx.kneighbors(Q)
+  exact_distances, exact_indices = exact.kneighbors(Q)
+  recall = np.mean([len(np.intersect1d(a, b)) for a, b in zip(indices, exact_indices)])/7
+  assert recall == 1.0
+  np.testing.assert_allclose(distances, exact_distances, atol=1e-9)
+  np.testing.assert_array_equal(approx.predict(Q), exact.predict(Q))
+  np.testing.assert_allclose(approx.predict_proba(Q), exact.predict_proba(Q))
+
+
+def test_recall_grows_with_probes():
+  X, y, Q, _ = data()
+  exact_indices = KNeighborsClassifier(n_neighbors=5).fit(X, y).kneighbors(Q)[1]
+  recalls = []
+  for n_probe in (1, 4, 16):
+    indices = ApproxKNeighborsClassifier(n_neighbors=5, n_lists=16, n_probe=n_probe,
+                                         random_state=0).fit(X, y).kneighbors(Q)[1]
+    recalls.append(np.mean([len(np.intersect1d(a, b))
+                            for a, b in zip(indices, exact_indices)])/5)
+  assert recalls == sorted(recalls) and recalls[-1] == 1.0
+
+
+@pytest.mark.parametrize('n_probe', [1, 2])
+def test_more_neighbours_than_probed_points(n_probe):
+  X, y, Q, _ = data(n_train=200)
+  approx = ApproxKNeighborsClassifier(n_neighbors=60, n_lists=20, n_probe=n_probe,
+                                      random_state=0).fit(X, y)
+  cells = np.diff(approx.index_.starts)
+  assert cells.max()*n_probe < 60
+  distances, indices = approx.kneighbors(Q)
+  exact_distances, exact_indices = KNeighborsClassifier(n_neighbors=60).fit(X, y).kneighbors(Q)
+  assert indices.shape == (len(Q), 60)
+  assert all(len(np.unique(row)) == 60 for row in indices)
+  np.testing.assert_allclose(distances, exact_distances, atol=1e-9)
+  assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_classes_are_labels():
+  X, y, Q, _ = data()
+  labels = np.array(['N', 'I', 'O', 'B'])
+  approx = ApproxKNeighborsClassifier(n_lists=8, random_state=0).fit(X, labels[y])
+  assert set(approx.predict(Q)) <= set(labels)
+  np.testing.assert_array_equal(approx.classes_, np.sort(labels))
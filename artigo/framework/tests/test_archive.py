@@ -0,0 +1,41 @@
+import os
+import zipfile
+
+import archive
+from archive import is_extracted
+
+
+def touch(file_name, data=b'x'):
+  os.makedirs(os.path.dirname(file_name), exist_ok=True)
+  with open(file_name, 'wb') as handle:
+    handle.write(data)
+
+
+def test_unlistable_archive_checks_expected_files(tmp_path, monkeypatch):
+  monkeypatch.setattr(archive, 'can_read', lambda archive_name: False)
+  rar = str(tmp_path / 'rar_files' / 'K001.rar')
+  files = [str(tmp_path / 'K001' / 'N15_M07_F10_K001_{}.mat'.format(i)) for i in (1, 2)]
+  assert not is_extracted(rar, str(tmp_path), files=files)
+  touch(files[0])
+  assert not is_extracted(rar, str(tmp_path), files=files)
+  touch(files[1])
+  assert is_extracted(rar, str(tmp_path), files=files)
+
+
+def test_unlistable_archive_without_files_checks_its_folder(tmp_path, monkeypatch):
+  monkeypatch.setattr(archive, 'can_read', lambda archive_name: False)
+  rar = str(tmp_path / 'rar_files' / 'KA01.rar')
+  assert not is_extracted(rar, str(tmp_path))
+  os.makedirs(str(tmp_path / 'KA01'))
+  assert is_extracted(rar, str(tmp_path))
+
+
+def test_listed_archive_checks_members(tmp_path):
+  zip_name = str(tmp_path / 'data.zip')
+  with zipfile.ZipFile(zip_name, 'w') as handle:
+    handle.writestr('data/a.mat', b'abc')
+  dirname = str(tmp_path / 'out')
+  assert not is_extracted(zip_name, dirname)
+  touch(os.path.join(dirname, 'data', 'a.mat'), b'abd')
+  assert is_extracted(zip_name, dirname)
+  assert not is_extracted(zip_name, dirname, verify=True)
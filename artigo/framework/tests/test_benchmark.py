@@ -0,0 +1,32 @@
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+import scipy.io
+
+import benchmark
+from experimenter import Experimenter
+
+
+def test_load_cwru(tmp_path, monkeypatch):
+  framework_database = sys.modules['database']
+  cwru = benchmark.load_cwru()
+  assert sys.modules['database'] is framework_database
+  monkeypatch.chdir(tmp_path)
+  monkeypatch.setattr(cwru.CWRU, 'download', lambda self: None)
+  os.makedirs('cwru_raw')
+  rng = np.random.default_rng(0)
+  for i, file_name in enumerate(cwru.files_debug().values()):
+    number = file_name[:-len('.mat')]
+    scipy.io.savemat(os.path.join('cwru_raw', file_name),
+                     {'X{}_DE_time'.format(number): rng.standard_normal((4096+i, 1)),
+                      'X{}_FE_time'.format(number): rng.standard_normal((4096+i, 1))})
+  acquisitions, parse = benchmark.load_database('cwru')
+  assert len(acquisitions['acquisitions']) == 8
+  experimenter = Experimenter(acquisitions, 1024, parse=parse)
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate()
+  assert sorted(set(experimenter.signal_or)) == ['B', 'I', 'N', 'O']
+  assert len(experimenter.signal_dt) == 8*4
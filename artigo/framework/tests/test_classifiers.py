@@ -0,0 +1,15 @@
+import numpy as np
+
+from classifiers import Classifiers
+
+
+def test_halving_forest_reports_grid_values():
+  rng = np.random.default_rng(0)
+  y = np.repeat(['N', 'I', 'O'], 40)
+  X = rng.standard_normal((len(y), 256)) * np.repeat([1.0, 2.0, 4.0], 40)[:, None]
+  search = dict(Classifiers(search="halving"))['Random Forest']
+  search.set_params(estimator__rf__random_state=0, estimator__rf__n_jobs=1)
+  search.fit(X, y)
+  assert list(search.n_resources_) == [100, 200]
+  assert search.best_params_['rf__n_estimators'] == 200
+  assert search.best_params_['rf__max_features'] in (1, 5, 10)
@@ -0,0 +1,169 @@
+import contextlib
+import hashlib
+import http.server
+import io
+import os
+import threading
+
+import pytest
+
+import downloader
+from downloader import MANIFEST_FILE, Manifest, _is_complete, download_files
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+  """
+  Serves server.files, with Range requests, dropping the connection
+  halfway through the first server.drops[path] responses of a path.
+  """
+
+  def log_message(self, *args):
+    pass
+
+  def send_head(self):
+    data = self.server.files.get(self.path)
+    if data is None:
+      self.send_error(404)
+      return None
+    start = 0
+    header = self.headers.get('Range')
+    if header:
+      start = int(header.split('=')[1].split('-')[0])
+      if start >= len(data):
+        self.send_response(416)
+        self.send_header('Content-Range', 'bytes */{}'.format(len(data)))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return None
+      self.send_response(206)
+      self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(data)-1, len(data)))
+    else:
+      self.send_response(200)
+    self.send_header('Content-Length', str(len(data)-start))
+    self.end_headers()
+    return data[start:]
+
+  def do_HEAD(self):
+    self.send_head()
+
+  def do_GET(self):
+    self.server.requests.append((self.path, self.headers.get('Range')))
+    body = self.send_head()
+    if body is None:
+      return
+    if self.server.drops.get(self.path, 0) > 0:
+      self.server.drops[self.path] -= 1
+      self.wfile.write(body[:len(body)//2])
+      self.wfile.flush()
+      self.close_connection = True
+      return
+    self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+  monkeypatch.setattr(downloader.time, 'sleep', lambda seconds: None)
+  httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+  httpd.files, httpd.drops, httpd.requests = {}, {}, []
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  httpd.url = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+  yield httpd
+  httpd.shutdown()
+  httpd.server_close()
+
+
+def content(size=5000):
+  return bytes(range(256))*(size//256) + bytes(size % 256)
+
+
+def download(server, tmp_path, verify=False):
+  file_name = str(tmp_path / 'data.mat')
+  with contextlib.redirect_stdout(io.StringIO()):
+    download_files([(server.url+'/data.mat', file_name)], verify=verify, timeout=5)
+  return file_name
+
+
+def check_downloaded(file_name, data):
+  with open(file_name, 'rb') as handle:
+    assert handle.read() == data
+  assert not os.path.exists(file_name + '.part')
+  entry = Manifest(os.path.dirname(file_name)).get('data.mat')
+  assert entry == {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def legacy_file(tmp_path, size=100):
+  file_name = str(tmp_path / 'data.mat')
+  with open(file_name, 'wb') as handle:
+    handle.write(b'x'*size)
+  return file_name
+
+
+def test_unknown_remote_size_keeps_legacy_file(tmp_path, monkeypatch):
+  monkeypatch.setattr(downloader, '_remote_size', lambda url, timeout: None)
+  file_name = legacy_file(tmp_path)
+  manifest = Manifest(str(tmp_path))
+  assert _is_complete('http://offline/data.mat', file_name, manifest, False, 1)
+  assert os.path.exists(file_name) and not os.path.exists(file_name + '.part')
+  assert manifest.get('data.mat') is None
+
+
+def test_matching_remote_size_records_legacy_file(tmp_path, monkeypatch):
+  monkeypatch.setattr(downloader, '_remote_size', lambda url, timeout: 100)
+  file_name = legacy_file(tmp_path)
+  manifest = Manifest(str(tmp_path))
+  assert _is_complete('http://host/data.mat', file_name, manifest, False, 1)
+  assert manifest.get('data.mat')['size'] == 100
+
+
+def test_different_remote_size_demotes_legacy_file(tmp_path, monkeypatch):
+  monkeypatch.setattr(downloader, '_remote_size', lambda url, timeout: 200)
+  file_name = legacy_file(tmp_path)
+  assert not _is_complete('http://host/data.mat', file_name, Manifest(str(tmp_path)), False, 1)
+  assert os.path.exists(file_name + '.part') and not os.path.exists(file_name)
+
+
+def test_interrupted_download_is_resumed(server, tmp_path):
+  server.files['/data.mat'] = data = content()
+  server.drops['/data.mat'] = 2
+  file_name = download(server, tmp_path)
+  check_downloaded(file_name, data)
+  assert server.requests == [('/data.mat', None), ('/data.mat', 'bytes=2500-'),
+                             ('/data.mat', 'bytes=3750-')]
+  assert os.path.exists(os.path.join(str(tmp_path), MANIFEST_FILE))
+
+
+def test_complete_partial_file_is_renamed(server, tmp_path):
+  server.files['/data.mat'] = data = content()
+  with open(str(tmp_path / 'data.mat.part'), 'wb') as handle:
+    handle.write(data)
+  check_downloaded(download(server, tmp_path), data)
+  assert server.requests == [('/data.mat', 'bytes=5000-')]
+
+
+def test_oversized_partial_file_is_downloaded_again(server, tmp_path):
+  server.files['/data.mat'] = data = content()
+  with open(str(tmp_path / 'data.mat.part'), 'wb') as handle:
+    handle.write(data + b'xxxx')
+  check_downloaded(download(server, tmp_path), data)
+  assert server.requests == [('/data.mat', 'bytes=5004-'), ('/data.mat', None)]
+
+
+def test_verify_repairs_corrupted_file(server, tmp_path):
+  server.files['/data.mat'] = data = content()
+  file_name = download(server, tmp_path)
+  with open(file_name, 'r+b') as handle:
+    handle.write(b'corrupt')
+  download(server, tmp_path)
+  with open(file_name, 'rb') as handle:
+    assert handle.read() != data
+  check_downloaded(download(server, tmp_path, verify=True), data)
+  assert server.requests == [('/data.mat', None), ('/data.mat', None)]
+
+
+def test_larger_legacy_file_is_downloaded_again(server, tmp_path):
+  server.files['/data.mat'] = data = content()
+  with open(str(tmp_path / 'data.mat'), 'wb') as handle:
+    handle.write(data + b'xxxx')
+  check_downloaded(download(server, tmp_path), data)
+  assert server.requests == [('/data.mat', None)]
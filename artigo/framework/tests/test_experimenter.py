@@ -0,0 +1,76 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from classifiers import Classifiers, Scoring, StatisticalTime
+from experimenter import Experimenter, featurizations, split_stateless
+from synthetic import Synthetic
+
+
+def acquisitions():
+  return {'acquisitions': {'N_a_0_1': np.arange(5000.), 'I_b_0_1': np.arange(10.),
+                           'O_c_0_1': np.arange(3000.)}}
+
+
+def test_hop_must_be_positive():
+  for hop in (0, -3):
+    with pytest.raises(ValueError):
+      Experimenter(acquisitions(), 1024, hop)
+
+
+def test_segments_aligned_with_keys():
+  experimenter = Experimenter(acquisitions(), 1024, 512)
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate(copy=False)
+  segments = experimenter.segments
+  assert [segment.shape for segment in segments] == [(8, 1024), (0, 1024), (4, 1024)]
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate()
+  np.testing.assert_array_equal(np.concatenate(segments), experimenter.signal_dt)
+
+
+def synthetic(duration):
+  return Synthetic(n_bearings=1, settings=((25.0, 1.0),), n_repetitions=2,
+                   duration=duration).acquisitions()
+
+
+def test_featurizations_count_the_fits():
+  experimenter = Experimenter(synthetic(1.0), 1024)
+  with contextlib.redirect_stdout(io.StringIO()):
+    experimenter.segmentate()
+  X, y = StatisticalTime().transform(experimenter.signal_dt), np.asarray(experimenter.signal_or)
+  for search in ('grid', 'halving', 'path'):
+    for name, clf in Classifiers(search=search):
+      if name == 'MLP' or (search == 'grid' and name == 'Random Forest'):
+        continue
+      # the features are the same in every fold, fit the rest on them
+      _, search_tail = split_stateless(clf)
+      search_tail.fit(X, y)
+      if hasattr(search_tail, 'n_resources_'):
+        resources = [n if search_tail.resource == 'n_samples' else len(y)
+                     for n in search_tail.n_resources_]
+        fits = np.dot(search_tail.n_candidates_, resources)
+      elif hasattr(search_tail, 'n_fits_'):
+        fits = search_tail.n_fits_ // search_tail.n_splits_ * len(y)
+      else:
+        fits = len(search_tail.cv_results_['params'])*len(y)
+      assert featurizations(clf, y, 0) == fits*search_tail.n_splits_ + len(y), (search, name)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_hoist_keeps_the_scores(n_jobs):
+  clfs = [clf for clf in Classifiers() if clf[0] in ('K-Nearest Neighbors', 'SVM')]
+  scores = []
+  for hoist in (True, False):
+    experimenter = Experimenter(synthetic(0.2), 1024)
+    with contextlib.redirect_stdout(io.StringIO()):
+      experimenter.perform(clfs, Scoring(), n_jobs=n_jobs, hoist=hoist)
+    scores.append({(clf_name, scheme, metric): s
+                   for clf_name, schemes in experimenter.scores.items()
+                   for scheme, score in schemes.items()
+                   for metric, s in score.items() if metric.startswith('test_')})
+  assert scores[0].keys() == scores[1].keys()
+  for key, s in scores[0].items():
+    np.testing.assert_array_equal(s, scores[1][key], err_msg=str(key))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from benchmark import statistical_time_rowwise
+from classifiers import StatisticalTime, statistical_time
+from rolling import RollingStatisticalTime, rolling_statistical_time
+from streaming import sliding_windows
+
+
+def signal(n=6000):
+  rng = np.random.default_rng(0)
+  t = np.arange(n)
+  return np.sin(2*np.pi*t/37) + 0.5*rng.standard_normal(n) + 0.2*(t % 97 == 0)
+
+
+def test_batch_features_match_rowwise():
+  X = signal().reshape(-1, 500)
+  np.testing.assert_allclose(statistical_time(X), statistical_time_rowwise(X), rtol=1e-9)
+  np.testing.assert_allclose(StatisticalTime().transform(X), statistical_time_rowwise(X),
+                             rtol=1e-9)
+
+
+def test_float32_features_close_to_float64():
+  X = signal().reshape(-1, 500)
+  features = statistical_time(X, np.float32)
+  assert features.dtype == np.float32
+  np.testing.assert_allclose(features, statistical_time_rowwise(X), rtol=1e-4)
+
+
+@pytest.mark.parametrize('sample_size, hop', [(512, 512), (512, 128), (300, 1)])
+def test_rolling_features_match_batch(sample_size, hop):
+  x = signal()
+  X = sliding_windows(x, sample_size, hop)
+  features = rolling_statistical_time(x, sample_size, hop)
+  assert features.shape == (len(range(0, len(x)-sample_size+1, hop)), 10)
+  np.testing.assert_allclose(features, statistical_time(X), rtol=1e-7, atol=1e-9)
+
+
+def test_rolling_short_signal():
+  assert rolling_statistical_time(np.zeros(10), 512, 1).shape == (0, 10)
+
+
+@pytest.mark.parametrize('sample_size, hop', [(256, 256), (256, 100), (200, 1)])
+def test_streaming_features_match_batch(sample_size, hop):
+  x = signal(3000)
+  stream = RollingStatisticalTime(sample_size, hop)
+  bounds = [0, 1, 57, 256, 257, 1000, 1999, 3000]
+  chunks = [stream.update(x[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+  assert [len(chunk) for chunk in chunks[:2]] == [0, 0]
+  features = np.concatenate(chunks)
+  assert stream.count == len(x)
+  np.testing.assert_allclose(features, statistical_time(sliding_windows(x, sample_size, hop)),
+                             rtol=1e-9, atol=1e-12)
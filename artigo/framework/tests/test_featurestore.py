@@ -0,0 +1,108 @@
+import os
+import time
+
+import numpy as np
+
+import featurestore
+from classifiers import StatisticalTime
+from featurestore import FeatureStore
+
+
+def windows(seed, n=20, sample_size=256):
+  return np.random.default_rng(seed).standard_normal((n, sample_size))
+
+
+def entry_size(tmp_path):
+  store = FeatureStore(StatisticalTime(), str(tmp_path / 'size'))
+  store.transform(windows(0))
+  return store.entries()[0][1]
+
+
+def test_hits_and_misses(tmp_path):
+  cachedir = str(tmp_path / 'cache')
+  store = FeatureStore(StatisticalTime(), cachedir)
+  X = windows(0)
+  features = store.transform(X)
+  np.testing.assert_array_equal(features, StatisticalTime().transform(X))
+  np.testing.assert_array_equal(store.transform(X.copy()), features)
+  store.transform(windows(1))
+  assert (store.hits, store.misses) == (1, 2)
+  # another process, or run, reads the same entries
+  other = FeatureStore(StatisticalTime(), cachedir)
+  other.transform(X)
+  assert (other.hits, other.misses) == (1, 0)
+  # another extractor configuration does not
+  float32 = FeatureStore(StatisticalTime(np.float32), cachedir)
+  assert float32.transform(X).dtype == np.float32
+  assert (float32.hits, float32.misses) == (0, 1)
+  assert len(store.entries()) == 3
+  store.clear()
+  assert store.entries() == []
+
+
+def test_least_recently_used_entries_evicted(tmp_path):
+  size = entry_size(tmp_path)
+  store = FeatureStore(StatisticalTime(), str(tmp_path / 'cache'), max_size=int(2.5*size))
+  keys = {}
+  for seed in range(2):
+    store.transform(windows(seed))
+    keys[seed] = os.path.join(store.cachedir, store.key(windows(seed))+'.npy')
+  now = time.time()
+  os.utime(keys[0], (now-20, now-20))
+  os.utime(keys[1], (now-10, now-10))
+  store.transform(windows(0))  # a hit refreshes the last access of seed 0
+  store.transform(windows(2))
+  assert sorted(os.path.basename(entry[2]) for entry in store.entries()) == \
+      sorted([os.path.basename(keys[0]), store.key(windows(2))+'.npy'])
+  assert sum(entry[1] for entry in store.entries()) <= store.max_size
+
+
+def test_temporary_files(tmp_path):
+  size = entry_size(tmp_path)
+  store = FeatureStore(StatisticalTime(), str(tmp_path / 'cache'), max_size=int(2.5*size))
+  store.transform(windows(0))
+  orphan = os.path.join(store.cachedir, 'crashed.tmp')
+  writing = os.path.join(store.cachedir, 'writing.tmp')
+  for file_name in (orphan, writing):
+    with open(file_name, 'wb') as handle:
+      handle.write(b'x'*size)
+  old = time.time() - featurestore.TMP_MAX_AGE - 10
+  os.utime(orphan, (old, old))
+  store.transform(windows(1))
+  # the orphan is removed, the file being written counts in the size
+  assert not os.path.exists(orphan) and os.path.exists(writing)
+  assert len(store.entries()) == 1
+  store.clear()
+  assert os.listdir(store.cachedir) == []
+
+
+def test_entries_removed_meanwhile_are_skipped(tmp_path, monkeypatch):
+  store = FeatureStore(StatisticalTime(), str(tmp_path / 'cache'))
+  for seed in range(3):
+    store.transform(windows(seed))
+  scandir = os.scandir
+
+  class Removed:
+    def __init__(self, entry):
+      self.name, self.path = entry.name, entry.path
+
+    def stat(self):
+      raise FileNotFoundError(self.path)
+
+  class Listing:
+    def __init__(self, path):
+      self.it = scandir(path)
+
+    def __enter__(self):
+      entries = list(self.it)
+      return [Removed(entries[0])] + entries[1:]
+
+    def __exit__(self, *exc):
+      self.it.close()
+
+  monkeypatch.setattr(os, 'scandir', Listing)
+  assert len(store.entries()) == 2
+  store.max_size = 0
+  store.evict()
+  monkeypatch.undo()
+  assert len(store.entries()) == 1
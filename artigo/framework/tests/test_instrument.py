@@ -0,0 +1,26 @@
+import instrument
+
+
+def test_peak_unavailable_without_proc_and_resource(monkeypatch):
+  monkeypatch.setattr(instrument, 'resource', None)
+  monkeypatch.setattr(instrument, '_read_proc', lambda file_name, field: None)
+  instrument.enable()
+  try:
+    with instrument.stage('outer'):
+      with instrument.stage('inner'):
+        instrument.count(windows=3)
+  finally:
+    trace = instrument.disable()
+  assert [event['peak_rss'] for event in trace.events] == [None, None]
+  lines = instrument.summary(trace).splitlines()
+  assert len(lines) == 3 and all('n/a' in line for line in lines[1:])
+
+
+def test_peak_measured():
+  instrument.enable()
+  try:
+    with instrument.stage('stage'):
+      bytearray(1 << 20)
+  finally:
+    trace = instrument.disable()
+  assert trace.events[0]['peak_rss'] > 0
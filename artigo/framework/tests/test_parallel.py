@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import numpy as np
+import pytest
+
+from parallel import map_acquisitions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+COMPARE = textwrap.dedent("""
+    import os, sys
+    import numpy as np
+    import scipy.io
+    from cwru import get_tensors_from_matlab
+
+    dirname = sys.argv[1]
+    rng = np.random.default_rng(0)
+    files = {}
+    for i in range(7):
+      name = '{:03d}.mat'.format(i)
+      variables = {'X{:03d}_DE_time'.format(i): rng.standard_normal((1000+i, 1))}
+      if i % 2:
+        variables['X{:03d}_FE_time'.format(i)] = rng.standard_normal((1000+i, 1))
+      scipy.io.savemat(os.path.join(dirname, name), variables)
+      files['K{}_'.format(i)] = name
+    serial = get_tensors_from_matlab(files, dirname, n_jobs=1)
+    parallel = get_tensors_from_matlab(files, dirname, n_jobs=3)
+    assert list(serial) == list(parallel), (list(serial), list(parallel))
+    for key in serial:
+      assert serial[key].dtype == parallel[key].dtype
+      np.testing.assert_array_equal(serial[key], parallel[key])
+    print(len(serial))
+    """)
+
+
+def test_cwru_parallel_equals_serial(tmp_path):
+  output = subprocess.run([sys.executable, '-c', COMPARE, str(tmp_path)], cwd=ROOT,
+                          capture_output=True, text=True)
+  assert output.returncode == 0, output.stderr
+  assert output.stdout.split() == ['10']
+
+
+def decode(item):
+  if item == 0:
+    time.sleep(0.5)
+    raise ValueError("corrupt file")
+  return {'signal': np.full(1000, item, dtype=np.float64)}
+
+
+def shared_blocks():
+  return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason="needs /dev/shm")
+def test_failed_item_releases_pending_blocks():
+  before = shared_blocks()
+  with pytest.raises(ValueError):
+    list(map_acquisitions(decode, range(8), n_jobs=2))
+  assert shared_blocks() == before
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason="needs /dev/shm")
+def test_early_stop_releases_pending_blocks():
+  before = shared_blocks()
+  results = map_acquisitions(decode, range(1, 9), n_jobs=2)
+  assert next(results)['signal'][0] == 1
+  results.close()
+  assert shared_blocks() == before
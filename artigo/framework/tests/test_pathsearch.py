@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import GridSearchCV
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from pathsearch import PathSearchCV, path_parameter
+
+
+def data():
+  return make_classification(n_samples=240, n_features=8, n_informative=4, n_classes=3,
+                             flip_y=0.1, random_state=0)
+
+
+def knn():
+  return Pipeline([('scaler', StandardScaler()), ('knn', KNeighborsClassifier())])
+
+
+def forest():
+  return Pipeline([('scaler', StandardScaler()),
+                   ('rf', RandomForestClassifier(random_state=0))])
+
+
+GRIDS = [
+    (knn, {'knn__n_neighbors': list(range(1, 16, 2))}, 'knn__n_neighbors'),
+    (knn, {'knn__n_neighbors': [1, 5, 9], 'scaler__with_mean': [True, False]},
+     'knn__n_neighbors'),
+    (knn, {'knn__n_neighbors': [1, 5, 9], 'knn__weights': ['uniform', 'distance']}, None),
+    (knn, {'knn__n_neighbors': [1, 5, 9], 'knn__metric': ['euclidean', 'manhattan']}, None),
+    (forest, {'rf__max_features': [1, 3], 'rf__n_estimators': [5, 10, 20]}, 'rf__n_estimators'),
+    (forest, {'rf__n_estimators': [5, 10], 'rf__warm_start': [False, True]}, None),
+]
+
+
+@pytest.mark.parametrize('make, param_grid, path', GRIDS)
+def test_scores_match_grid_search(make, param_grid, path):
+  X, y = data()
+  assert path_parameter(make(), param_grid) == path
+  grid = GridSearchCV(make(), param_grid).fit(X, y)
+  search = PathSearchCV(make(), param_grid).fit(X, y)
+  assert search.cv_results_['params'] == grid.cv_results_['params']
+  for name in ['mean_test_score', 'rank_test_score'] + \
+      ['split{}_test_score'.format(j) for j in range(grid.n_splits_)]:
+    np.testing.assert_allclose(search.cv_results_[name], grid.cv_results_[name])
+  assert search.best_params_ == grid.best_params_
+  np.testing.assert_array_equal(search.predict(X), grid.predict(X))
+  if path is None:
+    assert search.n_fits_ == len(grid.cv_results_['params'])*grid.n_splits_
+  else:
+    assert search.n_fits_ < len(grid.cv_results_['params'])*grid.n_splits_
+
+
+def test_distance_weights_disable_path():
+  estimator = knn().set_params(knn__weights='distance')
+  assert path_parameter(estimator, {'knn__n_neighbors': [1, 3]}) is None
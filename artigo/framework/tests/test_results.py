@@ -0,0 +1,69 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+
+from classifiers import Classifiers, Scoring
+from experimenter import Experimenter
+from featurestore import extractor_config
+from results import ResultsStore
+from synthetic import Synthetic
+
+FRAMEWORK = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUN = textwrap.dedent("""
+    import sys
+    from classifiers import Classifiers, Scoring
+    from experimenter import Experimenter
+    from results import ResultsStore
+    from synthetic import Synthetic
+
+    synthetic = Synthetic(n_bearings=1, settings=((25.0, 1.0),), n_repetitions=2,
+                          duration=0.2)
+    clfs = [(name, clf) for name, clf in Classifiers(sys.argv[2])
+            if name in ('K-Nearest Neighbors', 'SVM')]
+    with ResultsStore(sys.argv[1]) as store:
+      Experimenter(synthetic.acquisitions(), 1024).perform(clfs, Scoring(), store=store,
+                                                           dataset='synthetic')
+    """)
+
+
+def run(tmp_path):
+  output = subprocess.run([sys.executable, '-c', RUN, str(tmp_path / 'results.sqlite'),
+                           str(tmp_path / 'features')],
+                          cwd=FRAMEWORK, capture_output=True, text=True, check=True).stdout
+  return [line for line in output.splitlines() if line.startswith('Results store:')]
+
+
+def test_configs_have_no_object_addresses(tmp_path):
+  for search in ('grid', 'halving', 'path'):
+    for _, clf in Classifiers(str(tmp_path), search=search):
+      assert ' at 0x' not in extractor_config(clf)
+
+
+def test_resume_in_fresh_process(tmp_path):
+  assert run(tmp_path) == ["Results store: 0 of 20 cells already done"]
+  with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+    assert len(store.cells()) == 20
+  assert run(tmp_path) == ["Results store: 20 of 20 cells already done"]
+
+
+
+def test_dtype_tells_cells_apart(tmp_path):
+  acquisitions = Synthetic(n_bearings=1, settings=((25.0, 1.0),), n_repetitions=2,
+                           duration=0.2).acquisitions()
+  clfs = [clf for clf in Classifiers() if clf[0] == 'K-Nearest Neighbors']
+  lines = []
+  with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+    for dtype in (np.float64, np.float32, np.float32):
+      output = io.StringIO()
+      with contextlib.redirect_stdout(output):
+        Experimenter(acquisitions, 1024, dtype=dtype).perform(clfs, Scoring(), store=store)
+      lines += [line for line in output.getvalue().splitlines()
+                if line.startswith('Results store:')]
+    assert len(store.cells()) == 20
+  assert lines == ["Results store: {} of 10 cells already done".format(n) for n in (0, 0, 10)]
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+import numpy as np
+
+from service import HEADER, SAMPLE, InferenceService
+
+
+class FailingOnce:
+  """
+  Predicts the sign of the mean of each window, failing the first batch.
+  """
+
+  def __init__(self):
+    self.calls = 0
+
+  def predict(self, X):
+    self.calls += 1
+    if self.calls == 1:
+      raise RuntimeError("bad batch")
+    return np.where(X.mean(axis=1) > 0, 'P', 'N')
+
+
+async def exchange(path):
+  service = InferenceService(FailingOnce(), sample_size=4, max_delay=0)
+  server = asyncio.create_task(service.serve(path=path))
+  for _ in range(100):
+    try:
+      reader, writer = await asyncio.open_unix_connection(path)
+      break
+    except (FileNotFoundError, ConnectionRefusedError):
+      await asyncio.sleep(0.01)
+  responses = []
+  for value in (1.0, -1.0):
+    writer.write(HEADER.pack(3, 4) + np.full(4, value, dtype=SAMPLE).tobytes())
+    responses.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+  writer.write(HEADER.pack(0, 0))
+  metrics = json.loads(await asyncio.wait_for(reader.readline(), 5))['metrics']
+  writer.close()
+  server.cancel()
+  return responses, metrics
+
+
+def test_failed_batch_is_answered_and_batcher_keeps_running(tmp_path):
+  responses, metrics = asyncio.run(exchange(str(tmp_path / 'service.sock')))
+  assert responses[0]['window'] == 0 and 'bad batch' in responses[0]['error']
+  assert responses[1]['window'] == 1 and responses[1]['label'] == 'N'
+  assert metrics['errors'] == 1 and metrics['windows'] == 1
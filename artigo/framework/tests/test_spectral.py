@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from spectral import SAMPLE_RATES, SpectralFeatures
+
+
+def windows(n=12, sample_size=1024):
+  return np.random.default_rng(0).standard_normal((n, sample_size))
+
+
+def extractor(sample_rate, max_frequency=None):
+  return SpectralFeatures(sample_rate, max_frequency=max_frequency,
+                          characteristic_frequencies={'BPFO': 236.4}, batch_size=5)
+
+
+def test_per_window_rates_match_single_rate_groups():
+  X = windows()
+  rates = np.where(np.arange(len(X)) % 3 == 0, SAMPLE_RATES['mfpt_baseline'],
+                   SAMPLE_RATES['mfpt_fault'])
+  features = extractor(rates).transform(X)
+  for rate in np.unique(rates):
+    rows = rates == rate
+    np.testing.assert_allclose(features[rows], extractor(rate).transform(X[rows]))
+
+
+def test_rate_changes_frequency_grid():
+  X = windows()
+  baseline = extractor(SAMPLE_RATES['mfpt_baseline'], 20000).transform(X)
+  fault = extractor(SAMPLE_RATES['mfpt_fault'], 20000).transform(X)
+  assert not np.allclose(baseline, fault)
+
+
+def test_transform_sample_rate_overrides_attribute():
+  X = windows()
+  rates = np.full(len(X), SAMPLE_RATES['paderborn'])
+  np.testing.assert_allclose(extractor(12000).transform(X, sample_rate=rates),
+                             extractor(SAMPLE_RATES['paderborn']).transform(X))
+  with pytest.raises(ValueError):
+    extractor(rates[:-1]).transform(X)
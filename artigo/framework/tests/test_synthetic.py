@@ -0,0 +1,41 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+
+from synthetic import Synthetic
+
+
+def small(**kwargs):
+  return Synthetic(n_bearings=1, settings=((25.0, 1.0),), n_repetitions=1, duration=0.05,
+                   **kwargs)
+
+
+def load(synthetic, storedir):
+  with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    return synthetic.load(storedir)
+
+
+def test_load_reuses_store_with_same_parameters(tmp_path):
+  storedir = str(tmp_path / 'store')
+  first = load(small(), storedir)
+  index = os.path.join(storedir, 'index.json')
+  modified = os.path.getmtime(index)
+  again = load(small(), storedir)
+  assert os.path.getmtime(index) == modified
+  for key in first['acquisitions']:
+    np.testing.assert_array_equal(again['acquisitions'][key], first['acquisitions'][key])
+
+
+def test_load_regenerates_store_with_other_parameters(tmp_path):
+  storedir = str(tmp_path / 'store')
+  load(small(), storedir)
+  other = small(seed=7, conditions="NI")
+  acquisitions_data = load(other, storedir)
+  assert acquisitions_data['parameters'] == other.parameters()
+  assert sorted(acquisitions_data['acquisitions']) == sorted(other.keys())
+  key = next(iter(other.keys()))
+  np.testing.assert_array_equal(acquisitions_data['acquisitions'][key],
+                                other.acquisitions()['acquisitions'][key])
+  assert sorted(os.listdir(storedir)) == ['00000.npy', '00001.npy', 'index.json']
@@ -6,12 +6,16 @@ Class definition for CWRU dataset.
 # Francisco Boldt <fboldt@gmail.com>
 
 import os
-import urllib.request
+from functools import partial
 
 import numpy as np
-import scipy.io
 
 import database
+from artigo.framework.downloader import download_files
+from artigo.framework.ingestion import CHANNELS, read_channels
+from artigo.framework.metadata import parse_cwru_key
+from artigo.framework.parallel import map_acquisitions
+from artigo.framework.shards import ShardWriter, ShardReader
 
 
 def files_debug():
@@ -48,24 +52,36 @@ class CWRU(database.Database):
     directory name of the segmented files
   url : str
     website from the raw matlab files are downloaded
+  n_jobs : int
+    number of processes reading the matlab files, all the processors if None
+  dtype : numpy.dtype
+    data type of the acquisitions and of the saved windows
   
   Methods
   -------
   download()
     Download raw matlab files from CWRU website
-  segmentate()
-    Semgmentate the raw matlab files in various .csv files
+  segment()
+    Semgmentate the raw matlab files in binary shards (or .csv files)
+  read_segments()
+    Read the windows saved by segment()
   """
 
-  def __init__(self, files=files_debug()):
+  def __init__(self, files=files_debug(), n_jobs=None, dtype=np.float64):
     """
     Parameters
     ----------
     files : dict
       keys are the conditions and the values are the matlab file name
+    n_jobs : int
+      number of processes reading the matlab files
+    dtype : numpy.dtype
+      data type of the acquisitions, e.g. np.float32 to halve their memory
     """
 
     self.files = files
+    self.n_jobs = n_jobs
+    self.dtype = np.dtype(dtype)
     self.rawfilesdir = "cwru_raw"
     self.dirdest = "cwru_seg"
     self.url="http://csegroups.case.edu/sites/default/files/bearingdatacenter/files/Datafiles/"
@@ -80,31 +96,33 @@ class CWRU(database.Database):
 
     matlab_files_name = self.files
     url = self.url
-    n = len(matlab_files_name)
     dirname = self.rawfilesdir
-    if not os.path.isdir(dirname):
-      os.mkdir(dirname)
-    for i,key in enumerate(matlab_files_name):
-      file_name = matlab_files_name[key]
-      if not os.path.exists(os.path.join(dirname, file_name)):
-        urllib.request.urlretrieve(url+file_name, os.path.join(dirname, file_name))
-      print("{}/{}\t{}\t{}".format(i+1, n, key, file_name))
+    download_files([(url+file_name, os.path.join(dirname, file_name))
+                    for file_name in matlab_files_name.values()])
   
-  def segment(self):
+  def segment(self, output="shards", shard_size=16384):
     """
     Segment Matlab files by the four main conditions, 
     i.e. Normal, Ball, Inner Race and Outer Race.
 
     It saves the segmented files in four directories,
     i.e. normal, ball, inner and outer.
-    NOTE: This is the first idea and it will problably
-    be changed in a near future.
+
+    Parameters
+    ----------
+    output : str
+      "shards" appends the windows of each condition to a few binary shards
+      of at most shard_size windows, indexed by dirdest/index.npz (see
+      read_segments()); "csv" saves each window in its own .csv file. Other
+      values raise ValueError.
     """
 
+    if output not in ("shards", "csv"):
+      raise ValueError('output must be "shards" or "csv", got {!r}'.format(output))
     dirdest = self.dirdest
     if not os.path.isdir(dirdest):
       os.mkdir(dirdest)
-    conditions = {"r":"normal", 
+    conditions = {"N":"normal", 
                   "B": "ball", 
                   "I": "inner", 
                   "O": "outer"}
@@ -112,19 +130,45 @@ class CWRU(database.Database):
       if not os.path.isdir(os.path.join(dirdest, condition)):
         os.mkdir(os.path.join(dirdest, condition))
     matlab_files_name = self.files
-    acquisitions = get_tensors_from_matlab(matlab_files_name, self.rawfilesdir)
+    # one acquisition at a time, the whole data set is never in memory
+    acquisitions = iter_tensors_from_matlab(matlab_files_name, self.rawfilesdir, self.n_jobs,
+                                            self.dtype)
     sample_size=512
-    data = np.empty((0,sample_size,1))
-    n = len(acquisitions)
-    for i,key in enumerate(acquisitions):
-      acquisition_size = len(acquisitions[key])
-      n_samples = acquisition_size//sample_size
-      print('{}/{} --- {}: {}'.format(i+1, n, key, n_samples))
-      data = acquisitions[key][:(n_samples*sample_size)].reshape((n_samples,sample_size,1))
-      for j in range(n_samples):
-        file_name = os.path.join(dirdest, conditions[key[2]], key+str(j)+'.csv')
-        if not os.path.exists(file_name):
-          np.savetxt(file_name, data[j], delimiter=',')
+    data = np.empty((0,sample_size,1), dtype=self.dtype)
+    writer = ShardWriter(dirdest, sample_size, shard_size, self.dtype) if output == "shards" else None
+    try:
+      for i,(key,acquisition) in enumerate(acquisitions):
+        acquisition_size = len(acquisition)
+        n_samples = acquisition_size//sample_size
+        print('{} --- {}: {}'.format(i+1, key, n_samples))
+        condition = conditions[parse_cwru_key(key)['condition']]
+        data = acquisition[:(n_samples*sample_size)].reshape((n_samples,sample_size,1))
+        if writer is not None:
+          writer.write(condition, key, data[:,:,0], np.arange(n_samples)*sample_size)
+          continue
+        for j in range(n_samples):
+          file_name = os.path.join(dirdest, condition, key+str(j)+'.csv')
+          if not os.path.exists(file_name):
+            np.savetxt(file_name, data[j], delimiter=',')
+    finally:
+      # the shards are closed and the windows written so far indexed even on errors
+      if writer is not None:
+        writer.close()
+
+  def read_segments(self, conditions=None):
+    """
+    Read the windows saved in shards by segment().
+
+    Returns
+    -------
+    data : numpy.ndarray
+      the windows of the given conditions (all if None), one per row
+    labels : numpy.ndarray
+      the condition of each window
+    groups : numpy.ndarray
+      the acquisition key of each window
+    """
+    return ShardReader(self.dirdest).read(conditions)
 
 def files_12khz():
   """
@@ -287,7 +331,19 @@ def files_12khz():
   matlab_files_name["DEB.028_3"] = "3008.mat"
   return matlab_files_name
 
-def get_tensors_from_matlab(matlab_files_name, rawfilesdir=""):
+def matlab_signals(file_name, dtype=np.float64):
+  """
+  Reads the accelerometer signals of a Matlab file, as dtype.
+
+  Returns
+  -------
+  signals : dict
+    the keys are the accelerometer positions (de, fe or ba) found in the file
+    and the values are the signals in the time domain.
+  """
+  return read_channels(file_name, CHANNELS['cwru'], dtype)
+
+def get_tensors_from_matlab(matlab_files_name, rawfilesdir="", n_jobs=None, dtype=np.float64):
   """
   Extracts the acquisitions of each Matlab file in the dictionary matlab_files_name.
 
@@ -295,6 +351,7 @@ def get_tensors_from_matlab(matlab_files_name, rawfilesdir=""):
   in the matlab_files_name in numpy arrays.
   As large the number of entries in matlab_files_name 
   as large will be the space of memory necessary.
+  Use iter_tensors_from_matlab to go through them one at a time.
 
   Atributes
   ---------
@@ -302,6 +359,11 @@ def get_tensors_from_matlab(matlab_files_name, rawfilesdir=""):
     the keys represent the conditions and the values are the matlab file names
   rawfilesdir : str
     directory where the matlab files are
+  n_jobs : int
+    number of worker processes decoding the files, all the processors if None.
+    The acquisitions keep the order of matlab_files_name.
+  dtype : numpy.dtype
+    data type of the signals
   
   Returns
   -------
@@ -310,16 +372,18 @@ def get_tensors_from_matlab(matlab_files_name, rawfilesdir=""):
     the values are numpy arrays with the acquired signal in the time domain.
   """
 
-  acquisitions = {}
-  for key in matlab_files_name:
-    file_name = os.path.join(rawfilesdir, matlab_files_name[key])
-    matlab_file = scipy.io.loadmat(file_name)
-    for position in ['DE','FE', 'BA']:
-      keys = [key for key in matlab_file if key.endswith(position+"_time")]
-      if len(keys)>0:
-        array_key = keys[0]
-        acquisitions[key+position.lower()] = matlab_file[array_key].reshape(1,-1)[0]
-  return acquisitions
+  return dict(iter_tensors_from_matlab(matlab_files_name, rawfilesdir, n_jobs, dtype))
+
+def iter_tensors_from_matlab(matlab_files_name, rawfilesdir="", n_jobs=None, dtype=np.float64):
+  """
+  Yields the (key, signal) acquisitions of get_tensors_from_matlab one at
+  a time, so only a few matlab files are in memory at once.
+  """
+  files_name = [os.path.join(rawfilesdir, matlab_files_name[key]) for key in matlab_files_name]
+  signals_of = partial(matlab_signals, dtype=dtype)
+  for key, signals in zip(matlab_files_name, map_acquisitions(signals_of, files_name, n_jobs)):
+    for position, signal in signals.items():
+      yield key+position, signal
 
 def main():
   database = CWRU()
@@ -1,6 +1,5 @@
-import urllib.request
-import os.path
+from artigo.framework.downloader import download_files
 
 def download_database():
   url="https://ti.arc.nasa.gov/c/3/"
-  urllib.request.urlretrieve(url, "IMS.7z")
+  download_files([(url, "IMS.7z")])
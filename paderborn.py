@@ -1,5 +1,4 @@
-import urllib.request
-import os.path
+from artigo.framework.downloader import download_files
 
 def download_database():
   
@@ -12,11 +11,6 @@ def download_database():
 
   
   url="http://groups.uni-paderborn.de/kat/BearingDataCenter/"
-  n = len(rar_files_name)
-  for i in rar_files_name:
-    file_name = i
-    if not os.path.exists(file_name):
-      urllib.request.urlretrieve(url+file_name, file_name)
-    print(file_name)
+  download_files([(url+file_name, file_name) for file_name in rar_files_name])
 
 download_database()
@@ -1,7 +1,6 @@
-import urllib.request
-import os.path
+from artigo.framework.downloader import download_files
 
 def download_database():
 
   url="https://ti.arc.nasa.gov/c/18/"
-  urllib.request.urlretrieve(url, "pronostia.zip")
+  download_files([(url, "pronostia.zip")])